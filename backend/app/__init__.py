@@ -6,7 +6,10 @@ from flask_jwt_extended import JWTManager, jwt_required
 
 from .analytics import bp as analytics_bp
 from .auth import bp as auth_bp
+from .db import sqlite_settings
+from . import instrumentation
 from .items import bp as items_bp
+from .metrics import bp as metrics_bp
 from .orders import bp as orders_bp
 from .schedules import bp as schedules_bp
 
@@ -16,14 +19,17 @@ def create_app():
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET", "change-me")
 
     JWTManager(app)
+    instrumentation.init_app(app)
 
-    from .bootstrap import bootstrap_database
+    from .archiver import start_outside_gunicorn
+    from .bootstrap import bootstrap_if_needed
 
-    bootstrap_database()
+    bootstrap_if_needed()
+    start_outside_gunicorn()
 
     @app.get("/api/health")
     def health_check():
-        return jsonify({"status": "ok"})
+        return jsonify({"status": "ok", "sqlite": sqlite_settings()})
 
     @app.get("/api/protected")
     @jwt_required()
@@ -35,5 +41,6 @@ def create_app():
     app.register_blueprint(orders_bp)
     app.register_blueprint(schedules_bp)
     app.register_blueprint(analytics_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
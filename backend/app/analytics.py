@@ -6,9 +6,9 @@ from flask import Blueprint, jsonify, request
 from sqlalchemy import func, select
 
 from .auth import _json_error, role_required
-from .customizations import extract_customization_labels
-from .db import SessionLocal
-from .models import MenuItem, OrderItem, OrderRecord, ScheduleShift, Staff
+from .db import ReadSessionLocal
+from .history import parse_date_range
+from .models import HistoryPartition, MenuItem, OrderItem, OrderRecord, SalesItemHourly, SalesLabelHourly, ScheduleShift, Staff
 
 bp = Blueprint("analytics", __name__, url_prefix="/api/analytics")
 
@@ -76,18 +76,36 @@ def _round_hours(value: float | int) -> float:
 @bp.get("/summary")
 @role_required("staff", "manager")
 def analytics_summary():
-    with SessionLocal() as session:
-        item_stmt = (
+    try:
+        since, until = parse_date_range(request.args.get("since"), request.args.get("until"))
+    except ValueError as exc:
+        return _json_error(str(exc), 400)
+
+    def _in_range(stmt, hour_column):
+        if since is not None:
+            stmt = stmt.where(hour_column >= since)
+        if until is not None:
+            stmt = stmt.where(hour_column < until)
+        return stmt
+
+    with ReadSessionLocal() as session:
+        # Sales come from the hourly rollups maintained by the archiver rather
+        # than scanning order_records (or compacted months) and re-parsing
+        # every customization blob; a date range only narrows the hours summed.
+        quantity_sold = func.sum(SalesItemHourly.quantity)
+        item_stmt = _in_range(
             select(
                 MenuItem.id,
                 MenuItem.name,
                 MenuItem.category,
-                func.sum(OrderRecord.qty).label("quantity_sold"),
+                quantity_sold.label("quantity_sold"),
             )
-            .select_from(OrderRecord)
-            .join(MenuItem, MenuItem.id == OrderRecord.item_id)
+            .select_from(SalesItemHourly)
+            .join(MenuItem, MenuItem.id == SalesItemHourly.item_id)
             .group_by(MenuItem.id)
-            .order_by(func.sum(OrderRecord.qty).desc(), MenuItem.name)
+            .having(quantity_sold > 0)
+            .order_by(quantity_sold.desc(), MenuItem.name),
+            SalesItemHourly.hour_start,
         )
         sold_rows = session.execute(item_stmt).all()
 
@@ -109,28 +127,31 @@ def analytics_summary():
         pending_stmt = select(func.count(OrderItem.id)).where(OrderItem.status != "complete")
         pending_count = session.scalar(pending_stmt) or 0
 
-        start_stmt = select(func.min(OrderRecord.completed_at)).where(OrderRecord.completed_at.isnot(None))
-        start_timestamp = session.scalar(start_stmt)
+        # Compacted months keep their span in the catalog, so this never opens them.
+        start_stmt = select(
+            select(func.min(OrderRecord.completed_at)).where(OrderRecord.completed_at.isnot(None)).scalar_subquery(),
+            select(func.min(HistoryPartition.first_completed_at)).scalar_subquery(),
+        )
+        starts = [value for value in session.execute(start_stmt).one() if value is not None]
+        start_timestamp = min(starts) if starts else None
         tracking_since = to_local_iso(start_timestamp) if start_timestamp else None
 
-        custom_stmt = select(OrderRecord.qty, OrderRecord.customizations).where(OrderRecord.customizations.isnot(None))
-        customization_rows = session.execute(custom_stmt).all()
-
-        tea_counter = Counter()
-        milk_counter = Counter()
-        addon_counter = Counter()
+        label_quantity = func.sum(SalesLabelHourly.quantity)
+        label_stmt = _in_range(
+            select(SalesLabelHourly.category, SalesLabelHourly.label, label_quantity)
+            .group_by(SalesLabelHourly.category, SalesLabelHourly.label)
+            .having(label_quantity > 0)
+            .order_by(label_quantity.desc(), SalesLabelHourly.label),
+            SalesLabelHourly.hour_start,
+        )
 
-        for qty, raw in customization_rows:
-            quantity = int(qty or 0)
-            if quantity <= 0:
-                continue
-            tea_label, milk_label, addon_labels = extract_customization_labels(raw)
-            if tea_label:
-                tea_counter[tea_label] += quantity
-            if milk_label:
-                milk_counter[milk_label] += quantity
-            for addon_label in addon_labels:
-                addon_counter[addon_label] += quantity
+        counters = {"tea": Counter(), "milk": Counter(), "addon": Counter()}
+        for category, label, quantity in session.execute(label_stmt):
+            if category in counters:
+                counters[category][label] += int(quantity or 0)
+        tea_counter = counters["tea"]
+        milk_counter = counters["milk"]
+        addon_counter = counters["addon"]
 
         extra_items = []
 
@@ -199,7 +220,7 @@ def analytics_shifts():
         "days": week_days,
     }
 
-    with SessionLocal() as session:
+    with ReadSessionLocal() as session:
         staff_rows = session.execute(select(Staff).where(Staff.is_active.is_(True))).scalars().all()
 
         staff_info = []
@@ -0,0 +1,240 @@
+"""Background archival of completed orders.
+
+Completing an order only sets ``order_items.status`` to ``complete`` and stamps
+``completed_at``, so the barista's request stays a single UPDATE. The
+archiver later moves completed rows into ``order_records``. Each batch of up
+to ``ARCHIVE_BATCH_SIZE`` rows is one transaction that:
+
+* copies the rows with one ``INSERT ... SELECT``
+* adds their loyalty and hourly sales counts in aggregate
+* re-points their add-ons and deletes them with one ``DELETE``
+* advances the ``archive_progress`` watermark
+
+A crash therefore loses at most the batch in flight, and that batch is picked
+up again. Batches walk ``ix_order_items_status_id`` forward from the
+watermark and wrap to the start once nothing is left above it, which
+catches drinks completed out of id order.
+
+Each gunicorn worker runs an ``Archiver`` thread (see ``gunicorn.conf.py``);
+under any other host (``flask run``, waitress, ...) ``create_app`` starts it.
+A file lock next to the database lets one of them work at a time; another
+takes over when that worker exits. ``python -m app.manage orders archive``
+drains the backlog by hand, and ``app.bootstrap`` does the same on deploy.
+Until a drink is archived it is served from ``order_items`` with its
+``completed_at``, and loyalty and analytics lag by up to one interval.
+"""
+import logging
+import os
+import threading
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from . import metrics
+from .db import SessionLocal, db_path
+from .loyalty import add_member_drinks
+from .models import ArchiveProgress, OrderAddon, OrderItem, OrderRecord
+from .order_options import OPTION_COLUMNS, load_order_addons, load_record_addons, move_addons_to_records
+from .orders import current_local_datetime
+from .rollups import record_sale, record_sales
+from .versions import ORDERS_VERSION, bump_version
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts run without the lock
+    fcntl = None
+
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "2"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+_default_lock = f"{db_path}.archiver.lock" if db_path is not None else ""
+ARCHIVE_LOCK_PATH = os.getenv("ARCHIVE_LOCK_PATH", _default_lock)
+PROGRESS_NAME = "order_items"
+
+logger = logging.getLogger(__name__)
+
+# Copied straight across; status and completed_at are filled in by the SELECT.
+_COPIED_COLUMNS = (
+    "ticket_id",
+    "member_id",
+    "staff_id",
+    "item_id",
+    "qty",
+    "total_price",
+    "customizations",
+    *OPTION_COLUMNS,
+    "created_at",
+)
+
+
+def _pending_ids(session, after_id: int, batch_size: int) -> list[int]:
+    return list(
+        session.scalars(
+            select(OrderItem.id)
+            .where(OrderItem.status == "complete", OrderItem.id > after_id)
+            .order_by(OrderItem.id)
+            .limit(batch_size)
+        )
+    )
+
+
+def _retire_records(session, order_ids: list[int]) -> None:
+    """Reverse and drop history rows that already use these order ids (legacy re-archives)."""
+    stale = session.scalars(select(OrderRecord).where(OrderRecord.order_item_id.in_(order_ids))).all()
+    if not stale:
+        return
+    addons = load_record_addons(session, [record.id for record in stale])
+    for record in stale:
+        add_member_drinks(session, record.member_id, -(record.qty or 0))
+        record_sale(session, record, addons.get(record.id, []), sign=-1)
+    stale_ids = [record.id for record in stale]
+    session.execute(delete(OrderAddon).where(OrderAddon.order_record_id.in_(stale_ids)))
+    session.execute(delete(OrderRecord).where(OrderRecord.id.in_(stale_ids)))
+
+
+def archive_batch(session, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move one batch of completed orders into history; returns rows moved.
+
+    The caller commits. Everything, including the watermark, lands in that one
+    transaction.
+    """
+    progress = session.get(ArchiveProgress, PROGRESS_NAME)
+    if progress is None:
+        progress = ArchiveProgress(name=PROGRESS_NAME, last_order_item_id=0, archived_total=0)
+        session.add(progress)
+    order_ids = _pending_ids(session, progress.last_order_item_id, batch_size)
+    if not order_ids and progress.last_order_item_id:
+        order_ids = _pending_ids(session, 0, batch_size)
+    if not order_ids:
+        return 0
+
+    _retire_records(session, order_ids)
+    addons_by_order = load_order_addons(session, order_ids)
+    now = current_local_datetime()
+    source = select(
+        OrderItem.id,
+        *(getattr(OrderItem, name) for name in _COPIED_COLUMNS),
+        literal("complete"),
+        func.coalesce(OrderItem.completed_at, literal(now, OrderItem.completed_at.type)),
+    ).where(OrderItem.id.in_(order_ids), OrderItem.status == "complete")
+    records = session.execute(
+        insert(OrderRecord)
+        .from_select(["order_item_id", *_COPIED_COLUMNS, "status", "completed_at"], source)
+        .returning(
+            OrderRecord.id,
+            OrderRecord.order_item_id,
+            OrderRecord.member_id,
+            OrderRecord.item_id,
+            OrderRecord.qty,
+            OrderRecord.tea,
+            OrderRecord.milk,
+            OrderRecord.created_at,
+            OrderRecord.completed_at,
+        )
+    ).all()
+    if not records:
+        return 0
+
+    drinks_by_member: dict[int, int] = {}
+    for record in records:
+        if record.member_id:
+            drinks_by_member[record.member_id] = drinks_by_member.get(record.member_id, 0) + (record.qty or 0)
+    for member_id, quantity in drinks_by_member.items():
+        add_member_drinks(session, member_id, quantity)
+    record_sales(session, [(record, addons_by_order.get(record.order_item_id, [])) for record in records])
+    move_addons_to_records(
+        session,
+        {record.order_item_id: record.id for record in records if record.order_item_id in addons_by_order},
+    )
+    moved_ids = [record.order_item_id for record in records]
+    session.execute(delete(OrderItem).where(OrderItem.id.in_(moved_ids)).execution_options(synchronize_session=False))
+
+    progress.last_order_item_id = max(moved_ids)
+    progress.archived_total = (progress.archived_total or 0) + len(records)
+    progress.updated_at = now
+    metrics.count_on_commit(session, "orders_archived_total", len(records))
+    bump_version(session, ORDERS_VERSION)
+    return len(records)
+
+
+def archive_pending(batch_size: int = ARCHIVE_BATCH_SIZE, stop: threading.Event | None = None) -> int:
+    """Archive batches until no completed orders remain; returns rows moved."""
+    total = 0
+    while stop is None or not stop.is_set():
+        with SessionLocal() as session:
+            moved = archive_batch(session, batch_size)
+            session.commit()
+        total += moved
+        if moved < batch_size:
+            break
+    return total
+
+
+class Archiver:
+    """Daemon thread that drains completed orders every ``interval`` seconds."""
+
+    def __init__(
+        self,
+        interval: float = ARCHIVE_INTERVAL_SECONDS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        lock_path: str = ARCHIVE_LOCK_PATH,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _holds_lock(self) -> bool:
+        if self._lock_file is not None or not self.lock_path or fcntl is None:
+            return True
+        handle = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        # Held until this process exits, so one worker archives at a time.
+        self._lock_file = handle
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self._holds_lock():
+                continue
+            try:
+                archive_pending(self.batch_size, stop=self._stop)
+            except Exception:
+                logger.exception("order archival failed; retrying in %.1fs", self.interval)
+
+
+archiver = Archiver()
+
+
+def start_outside_gunicorn() -> None:
+    """Start ``archiver`` unless ``ARCHIVER_ENABLED=0`` or gunicorn owns it.
+
+    Gunicorn sets ``SERVER_SOFTWARE`` before preloading the app; its
+    ``post_fork`` hook starts the thread in each worker instead, since a
+    thread started in the master would not survive the fork.
+    """
+    if os.getenv("ARCHIVER_ENABLED", "1") == "0":
+        return
+    if os.getenv("SERVER_SOFTWARE", "").startswith("gunicorn/"):
+        return
+    archiver.start()
@@ -1,4 +1,8 @@
 # backend/app/auth.py
+import os
+import threading
+import time
+
 from flask import Blueprint, request, jsonify
 from functools import wraps
 from contextlib import contextmanager
@@ -10,16 +14,28 @@ from flask_jwt_extended import (
     jwt_required,
     verify_jwt_in_request,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func, select
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import object_session
 from .db import SessionLocal
+from .hashing import RETRY_AFTER_SECONDS, HashingBusy, hasher
 from .models import Member, Staff
 
 bp = Blueprint("auth", __name__, url_prefix="/api")
 
+# How long a worker trusts a cached staff role/active flag. ORM writes to staff
+# rows evict the local entry on commit; other workers pick them up within this.
+STAFF_PRINCIPAL_TTL_SECONDS = float(os.getenv("STAFF_PRINCIPAL_TTL_SECONDS", "5"))
+
+_STAFF_CHANGED_FLAG = "staff_principals_changed"
+
 def _json_error(msg, code=400):
     return jsonify({"error": msg}), code
 
+def _hashing_busy():
+    response = jsonify({"error": "server busy, retry shortly"})
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response, 503
+
 @contextmanager
 def session_scope():
     session = SessionLocal()
@@ -44,6 +60,68 @@ def _parse_identity(identity):
         account_id = None
     return account_type, account_id
 
+class StaffPrincipalCache:
+    """Per-worker ``staff_id -> (role, is_active)`` lookups for ``role_required``."""
+
+    def __init__(self, ttl: float | None = None):
+        self.ttl = STAFF_PRINCIPAL_TTL_SECONDS if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries: dict[int, tuple[float, tuple[str, bool] | None]] = {}
+
+    def get(self, staff_id: int) -> tuple[str, bool] | None:
+        """Return ``(role, is_active)``, or ``None`` when the account does not exist."""
+        entry = self._entries.get(staff_id)
+        now = time.monotonic()
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+        with SessionLocal() as session:
+            row = session.execute(select(Staff.role, Staff.is_active).where(Staff.id == staff_id)).first()
+        principal = ((row.role or "").strip().lower(), bool(row.is_active)) if row else None
+        with self._lock:
+            self._entries[staff_id] = (now, principal)
+        return principal
+
+    def invalidate(self, staff_ids=None) -> None:
+        with self._lock:
+            if staff_ids is None:
+                self._entries.clear()
+            else:
+                for staff_id in staff_ids:
+                    self._entries.pop(staff_id, None)
+
+
+staff_principals = StaffPrincipalCache()
+
+
+@event.listens_for(Staff, "after_update")
+@event.listens_for(Staff, "after_delete")
+def _note_staff_change(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_STAFF_CHANGED_FLAG, set()).add(target.id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _evict_changed_staff(session) -> None:
+    changed = session.info.pop(_STAFF_CHANGED_FLAG, None)
+    if changed:
+        staff_principals.invalidate(changed)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_staff_changes(session) -> None:
+    session.info.pop(_STAFF_CHANGED_FLAG, None)
+
+
+def _staff_by_username(username: str):
+    # Matches ix_staff_username_lower exactly so SQLite can seek the index.
+    return select(Staff).where(func.lower(Staff.username) == username)
+
+
+def _member_by_email(email: str):
+    return select(Member).where(func.lower(Member.email) == email)
+
+
 def role_required(*roles):
     allowed_roles = {role.strip().lower() for role in roles if role}
 
@@ -63,11 +141,10 @@ def role_required(*roles):
             claims = get_jwt() or {}
             token_role = (claims.get("role") or "").strip().lower()
 
-            with SessionLocal() as session:
-                staff = session.get(Staff, account_id)
-                if not staff or not staff.is_active:
-                    return _json_error("account disabled", 403)
-                db_role = (staff.role or "").strip().lower()
+            principal = staff_principals.get(account_id)
+            if principal is None or not principal[1]:
+                return _json_error("account disabled", 403)
+            db_role = principal[0]
 
             effective_role = db_role or token_role
             if allowed_roles:
@@ -121,23 +198,26 @@ def register():
             if existing_member:
                 return _json_error("email already registered", 409)
         else:
-            existing_staff = db.scalar(
-                select(Staff).where(func.lower(Staff.username) == username_normalized)
-            )
+            existing_staff = db.scalar(_staff_by_username(username_normalized))
             if existing_staff:
                 return _json_error("username already registered", 409)
 
+        try:
+            password_hash = hasher.hash(password)
+        except HashingBusy:
+            return _hashing_busy()
+
         if role == "customer":
             account = Member(
                 email=email,
-                password_hash=generate_password_hash(password),
+                password_hash=password_hash,
                 full_name=full_name,
             )
             account_type = "member"
         else:
             account = Staff(
                 username=username_input,
-                password_hash=generate_password_hash(password),
+                password_hash=password_hash,
                 full_name=full_name,
                 role=role,
             )
@@ -176,26 +256,37 @@ def login():
 
         staff = None
         if username:
-            staff = db.scalar(select(Staff).where(func.lower(Staff.username) == username))
-
-        if staff and check_password_hash(staff.password_hash, password):
-            account = staff
-            account_type = "staff"
-            resolved_role = staff.role
-        else:
-            member = None
-            if email:
-                member = db.scalar(select(Member).where(func.lower(Member.email) == email))
-            if member and check_password_hash(member.password_hash, password):
-                account = member
-                account_type = "member"
-                resolved_role = "customer"
+            staff = db.scalar(_staff_by_username(username))
+
+        try:
+            if staff and hasher.check(staff.password_hash, password):
+                account = staff
+                account_type = "staff"
+                resolved_role = staff.role
+            else:
+                member = None
+                if email:
+                    member = db.scalar(_member_by_email(email))
+                if member and hasher.check(member.password_hash, password):
+                    account = member
+                    account_type = "member"
+                    resolved_role = "customer"
+        except HashingBusy:
+            return _hashing_busy()
 
         if not account_type or not account:
             return _json_error("invalid credentials", 401)
         if not account.is_active:
             return _json_error("account disabled", 403)
 
+        if hasher.needs_rehash(account.password_hash):
+            # Upgrade old hashes while the plaintext is at hand; a busy pool just defers it.
+            try:
+                account.password_hash = hasher.hash(password)
+                db.commit()
+            except HashingBusy:
+                pass
+
         identity = f"{account_type}:{account.id}"
         claims = {"role": resolved_role, "name": account.full_name, "account_type": account_type}
         token = create_access_token(identity=identity, additional_claims=claims)
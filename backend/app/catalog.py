@@ -0,0 +1,196 @@
+"""Process-wide menu catalog and stock caches.
+
+The menu is tiny and changes rarely, so every worker keeps an in-memory copy
+keyed by id and by normalized (name, category). Writers call
+``mark_menu_changed`` inside their transaction; that bumps the shared
+``menu`` counter in ``cache_versions`` and drops the local copy once the
+transaction commits. Other workers notice the new counter on their next
+check, which happens at most every ``MENU_CATALOG_CHECK_SECONDS``.
+
+Stock moves with every order, so it is kept out of the catalog: orders bump
+only the ``stock`` counter (``mark_stock_changed``), and ``stock`` reloads
+just the id and quantity columns when that counter moves. Ordering never
+reads cached stock; the conditional UPDATE in ``inventory`` is authoritative.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+
+from sqlalchemy import event, select
+
+from .db import ReadSessionLocal, SessionLocal
+from .models import MenuItem
+from .versions import MENU_VERSION, STOCK_VERSION, bump_version, read_version
+
+CHECK_INTERVAL_SECONDS = float(os.getenv("MENU_CATALOG_CHECK_SECONDS", "1.0"))
+
+_MENU_CHANGED_FLAG = "menu_catalog_changed"
+_STOCK_CHANGED_FLAG = "menu_stock_changed"
+
+
+def normalize_lookup_key(name: str | None, category: str | None) -> tuple[str, str]:
+    return ((name or "").strip().lower(), (category or "").strip().lower())
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    """Immutable copy of a ``MenuItem`` row."""
+
+    id: int
+    name: str
+    category: str
+    price: Decimal
+    is_active: bool
+
+
+class CatalogSnapshot:
+    """One consistent load of the menu table."""
+
+    def __init__(self, version: int, items: list[CatalogItem]):
+        self.version = version
+        self.items = tuple(items)
+        self._by_id = {item.id: item for item in self.items}
+        self._by_label = {normalize_lookup_key(item.name, item.category): item for item in self.items}
+        self._by_name: dict[str, CatalogItem] = {}
+        for item in self.items:
+            self._by_name.setdefault(normalize_lookup_key(item.name, None)[0], item)
+
+    def get(self, item_id: int) -> CatalogItem | None:
+        return self._by_id.get(item_id)
+
+    def find_by_label(self, label: object, category_hint: str | None = None) -> CatalogItem | None:
+        """Resolve a customization label such as ``"Oat Milk"`` to a menu item."""
+        if not isinstance(label, str):
+            return None
+        value = label.strip()
+        if not value or value.lower() == "none":
+            return None
+        candidate = self._by_label.get(normalize_lookup_key(value, category_hint))
+        if candidate:
+            return candidate
+        return self._by_name.get(value.lower())
+
+
+class _VersionedCache(ABC):
+    """Lazily loaded copy of some rows, reloaded when a shared counter moves."""
+
+    version_name: str
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+        with ReadSessionLocal() as session:
+            # Read the counter first: a concurrent write can only make the rows
+            # newer than the version, which at worst causes one extra reload.
+            version = read_version(session, self.version_name)
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(session, version)
+                self._snapshot = snapshot
+        self._checked_at = now
+        return snapshot
+
+    @abstractmethod
+    def _load(self, session, version: int):
+        """Read the cached rows; the result must carry ``version``."""
+
+
+class MenuCatalog(_VersionedCache):
+    """Version-checked cache of the menu, without stock levels."""
+
+    version_name = MENU_VERSION
+
+    def _load(self, session, version: int) -> CatalogSnapshot:
+        rows = session.scalars(select(MenuItem).order_by(MenuItem.category, MenuItem.name)).all()
+        return CatalogSnapshot(
+            version,
+            [
+                CatalogItem(
+                    id=row.id,
+                    name=row.name,
+                    category=row.category,
+                    price=row.price,
+                    is_active=bool(row.is_active),
+                )
+                for row in rows
+            ],
+        )
+
+    def items(self) -> tuple[CatalogItem, ...]:
+        return self.snapshot().items
+
+    def get(self, item_id: int) -> CatalogItem | None:
+        return self.snapshot().get(item_id)
+
+
+class StockSnapshot:
+    """One load of ``menu_items.quantity`` by id."""
+
+    def __init__(self, version: int, quantities: dict[int, int]):
+        self.version = version
+        self.quantities = quantities
+
+    def get(self, item_id: int) -> int:
+        return self.quantities.get(item_id, 0)
+
+
+class StockLevels(_VersionedCache):
+    """Version-checked cache of stock, for menu reads only."""
+
+    version_name = STOCK_VERSION
+
+    def _load(self, session, version: int) -> StockSnapshot:
+        rows = session.execute(select(MenuItem.id, MenuItem.quantity))
+        return StockSnapshot(version, {item_id: int(quantity or 0) for item_id, quantity in rows})
+
+
+catalog = MenuCatalog()
+stock = StockLevels()
+
+
+def mark_menu_changed(session) -> None:
+    """Record a change to menu names, prices or availability in the caller's transaction."""
+    bump_version(session, MENU_VERSION)
+    session.info[_MENU_CHANGED_FLAG] = True
+
+
+def mark_stock_changed(session) -> None:
+    """Record a ``menu_items.quantity`` write in the caller's transaction."""
+    bump_version(session, STOCK_VERSION)
+    session.info[_STOCK_CHANGED_FLAG] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    if session.info.pop(_MENU_CHANGED_FLAG, False):
+        catalog.invalidate()
+    if session.info.pop(_STOCK_CHANGED_FLAG, False):
+        stock.invalidate()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_MENU_CHANGED_FLAG, None)
+    session.info.pop(_STOCK_CHANGED_FLAG, None)
@@ -1,15 +1,20 @@
 """Lightweight database helpers."""
 from pathlib import Path
+from urllib.parse import quote
 import os
+import threading
+import time
 
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = PROJECT_ROOT / "data" / "app.db"
 DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DEFAULT_DB_PATH}"
 
 connect_args = {}
+db_path = None
 if DATABASE_URL.startswith("sqlite"):
     raw_path = DATABASE_URL.split("sqlite:///", 1)[1] if "sqlite:///" in DATABASE_URL else ""
     if raw_path and raw_path != ":memory:":
@@ -20,15 +25,144 @@ if DATABASE_URL.startswith("sqlite"):
         db_path.parent.mkdir(parents=True, exist_ok=True)
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args, future=True, pool_pre_ping=True)
+# Called with (pool, seconds) after every checkout from a TimedQueuePool.
+pool_wait_listeners = []
 
 
-if DATABASE_URL.startswith("sqlite"):
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            for listener in pool_wait_listeners:
+                listener(self, waited)
+
+
+# In-memory SQLite needs its default single-connection pool.
+_pool_options = {"poolclass": TimedQueuePool} if db_path is not None or not DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args, future=True, pool_pre_ping=True, **_pool_options)
+
+
+# Connection-level tuning applied to every SQLite connection. WAL lets readers
+# run alongside the single writer, busy_timeout makes writers queue instead of
+# failing with "database is locked", and synchronous=NORMAL is durable in WAL
+# mode apart from the last commits before a power loss. SQLITE_PROFILE=legacy
+# keeps only foreign key enforcement.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").strip().lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-16000")),  # negative = KiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+SQLITE_CHECKPOINT_SECONDS = float(os.getenv("SQLITE_CHECKPOINT_SECONDS", "60"))
+SQLITE_CHECKPOINT_MODE = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE").strip().upper()
+
+_IS_SQLITE = DATABASE_URL.startswith("sqlite")
+_checkpoint_lock = threading.Lock()
+_last_checkpoint = time.monotonic()
+
+
+def active_sqlite_pragmas() -> dict[str, object]:
+    """Pragmas applied on connect for the configured profile."""
+    if not _IS_SQLITE or SQLITE_PROFILE == "legacy":
+        return {}
+    return dict(SQLITE_PRAGMAS)
+
+
+def _checkpoint_due() -> bool:
+    global _last_checkpoint
+    if SQLITE_CHECKPOINT_SECONDS <= 0:
+        return False
+    with _checkpoint_lock:
+        now = time.monotonic()
+        if now - _last_checkpoint < SQLITE_CHECKPOINT_SECONDS:
+            return False
+        _last_checkpoint = now
+        return True
+
+
+if _IS_SQLITE:
     @event.listens_for(engine, "connect")
-    def _set_sqlite_foreign_keys(dbapi_connection, connection_record):
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys = ON")
+        for name, value in active_sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name} = {value}")
         cursor.close()
 
+    @event.listens_for(engine, "checkin")
+    def _checkpoint_wal(dbapi_connection, connection_record):
+        # Checked-in connections have no open transaction, so this is the one
+        # place a checkpoint can run without blocking a request. Throttled per
+        # process; PASSIVE never waits on readers or writers.
+        if dbapi_connection is None or not _checkpoint_due():
+            return
+        if str(active_sqlite_pragmas().get("journal_mode", "")).upper() != "WAL":
+            return
+        try:
+            dbapi_connection.execute(f"PRAGMA wal_checkpoint({SQLITE_CHECKPOINT_MODE})").fetchall()
+        except Exception:
+            pass
+
+
+# Long reads (analytics, listings, the order stream) opt into ReadSessionLocal.
+# For a SQLite file it opens the same database with mode=ro on its own pool,
+# so a slow report can neither take the write lock nor starve the writer pool.
+# READ_DATABASE_URL points it at a replica instead.
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "5"))
+READ_POOL_OVERFLOW = int(os.getenv("READ_POOL_OVERFLOW", "5"))
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL") or (
+    f"sqlite:///file:{quote(str(db_path))}?mode=ro&uri=true" if db_path is not None else None
+)
+_READ_ONLY_PRAGMAS = ("busy_timeout", "mmap_size", "cache_size", "temp_store")
+
+if READ_DATABASE_URL:
+    read_engine = create_engine(
+        READ_DATABASE_URL,
+        connect_args=connect_args if READ_DATABASE_URL.startswith("sqlite") else {},
+        future=True,
+        pool_pre_ping=True,
+        poolclass=TimedQueuePool,
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_OVERFLOW,
+    )
+else:
+    # In-memory databases cannot be shared with a second engine.
+    read_engine = engine
+
+if read_engine is not engine and READ_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(read_engine, "connect")
+    def _set_read_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only = ON")
+        pragmas = active_sqlite_pragmas()
+        for name in _READ_ONLY_PRAGMAS:
+            if name in pragmas:
+                cursor.execute(f"PRAGMA {name} = {pragmas[name]}")
+        cursor.close()
+
+
+def sqlite_settings() -> dict[str, object]:
+    """Read back the effective pragmas from a live connection for diagnostics."""
+    if not _IS_SQLITE:
+        return {}
+    names = ("foreign_keys", *SQLITE_PRAGMAS)
+    with engine.connect() as connection:
+        settings = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in names
+        }
+    settings["profile"] = SQLITE_PROFILE
+    settings["checkpoint_seconds"] = SQLITE_CHECKPOINT_SECONDS
+    return settings
+
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
@@ -0,0 +1,30 @@
+"""Conditional GET helpers built on cheap change markers."""
+import hashlib
+
+from flask import Response, request
+
+
+def make_etag(*parts) -> str:
+    """Return a strong entity tag for the given change-marker parts."""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _apply_cache_headers(response: Response, etag: str, private: bool) -> Response:
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    if private:
+        response.vary.add("Authorization")
+    return response
+
+
+def not_modified(etag: str, *, private: bool = False) -> Response | None:
+    """Return a bodiless 304 when the client already holds ``etag``."""
+    if not request.if_none_match.contains(etag):
+        return None
+    return _apply_cache_headers(Response(status=304), etag, private)
+
+
+def with_etag(response: Response, etag: str, *, private: bool = False) -> Response:
+    """Attach ``etag`` and revalidation headers to a full response."""
+    return _apply_cache_headers(response, etag, private)
@@ -0,0 +1,130 @@
+"""Order lifecycle event log shared by every worker.
+
+Writers append rows to ``order_events`` in the same transaction as the order
+change, so an event exists exactly when its change is committed. Streaming
+clients keep a cursor on the event id and poll the table, which fans changes
+out across gunicorn workers without an external broker.
+
+A stream holds one of its worker's request threads until it ends, so each
+worker serves at most ``STREAM_MAX_PER_WORKER`` streams and turns the rest
+away. ``EventSource`` cannot send headers, and a token in the query string
+ends up in access logs. The stream therefore takes a token from
+``issue_stream_token`` in ``?token=`` that is good for nothing else.
+``EventSource`` reconnects to the same URL every ``STREAM_MAX_SECONDS``, so
+that token lasts as long as the login that minted it. A stream whose login
+expires before its next reconnect ends early with a ``token_expired`` event,
+and the client mints a new token rather than retrying into a 401.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from itsdangerous import BadData, URLSafeSerializer
+from sqlalchemy import delete, func, insert, select
+
+from .models import OrderEvent
+
+ORDER_EVENT_TYPES = ("created", "status_changed", "completed", "deleted")
+
+STREAM_POLL_SECONDS = float(os.getenv("ORDER_STREAM_POLL_SECONDS", "1.0"))
+# Streams end after this long and EventSource reconnects with Last-Event-ID.
+STREAM_MAX_SECONDS = float(os.getenv("ORDER_STREAM_MAX_SECONDS", "30"))
+# Half of a gthread worker's threads by default; none on a sync worker, where
+# one stream would hold the whole process.
+_default_streams = max(0, int(os.getenv("GUNICORN_THREADS", "4")) // 2)
+STREAM_MAX_PER_WORKER = int(os.getenv("ORDER_STREAM_MAX_PER_WORKER") or _default_streams)
+STREAM_BUSY_RETRY_SECONDS = 5
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_RETRY_MILLISECONDS = 1000
+STREAM_BATCH_SIZE = 200
+STREAM_EXPIRED_EVENT = "token_expired"
+EVENT_RETENTION = timedelta(hours=float(os.getenv("ORDER_EVENT_RETENTION_HOURS", "24")))
+
+
+def record_order_events(session, events: list[tuple[str, int, dict]]) -> None:
+    """Append ``(event_type, order_item_id, payload)`` rows in one batch."""
+    rows = []
+    for event_type, order_item_id, payload in events:
+        if event_type not in ORDER_EVENT_TYPES:
+            raise ValueError(f"unknown order event type: {event_type}")
+        rows.append(
+            {
+                "event_type": event_type,
+                "order_item_id": order_item_id,
+                "payload": json.dumps(payload, separators=(",", ":")),
+            }
+        )
+    if rows:
+        session.execute(insert(OrderEvent), rows)
+
+
+def record_order_event(session, event_type: str, order_item_id: int, payload: dict) -> None:
+    record_order_events(session, [(event_type, order_item_id, payload)])
+
+
+def latest_order_event_id(session) -> int:
+    return int(session.scalar(select(func.max(OrderEvent.id))) or 0)
+
+
+def fetch_order_events(session, after_id: int, limit: int = STREAM_BATCH_SIZE) -> list[OrderEvent]:
+    stmt = select(OrderEvent).where(OrderEvent.id > after_id).order_by(OrderEvent.id).limit(limit)
+    return list(session.scalars(stmt))
+
+
+def prune_order_events(session, retention: timedelta = EVENT_RETENTION) -> int:
+    """Drop events older than ``retention``; returns the number removed."""
+    cutoff = datetime.now(timezone.utc) - retention
+    result = session.execute(delete(OrderEvent).where(OrderEvent.created_at < cutoff))
+    return int(result.rowcount or 0)
+
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def acquire_stream_slot() -> bool:
+    """Claim one of this worker's stream slots; False when all are taken."""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= STREAM_MAX_PER_WORKER:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream_slot() -> None:
+    global _open_streams
+    with _streams_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def _stream_serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.config["JWT_SECRET_KEY"], salt="order-stream")
+
+
+def issue_stream_token(identity: str, role: str, expires_at: int | None) -> str:
+    """Stream-only token carrying the ``exp`` of the access token it was minted with."""
+    return _stream_serializer().dumps({"sub": identity, "role": role, "exp": expires_at})
+
+
+def read_stream_token(token: str) -> dict | None:
+    """Claims of a stream token, or None when it is forged or its login has expired."""
+    try:
+        claims = _stream_serializer().loads(token)
+    except BadData:
+        return None
+    expires_at = claims.get("exp")
+    if expires_at is not None and expires_at <= time.time():
+        return None
+    return claims
+
+
+def format_expired() -> str:
+    return f"event: {STREAM_EXPIRED_EVENT}\ndata: {{}}\n\n"
+
+
+def format_sse(event: OrderEvent) -> str:
+    return f"id: {event.id}\nevent: {event.event_type}\ndata: {event.payload or '{}'}\n\n"
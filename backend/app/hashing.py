@@ -0,0 +1,101 @@
+"""Password hashing on a bounded process pool.
+
+Hashing is deliberately slow, so ``login`` and ``register`` hand it to a
+per-worker ``ProcessPoolExecutor`` of ``PASSWORD_HASH_WORKERS`` processes
+(0 hashes inline in the request thread). At most ``PASSWORD_HASH_QUEUE_LIMIT``
+hashes may be running or waiting at once; beyond that ``HashingBusy`` is
+raised and the endpoints answer 503 with ``Retry-After`` rather than letting a
+login burst queue without bound. If a hashing process dies (OOM kill, crash),
+the broken pool is dropped, that request gets the same 503, and the next one
+starts a fresh pool.
+
+The pool starts its processes through a ``forkserver`` (``spawn`` where that
+is unavailable), never by forking the server worker directly: by the time
+the pool starts, the worker runs request and archiver threads, and a fork
+could copy a lock one of them holds into a child that then never gets it.
+
+``PASSWORD_HASH_METHOD`` is a full werkzeug method string. Hashes stored with
+any other method or cost are rehashed on the next successful login.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16"))
+RETRY_AFTER_SECONDS = 1
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs werkzeug hashing on a lazily started, bounded process pool."""
+
+    def __init__(self, workers: int | None = None, queue_limit: int | None = None, method: str | None = None):
+        self.workers = PASSWORD_HASH_WORKERS if workers is None else workers
+        self.queue_limit = PASSWORD_HASH_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.method = method or PASSWORD_HASH_METHOD
+        self._slots = threading.BoundedSemaphore(max(1, self.queue_limit))
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._owner_pid: int | None = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Start the pool on first use so each forked server worker gets its own.
+        with self._lock:
+            if self._executor is None or self._owner_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(_START_METHOD)
+                )
+                self._owner_pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("password hashing is saturated")
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            executor = self._pool()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool as exc:
+                self._discard(executor)
+                raise HashingBusy("password hashing pool broke; restarting it") from exc
+        finally:
+            self._slots.release()
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        # Only the first caller to see the breakage replaces the pool.
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_hash.split("$", 1)[0] != self.method
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None and self._owner_pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,294 @@
+"""Monthly partitions of order history.
+
+``order_records`` keeps recent history. ``python -m app.manage history
+compact`` moves every month older than the last ``HISTORY_HOT_MONTHS``
+(counting the current one) into its own SQLite file under
+``HISTORY_ARCHIVE_DIR``. Each file gets a row in ``history_partitions`` that
+records the span of completion times it holds. Archive files are written
+once, vacuumed and made read-only. If late rows arrive for a month that is
+already compacted, the next run writes a new generation of that month's
+file. The catalog row switches to it in the same transaction that deletes
+the rows from ``order_records``, so readers see every row exactly once.
+Files the catalog no longer points at are removed on the following run.
+
+Readers route by date. ``partitions`` finds the months that overlap a range
+from the catalog alone. ``attached`` opens one month read-only
+(``immutable=1``) on the session's connection for the length of a query. A
+request therefore only opens the files its range needs. Attach before the
+session writes anything, because SQLite cannot detach inside a transaction.
+"""
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, and_, delete, func, insert, inspect, select
+
+from .db import SessionLocal, db_path, engine
+from .models import HistoryPartition, OrderAddon, OrderRecord
+from .versions import ORDERS_VERSION, bump_version
+
+_default_dir = f"{db_path}.history" if db_path is not None else ""
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", _default_dir)
+HISTORY_HOT_MONTHS = max(1, int(os.getenv("HISTORY_HOT_MONTHS", "3")))
+
+READ_SCHEMA = "history_month"
+_SOURCE_SCHEMA = "history_source"
+_TARGET_SCHEMA = "history_target"
+_FILE_PREFIX = "order_records_"
+
+_archive_metadata = MetaData()
+
+
+def _define_tables(schema: str) -> tuple[Table, Table]:
+    records = Table(
+        "order_records",
+        _archive_metadata,
+        *(Column(column.name, column.type, primary_key=column.primary_key) for column in OrderRecord.__table__.columns),
+        Index("ix_order_records_member_completed", "member_id", "completed_at", "id"),
+        Index("ix_order_records_completed", "completed_at", "id"),
+        Index("ix_order_records_ticket", "ticket_id"),
+        schema=schema,
+    )
+    addons = Table(
+        "order_addons",
+        _archive_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("order_record_id", Integer, nullable=False),
+        Column("position", Integer, nullable=False),
+        Column("label", String(120), nullable=False),
+        Index("ix_order_addons_order_record", "order_record_id", "position"),
+        schema=schema,
+    )
+    return records, addons
+
+
+# Defined up front: Table() is not safe to call concurrently for the same name.
+_TABLES = {schema: _define_tables(schema) for schema in (READ_SCHEMA, _SOURCE_SCHEMA, _TARGET_SCHEMA)}
+
+
+def archive_tables(schema: str = READ_SCHEMA) -> tuple[Table, Table]:
+    """``order_records`` and ``order_addons`` of an archive file attached as ``schema``."""
+    return _TABLES[schema]
+
+
+def archive_path(file_name: str) -> Path:
+    return Path(HISTORY_ARCHIVE_DIR) / file_name
+
+
+def _read_only_uri(path: Path) -> str:
+    return f"file:{quote(str(path))}?mode=ro&immutable=1"
+
+
+def _month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def _completion(records):
+    # Legacy rows may lack completed_at; they are filed by creation time.
+    return func.coalesce(records.c.completed_at, records.c.created_at)
+
+
+_catalog_ready = False
+
+
+def _has_catalog(session) -> bool:
+    # Migration steps older than the catalog table read history through here too.
+    global _catalog_ready
+    if not _catalog_ready:
+        _catalog_ready = inspect(session.connection()).has_table(HistoryPartition.__tablename__)
+    return _catalog_ready
+
+
+def partitions(session, since: datetime | None = None, until: datetime | None = None) -> list[HistoryPartition]:
+    """Compacted months with rows completed within ``[since, until]``, newest first."""
+    if not _has_catalog(session):
+        return []
+    stmt = select(HistoryPartition).order_by(HistoryPartition.month.desc())
+    if since is not None:
+        stmt = stmt.where(HistoryPartition.last_completed_at >= since)
+    if until is not None:
+        stmt = stmt.where(HistoryPartition.first_completed_at <= until)
+    return list(session.scalars(stmt))
+
+
+@contextmanager
+def attached(session, partition: HistoryPartition):
+    """Attach ``partition`` read-only for the block; yields its (records, addons) tables."""
+    connection = session.connection()
+    uri = _read_only_uri(archive_path(partition.file_name))
+    connection.exec_driver_sql(f"ATTACH DATABASE ? AS {READ_SCHEMA}", (uri,))
+    try:
+        yield archive_tables(READ_SCHEMA)
+    finally:
+        connection.exec_driver_sql(f"DETACH DATABASE {READ_SCHEMA}")
+
+
+def history_tables(session, since: datetime | None = None, until: datetime | None = None):
+    """Yield (records, addons) for ``order_records`` and then each overlapping compacted month."""
+    yield OrderRecord.__table__, OrderAddon.__table__
+    for partition in partitions(session, since, until):
+        with attached(session, partition) as tables:
+            yield tables
+
+
+def parse_date_range(since_raw: str | None, until_raw: str | None) -> tuple[datetime | None, datetime | None]:
+    """Turn inclusive ``YYYY-MM-DD`` query bounds into ``[since, until)`` wall-clock datetimes."""
+    bounds = []
+    for raw, days in ((since_raw, 0), (until_raw, 1)):
+        if not raw:
+            bounds.append(None)
+            continue
+        try:
+            day = date.fromisoformat(raw.strip())
+        except ValueError as exc:
+            raise ValueError("since and until must be YYYY-MM-DD") from exc
+        bounds.append(_midnight(day) + timedelta(days=days))
+    since, until = bounds
+    if since is not None and until is not None and since >= until:
+        raise ValueError("since must not be after until")
+    return since, until
+
+
+def closed_months(session, now: datetime, keep_months: int = HISTORY_HOT_MONTHS) -> list[date]:
+    """Months still in ``order_records`` that are older than the ``keep_months`` newest."""
+    cutoff = _add_months(_month_start(now), -(max(1, keep_months) - 1))
+    completion = _completion(OrderRecord.__table__)
+    month = func.strftime("%Y-%m-01", completion)
+    rows = session.scalars(select(month).where(completion < _midnight(cutoff)).distinct().order_by(month))
+    return [date.fromisoformat(value) for value in rows if value]
+
+
+def _archived_columns(source, names: list[str]) -> list:
+    # Every archived row gets a completion time, so the history keyset reaches it.
+    return [_completion(source) if name == "completed_at" else source.c[name] for name in names]
+
+
+def _write_archive(file_name: str, previous_file: str | None, moved) -> tuple[int, datetime, datetime]:
+    """Write the previous generation plus the ``moved`` rows to a new read-only file."""
+    path = archive_path(file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f"{path.name}.tmp")
+    staging.unlink(missing_ok=True)
+    records, addons = archive_tables(_TARGET_SCHEMA)
+    source_records, source_addons = archive_tables(_SOURCE_SCHEMA)
+    names = [column.name for column in records.columns]
+    addon_names = ["order_record_id", "position", "label"]
+    live = OrderRecord.__table__
+
+    with engine.connect() as connection:
+        schemas = [_TARGET_SCHEMA]
+        connection.exec_driver_sql(f"ATTACH DATABASE ? AS {_TARGET_SCHEMA}", (str(staging),))
+        try:
+            if previous_file:
+                uri = _read_only_uri(archive_path(previous_file))
+                connection.exec_driver_sql(f"ATTACH DATABASE ? AS {_SOURCE_SCHEMA}", (uri,))
+                schemas.append(_SOURCE_SCHEMA)
+            records.create(connection)
+            addons.create(connection)
+            if previous_file:
+                connection.execute(insert(records).from_select(names, select(*_archived_columns(source_records, names))))
+                connection.execute(
+                    insert(addons).from_select(addon_names, select(*(source_addons.c[name] for name in addon_names)))
+                )
+            connection.execute(insert(records).from_select(names, select(*_archived_columns(live, names)).where(moved)))
+            connection.execute(
+                insert(addons).from_select(
+                    addon_names,
+                    select(OrderAddon.order_record_id, OrderAddon.position, OrderAddon.label).where(
+                        OrderAddon.order_record_id.in_(select(live.c.id).where(moved))
+                    ),
+                )
+            )
+            completion = _completion(records)
+            count, first_at, last_at = connection.execute(
+                select(func.count(), func.min(completion), func.max(completion)).select_from(records)
+            ).one()
+            connection.commit()
+            connection.exec_driver_sql(f"VACUUM {_TARGET_SCHEMA}")
+        finally:
+            connection.rollback()
+            for schema in schemas:
+                connection.exec_driver_sql(f"DETACH DATABASE {schema}")
+
+    os.chmod(staging, 0o444)
+    os.replace(staging, path)
+    return count, first_at, last_at
+
+
+def compact_month(month: date) -> int:
+    """Move one month of ``order_records`` into its archive file; returns rows moved."""
+    month = _month_start(month)
+    completion = _completion(OrderRecord.__table__)
+    in_month = and_(completion >= _midnight(month), completion < _midnight(_add_months(month, 1)))
+    with SessionLocal() as session:
+        last_id = session.scalar(select(func.max(OrderRecord.id)).where(in_month))
+        previous = session.get(HistoryPartition, month)
+        previous_file = previous.file_name if previous else None
+        generation = previous.generation + 1 if previous else 1
+    if last_id is None:
+        return 0
+
+    # order_records ids only grow, so this bound pins the set of rows copied.
+    moved = and_(in_month, OrderRecord.id <= last_id)
+    file_name = f"{_FILE_PREFIX}{month:%Y_%m}.{generation}.db"
+    count, first_at, last_at = _write_archive(file_name, previous_file, moved)
+
+    with SessionLocal() as session:
+        partition = session.get(HistoryPartition, month)
+        if (partition.generation if partition else 0) != generation - 1:
+            raise RuntimeError(f"{month:%Y-%m} was compacted concurrently")
+        if partition is None:
+            partition = HistoryPartition(month=month)
+            session.add(partition)
+        partition.file_name = file_name
+        partition.generation = generation
+        partition.record_count = count
+        partition.first_completed_at = first_at
+        partition.last_completed_at = last_at
+        partition.compacted_at = datetime.now(timezone.utc)
+        moved_ids = select(OrderRecord.id).where(moved)
+        session.execute(
+            delete(OrderAddon)
+            .where(OrderAddon.order_record_id.in_(moved_ids))
+            .execution_options(synchronize_session=False)
+        )
+        result = session.execute(delete(OrderRecord).where(moved).execution_options(synchronize_session=False))
+        bump_version(session, ORDERS_VERSION)
+        session.commit()
+    return int(result.rowcount or 0)
+
+
+def remove_stale_files(session) -> int:
+    """Delete archive files the catalog no longer points at; returns files removed."""
+    directory = Path(HISTORY_ARCHIVE_DIR)
+    if not HISTORY_ARCHIVE_DIR or not directory.is_dir():
+        return 0
+    referenced = set(session.scalars(select(HistoryPartition.file_name)))
+    removed = 0
+    for path in directory.glob(f"{_FILE_PREFIX}*"):
+        if path.name not in referenced:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def compact_history(now: datetime | None = None, keep_months: int = HISTORY_HOT_MONTHS) -> dict[str, int]:
+    """Compact every closed month; returns rows moved per ``YYYY-MM``."""
+    if not HISTORY_ARCHIVE_DIR:
+        raise RuntimeError("HISTORY_ARCHIVE_DIR is not set")
+    now = now or datetime.now(timezone.utc).astimezone()
+    with SessionLocal() as session:
+        remove_stale_files(session)
+        months = closed_months(session, now, keep_months)
+    return {f"{month:%Y-%m}": compact_month(month) for month in months}
@@ -0,0 +1,120 @@
+"""Idempotency keys for ``POST /api/orders``.
+
+Tablets send an ``Idempotency-Key`` header and resend it when a retry follows
+a dropped connection. A successful order stores its status and compact JSON
+body under ``(principal, key)`` in the same transaction as the order, so a key
+exists exactly when its order does. Later requests with that key get the
+stored response back without validating the cart or touching stock; a key
+reused with a different body is rejected. Failed requests store nothing, so
+the client can correct the cart and retry with the same key.
+
+Rows expire after ``IDEMPOTENCY_KEY_TTL_HOURS``. Each worker deletes one batch
+of expired rows at most every ``IDEMPOTENCY_SWEEP_SECONDS``, and
+``python -m app.manage idempotency sweep`` clears the backlog.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select, tuple_
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+KEY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24")))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_SWEEP_SECONDS", "300"))
+SWEEP_BATCH_SIZE = 500
+
+
+def key_scope(account_type: str | None, account_id: int | None) -> str:
+    """Keys are per principal so two clients cannot read each other's responses."""
+    if account_type and account_id:
+        return f"{account_type}:{account_id}"
+    return "guest"
+
+
+def request_fingerprint(data) -> str:
+    """Stable hash of a JSON request body, independent of key order and spacing."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def find_key(session, scope: str, key: str) -> IdempotencyKey | None:
+    """Return the stored row for ``key``, expired or not."""
+    return session.scalar(select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key))
+
+
+def is_expired(row: IdempotencyKey, now: datetime | None = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= now
+
+
+def store_response(session, scope: str, key: str, fingerprint: str, status_code: int, body: dict) -> None:
+    """Insert the response in the caller's transaction.
+
+    Raises ``IntegrityError`` when another request committed the same key
+    first; the caller rolls back and replays the stored response instead.
+    """
+    now = datetime.now(timezone.utc)
+    session.execute(
+        insert(IdempotencyKey).values(
+            scope=scope,
+            key=key,
+            request_hash=fingerprint,
+            status_code=status_code,
+            response_body=json.dumps(body, separators=(",", ":")),
+            created_at=now,
+            expires_at=now + KEY_TTL,
+        )
+    )
+
+
+def discard_key(session, scope: str, key: str) -> None:
+    """Drop an expired row so the key can be stored again."""
+    session.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sweep_expired_keys(session, now: datetime | None = None, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Delete up to ``batch_size`` expired rows; returns the number removed."""
+    now = now or datetime.now(timezone.utc)
+    expired = (
+        select(IdempotencyKey.scope, IdempotencyKey.key)
+        .where(IdempotencyKey.expires_at <= now)
+        .order_by(IdempotencyKey.expires_at)
+        .limit(batch_size)
+    )
+    result = session.execute(
+        delete(IdempotencyKey)
+        .where(tuple_(IdempotencyKey.scope, IdempotencyKey.key).in_(expired))
+        .execution_options(synchronize_session=False)
+    )
+    return int(result.rowcount or 0)
+
+
+class _SweepTimer:
+    """Per-process throttle so at most one request per interval pays for a sweep."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic() + interval
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_at:
+                return False
+            self._next_at = now + self.interval
+            return True
+
+
+sweep_timer = _SweepTimer(SWEEP_INTERVAL_SECONDS)
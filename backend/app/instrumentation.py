@@ -0,0 +1,165 @@
+"""Per-request SQL statement counts and latency.
+
+``init_app`` wraps every request in a ``QueryStats`` collector fed by the
+``before_cursor_execute``/``after_cursor_execute`` events of both engines.
+Responses carry a ``Server-Timing`` header (``db`` with the statement count,
+``total`` wall time), per-endpoint totals accumulate in ``endpoint_stats``,
+latency feeds the ``/api/metrics`` histograms, and a warning is logged when a request exceeds ``SLOW_REQUEST_MS`` or
+``SLOW_REQUEST_QUERIES``.
+
+Tests assert budgets with ``query_budget``, which counts statements issued by
+the current thread::
+
+    with query_budget(6):
+        client.post("/api/orders", json=payload, headers=headers)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from . import metrics
+from .db import engine, read_engine
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "1") != "0"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "30"))
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+    sql: list[str] = field(default_factory=list)
+    keep_sql: bool = False
+
+
+_collectors: ContextVar[tuple[QueryStats, ...]] = ContextVar("query_collectors", default=())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors.get():
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors.get()
+    if not collectors:
+        return
+    started = conn.info.get("query_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    for stats in collectors:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.keep_sql:
+            stats.sql.append(statement)
+
+
+for _engine in {engine, read_engine}:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def count_queries(keep_sql: bool = False):
+    """Collect statements issued by this thread inside the block."""
+    stats = QueryStats(keep_sql=keep_sql)
+    token = _collectors.set((*_collectors.get(), stats))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def query_budget(limit: int):
+    """Fail with ``AssertionError`` if the block issues more than ``limit`` statements."""
+    with count_queries(keep_sql=True) as stats:
+        yield stats
+    if stats.statements > limit:
+        listing = "\n".join(f"  {sql}" for sql in stats.sql)
+        raise AssertionError(f"{stats.statements} statements exceed the budget of {limit}:\n{listing}")
+
+
+class EndpointStats:
+    """Per-process totals keyed by Flask endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: dict[str, dict[str, float]] = {}
+
+    def add(self, endpoint: str, statements: int, db_seconds: float, wall_seconds: float) -> None:
+        with self._lock:
+            entry = self._totals.setdefault(
+                endpoint, {"requests": 0, "statements": 0, "db_ms": 0.0, "wall_ms": 0.0, "max_wall_ms": 0.0}
+            )
+            entry["requests"] += 1
+            entry["statements"] += statements
+            entry["db_ms"] += db_seconds * 1000
+            entry["wall_ms"] += wall_seconds * 1000
+            entry["max_wall_ms"] = max(entry["max_wall_ms"], wall_seconds * 1000)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {endpoint: dict(entry) for endpoint, entry in self._totals.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def _start_request() -> None:
+    stats = QueryStats()
+    g.query_stats = stats
+    g.query_stats_token = _collectors.set((*_collectors.get(), stats))
+    g.request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    stats = g.pop("query_stats", None)
+    if stats is None:
+        return response
+    _collectors.reset(g.pop("query_stats_token"))
+    wall = time.perf_counter() - g.pop("request_started")
+    endpoint = request.endpoint or "unmatched"
+    endpoint_stats.add(endpoint, stats.statements, stats.db_seconds, wall)
+    metrics.observe_request(request.blueprint, endpoint, request.method, response.status_code, wall)
+    if SERVER_TIMING_ENABLED:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} queries", total;dur={wall * 1000:.2f}',
+        )
+    if wall * 1000 >= SLOW_REQUEST_MS or stats.statements >= SLOW_REQUEST_QUERIES:
+        current_app.logger.warning(
+            "slow request %s %s (%s): %.1fms, %d statements, %.1fms in db",
+            request.method,
+            request.path,
+            endpoint,
+            wall * 1000,
+            stats.statements,
+            stats.db_seconds * 1000,
+        )
+    return response
+
+
+def _discard_request(exc) -> None:
+    # after_request is skipped when a handler raises; stop collecting anyway.
+    token = g.pop("query_stats_token", None)
+    if token is not None:
+        _collectors.reset(token)
+
+
+def init_app(app) -> None:
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_discard_request)
@@ -0,0 +1,92 @@
+"""Atomic stock movements for menu inventory."""
+from sqlalchemy import bindparam, select, update
+
+from .catalog import mark_stock_changed
+from .models import MenuItem
+
+RESERVATION_ATTEMPTS = 3
+CONTENTION_RETRY_AFTER_SECONDS = 1
+
+_menu_items = MenuItem.__table__
+
+_RESERVE_STMT = (
+    update(_menu_items)
+    .where(_menu_items.c.id == bindparam("item_id"))
+    .where(_menu_items.c.quantity >= bindparam("amount"))
+    .values(quantity=_menu_items.c.quantity - bindparam("amount"))
+)
+
+_RELEASE_STMT = (
+    update(_menu_items)
+    .where(_menu_items.c.id == bindparam("item_id"))
+    .values(quantity=_menu_items.c.quantity + bindparam("amount"))
+)
+
+
+class StockContention(RuntimeError):
+    """Raised when every reservation attempt lost a race without a real shortage."""
+
+
+def _movement_rows(amounts: dict[int, int]) -> list[dict[str, int]]:
+    return [
+        {"item_id": item_id, "amount": amount}
+        for item_id, amount in sorted(amounts.items())
+        if amount > 0
+    ]
+
+
+def find_shortages(session, requested: dict[int, int]) -> list[dict]:
+    """Return every requested item whose stock cannot cover the amount."""
+    if not requested:
+        return []
+    stmt = select(MenuItem.id, MenuItem.name, MenuItem.quantity).where(MenuItem.id.in_(list(requested)))
+    stock = {item_id: (name, quantity) for item_id, name, quantity in session.execute(stmt)}
+    shortages = []
+    for item_id, amount in sorted(requested.items()):
+        name, quantity = stock.get(item_id, (None, 0))
+        available = int(quantity or 0)
+        if available < amount:
+            shortages.append(
+                {
+                    "menu_item_id": item_id,
+                    "name": name,
+                    "requested": amount,
+                    "available": available,
+                }
+            )
+    return shortages
+
+
+def reserve_stock(session, requested: dict[int, int]) -> list[dict]:
+    """Decrement stock for all requested items in one conditional batch.
+
+    Each row is only decremented while ``quantity >= amount`` so concurrent
+    orders can never oversell. When any row misses, the session is rolled back
+    so no partial decrement survives and every short item is returned. If the
+    stock covered the order each time it was re-read but every attempt still
+    missed, ``StockContention`` is raised instead of reporting a shortage. Call
+    this before adding other pending objects to ``session``.
+    """
+    rows = _movement_rows(requested)
+    if not rows:
+        return []
+
+    for _attempt in range(RESERVATION_ATTEMPTS):
+        result = session.execute(_RESERVE_STMT, rows)
+        if result.rowcount == len(rows):
+            mark_stock_changed(session)
+            return []
+        session.rollback()
+        shortages = find_shortages(session, requested)
+        if shortages:
+            return shortages
+
+    raise StockContention("stock kept changing between reservation attempts")
+
+
+def release_stock(session, released: dict[int, int]) -> None:
+    """Return previously reserved stock in a single batch."""
+    rows = _movement_rows(released)
+    if rows:
+        session.execute(_RELEASE_STMT, rows)
+        mark_stock_changed(session)
@@ -5,7 +5,9 @@ from flask import Blueprint, jsonify, request
 from sqlalchemy import select
 
 from .auth import _json_error, role_required
+from .catalog import catalog, mark_menu_changed, mark_stock_changed, stock
 from .db import SessionLocal
+from .etags import make_etag, not_modified, with_etag
 from .models import MenuItem
 
 bp = Blueprint("items", __name__, url_prefix="/api/items")
@@ -14,13 +16,14 @@ CURRENCY_STEP = Decimal("0.01")
 
 ALLOWED_ITEM_CATEGORIES = {"tea", "milk", "addon"}
 
-def _serialize(item: MenuItem) -> dict:
+def _serialize(item, quantity: int | None = None) -> dict:
+    """Payload for a ``MenuItem`` row, or a ``CatalogItem`` with its cached ``quantity``."""
     return {
         "id": item.id,
         "name": item.name,
         "category": item.category,
         "price": float(item.price or 0),
-        "quantity": int(item.quantity or 0),
+        "quantity": int(item.quantity or 0) if quantity is None else quantity,
         "is_active": bool(item.is_active),
     }
 
@@ -47,9 +50,13 @@ def _parse_quantity(raw_value) -> int:
 
 @bp.get("")
 def list_items():
-    with SessionLocal() as session:
-        items = session.scalars(select(MenuItem).order_by(MenuItem.category, MenuItem.name)).all()
-        return jsonify([_serialize(item) for item in items])
+    snapshot = catalog.snapshot()
+    levels = stock.snapshot()
+    etag = make_etag("items", snapshot.version, levels.version)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_etag(jsonify([_serialize(item, levels.get(item.id)) for item in snapshot.items]), etag)
 
 
 @bp.post("")
@@ -84,6 +91,8 @@ def create_item():
             return _json_error("item with that name already exists", 409)
         item = MenuItem(name=name, category=category, price=price, is_active=is_active, quantity=quantity)
         session.add(item)
+        mark_menu_changed(session)
+        mark_stock_changed(session)
         session.commit()
         session.refresh(item)
         return jsonify(_serialize(item)), 201
@@ -91,11 +100,10 @@ def create_item():
 
 @bp.get("/<int:item_id>")
 def retrieve_item(item_id: int):
-    with SessionLocal() as session:
-        item = session.get(MenuItem, item_id)
-        if not item:
-            return _json_error("item not found", 404)
-        return jsonify(_serialize(item))
+    item = catalog.get(item_id)
+    if not item:
+        return _json_error("item not found", 404)
+    return jsonify(_serialize(item, stock.snapshot().get(item_id)))
 
 
 @bp.put("/<int:item_id>")
@@ -136,6 +144,7 @@ def update_item(item_id: int):
         if "is_active" in data:
             item.is_active = bool(data.get("is_active"))
 
+        mark_menu_changed(session)
         session.commit()
         session.refresh(item)
         return jsonify(_serialize(item))
@@ -160,6 +169,7 @@ def adjust_quantity(item_id: int):
         if new_quantity < 0:
             return _json_error("quantity cannot be negative", 400)
         item.quantity = new_quantity
+        mark_stock_changed(session)
         session.commit()
         session.refresh(item)
         return jsonify(_serialize(item))
@@ -173,5 +183,6 @@ def delete_item(item_id: int):
         if not item:
             return _json_error("item not found", 404)
         session.delete(item)
+        mark_menu_changed(session)
         session.commit()
         return jsonify({"message": "deleted"})
@@ -0,0 +1,75 @@
+"""Maintained member loyalty counters.
+
+``member_loyalty`` holds one row per member with the number of completed
+drinks, updated by ``app.archiver`` in the same transaction as the history
+rows. Rewards lookups read that row instead of summing ``order_records``.
+
+Run ``python -m app.manage loyalty backfill`` once to build the counters
+from existing history, and ``python -m app.manage loyalty check`` to
+re-derive them and report (or ``--repair``) drift.
+"""
+from collections import defaultdict
+
+from sqlalchemy import delete, func, insert, select, update
+
+from .history import history_tables
+from .models import MemberLoyalty
+
+
+def add_member_drinks(session, member_id: int | None, quantity: int) -> None:
+    """Adjust a member's counter by ``quantity`` (negative to reverse)."""
+    if not member_id or not quantity:
+        return
+    result = session.execute(
+        update(MemberLoyalty)
+        .where(MemberLoyalty.member_id == member_id)
+        .values(drink_count=MemberLoyalty.drink_count + quantity, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(MemberLoyalty).values(member_id=member_id, drink_count=quantity))
+
+
+def member_drink_count(session, member_id: int) -> int:
+    return int(session.scalar(select(MemberLoyalty.drink_count).where(MemberLoyalty.member_id == member_id)) or 0)
+
+
+def _derived_counts(session) -> dict[int, int]:
+    counts: dict[int, int] = defaultdict(int)
+    for records, _ in history_tables(session):
+        stmt = (
+            select(records.c.member_id, func.sum(records.c.qty))
+            .where(records.c.member_id.isnot(None))
+            .group_by(records.c.member_id)
+        )
+        for member_id, total in session.execute(stmt):
+            counts[member_id] += int(total or 0)
+    return dict(counts)
+
+
+def backfill_member_loyalty(session) -> int:
+    """Rebuild every counter from ``order_records``; returns rows written."""
+    counts = _derived_counts(session)
+    session.execute(delete(MemberLoyalty))
+    if counts:
+        session.execute(
+            insert(MemberLoyalty),
+            [{"member_id": member_id, "drink_count": total} for member_id, total in counts.items()],
+        )
+    return len(counts)
+
+
+def find_loyalty_mismatches(session) -> list[dict]:
+    """Compare stored counters against a fresh aggregate of history."""
+    derived = _derived_counts(session)
+    stored = {
+        member_id: int(count or 0)
+        for member_id, count in session.execute(select(MemberLoyalty.member_id, MemberLoyalty.drink_count))
+    }
+    mismatches = []
+    for member_id in sorted(set(derived) | set(stored)):
+        expected = derived.get(member_id, 0)
+        actual = stored.get(member_id, 0)
+        if expected != actual:
+            mismatches.append({"member_id": member_id, "expected": expected, "stored": actual})
+    return mismatches
@@ -0,0 +1,154 @@
+"""Maintenance commands: ``python -m app.manage <group> <command>``."""
+import argparse
+import sys
+
+from .archiver import ARCHIVE_BATCH_SIZE, archive_pending
+from .db import SessionLocal
+from .history import HISTORY_HOT_MONTHS, compact_history
+from .idempotency import SWEEP_BATCH_SIZE, sweep_expired_keys
+from .loyalty import backfill_member_loyalty, find_loyalty_mismatches
+from .migrations import LATEST_VERSION, current_version, migrate
+from .order_options import BACKFILL_BATCH_SIZE, backfill_order_options
+from .rollups import rebuild_sales_rollups
+
+
+def _loyalty_backfill(args) -> int:
+    with SessionLocal() as session:
+        written = backfill_member_loyalty(session)
+        session.commit()
+    print(f"backfilled {written} member counters")
+    return 0
+
+
+def _loyalty_check(args) -> int:
+    with SessionLocal() as session:
+        mismatches = find_loyalty_mismatches(session)
+        for entry in mismatches:
+            print(f"member {entry['member_id']}: stored {entry['stored']}, expected {entry['expected']}")
+        if not mismatches:
+            print("member loyalty counters are consistent")
+            return 0
+        if not args.repair:
+            return 1
+        backfill_member_loyalty(session)
+        session.commit()
+    print(f"repaired {len(mismatches)} member counters")
+    return 0
+
+
+def _rollups_rebuild(args) -> int:
+    with SessionLocal() as session:
+        processed = rebuild_sales_rollups(session)
+        session.commit()
+    print(f"rebuilt sales rollups from {processed} order records")
+    return 0
+
+
+def _options_backfill(args) -> int:
+    with SessionLocal() as session:
+        processed = backfill_order_options(session, batch_size=args.batch_size)
+    print(f"backfilled options for {processed} order rows")
+    return 0
+
+
+def _idempotency_sweep(args) -> int:
+    removed = 0
+    with SessionLocal() as session:
+        while True:
+            batch = sweep_expired_keys(session, batch_size=args.batch_size)
+            session.commit()
+            removed += batch
+            if batch < args.batch_size:
+                break
+    print(f"removed {removed} expired idempotency keys")
+    return 0
+
+
+def _orders_archive(args) -> int:
+    moved = archive_pending(batch_size=args.batch_size)
+    print(f"archived {moved} completed orders")
+    return 0
+
+
+def _history_compact(args) -> int:
+    moved = compact_history(keep_months=args.keep_months)
+    for month, rows in moved.items():
+        print(f"{month}: compacted {rows} order records")
+    if not moved:
+        print("no closed months to compact")
+    return 0
+
+
+def _schema_status(args) -> int:
+    version = current_version()
+    print(f"schema version {version} of {LATEST_VERSION}")
+    return 0 if version >= LATEST_VERSION else 1
+
+
+def _schema_migrate(args) -> int:
+    applied = migrate()
+    print(f"applied {len(applied)} migrations" + (f": {', '.join(applied)}" if applied else ""))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description=__doc__)
+    groups = parser.add_subparsers(dest="group", required=True)
+
+    loyalty = groups.add_parser("loyalty", help="member_loyalty counters")
+    loyalty_commands = loyalty.add_subparsers(dest="command", required=True)
+    backfill = loyalty_commands.add_parser("backfill", help="rebuild member_loyalty from order_records")
+    backfill.set_defaults(handler=_loyalty_backfill)
+    check = loyalty_commands.add_parser("check", help="verify member_loyalty against order_records")
+    check.add_argument("--repair", action="store_true", help="rebuild the counters when drift is found")
+    check.set_defaults(handler=_loyalty_check)
+
+    rollups = groups.add_parser("rollups", help="hourly sales rollups")
+    rollup_commands = rollups.add_subparsers(dest="command", required=True)
+    rebuild = rollup_commands.add_parser("rebuild", help="regenerate sales rollups from order_records")
+    rebuild.set_defaults(handler=_rollups_rebuild)
+
+    options = groups.add_parser("options", help="structured drink options")
+    option_commands = options.add_subparsers(dest="command", required=True)
+    backfill_options = option_commands.add_parser("backfill", help="fill option columns from customization JSON")
+    backfill_options.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    backfill_options.set_defaults(handler=_options_backfill)
+
+    orders = groups.add_parser("orders", help="live orders")
+    order_commands = orders.add_subparsers(dest="command", required=True)
+    archive = order_commands.add_parser("archive", help="move completed orders into order_records")
+    archive.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    archive.set_defaults(handler=_orders_archive)
+
+    history = groups.add_parser("history", help="monthly order history partitions")
+    history_commands = history.add_subparsers(dest="command", required=True)
+    compact = history_commands.add_parser("compact", help="move closed months into read-only archive files")
+    compact.add_argument(
+        "--keep-months", type=int, default=HISTORY_HOT_MONTHS, help="recent months left in order_records"
+    )
+    compact.set_defaults(handler=_history_compact)
+
+    idempotency = groups.add_parser("idempotency", help="POST /api/orders idempotency keys")
+    idempotency_commands = idempotency.add_subparsers(dest="command", required=True)
+    sweep = idempotency_commands.add_parser("sweep", help="delete expired keys in batches")
+    sweep.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+    sweep.set_defaults(handler=_idempotency_sweep)
+
+    schema = groups.add_parser("schema", help="versioned schema migrations")
+    schema_commands = schema.add_subparsers(dest="command", required=True)
+    status = schema_commands.add_parser("status", help="exit 1 when migrations are pending")
+    status.set_defaults(handler=_schema_status)
+    migrate_schema = schema_commands.add_parser("migrate", help="apply pending migrations")
+    migrate_schema.set_defaults(handler=_schema_migrate)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """CLI entry point."""
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Prometheus text-format metrics at ``GET /api/metrics``.
+
+Each process keeps its counters and histograms in memory and writes them to
+``<METRICS_DIR>/<pid>.json`` at most every ``METRICS_FLUSH_SECONDS`` (and at
+exit). A scrape answered by any worker merges its own live values with every
+other file, so totals cover all gunicorn workers, lagging by at most one
+flush interval, and survive worker restarts. ``METRICS_DIR`` defaults to a
+directory next to the SQLite file; the gunicorn master clears it on start.
+Without a directory (in-memory databases) metrics are per process.
+
+Queue depth is read from ``order_items`` at scrape time, so it is exact.
+Order counters are bumped by ``count_on_commit`` and only land when the
+caller's transaction commits.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from flask import Blueprint, Response
+from sqlalchemy import event, func, select
+
+from .db import ReadSessionLocal, SessionLocal, db_path, engine, pool_wait_listeners, read_engine
+from .models import ORDER_STATES, OrderItem
+
+bp = Blueprint("metrics", __name__, url_prefix="/api/metrics")
+
+_default_dir = f"{db_path}.metrics" if db_path is not None else ""
+METRICS_DIR = os.getenv("METRICS_DIR", _default_dir)
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Request latency by blueprint, endpoint, method and status."),
+    "db_pool_checkout_wait_seconds": ("histogram", "Time spent waiting for a pooled database connection."),
+    "orders_created_total": ("counter", "Order items created."),
+    "orders_archived_total": ("counter", "Order items archived to order_records."),
+    "order_queue_depth": ("gauge", "Live order items by status."),
+}
+_BUCKETS = {
+    "http_request_duration_seconds": LATENCY_BUCKETS,
+    "db_pool_checkout_wait_seconds": POOL_WAIT_BUCKETS,
+}
+_PENDING_KEY = "metrics_pending"
+
+
+def _key(name: str, labels: dict[str, str]) -> str:
+    # Series keys double as JSON object keys in the per-process files.
+    return json.dumps([name, sorted(labels.items())])
+
+
+class MetricsStore:
+    """In-process counters and histograms, mirrored to a per-pid file."""
+
+    def __init__(self, directory: str | None = None):
+        self.directory = Path(directory) if directory else None
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._histograms: dict[str, list[float]] = {}
+        self._last_flush = 0.0
+        self._pid = os.getpid()
+
+    def _check_fork(self) -> None:
+        # A forked worker must not report the parent's samples as its own.
+        if self._pid != os.getpid():
+            self._counters = {}
+            self._histograms = {}
+            self._pid = os.getpid()
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        with self._lock:
+            self._check_fork()
+            key = _key(name, labels)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        buckets = _BUCKETS[name]
+        with self._lock:
+            self._check_fork()
+            key = _key(name, labels)
+            # Layout: one cumulative count per bucket, then sum, then count.
+            series = self._histograms.setdefault(key, [0] * (len(buckets) + 2))
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _local(self) -> dict:
+        with self._lock:
+            self._check_fork()
+            return {
+                "counters": dict(self._counters),
+                "histograms": {key: list(values) for key, values in self._histograms.items()},
+            }
+
+    def flush(self, force: bool = False) -> None:
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < METRICS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        data = self._local()
+        if not data["counters"] and not data["histograms"]:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.directory / f"{os.getpid()}.json"
+        scratch = target.with_suffix(".tmp")
+        scratch.write_text(json.dumps(data))
+        os.replace(scratch, target)
+
+    def collect(self) -> dict:
+        """Merge this process's live values with every other process's file."""
+        merged = self._local()
+        if self.directory is None or not self.directory.is_dir():
+            return merged
+        own = f"{os.getpid()}.json"
+        for path in self.directory.glob("*.json"):
+            if path.name == own:
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for key, value in data.get("counters", {}).items():
+                merged["counters"][key] = merged["counters"].get(key, 0) + value
+            for key, values in data.get("histograms", {}).items():
+                current = merged["histograms"].get(key)
+                merged["histograms"][key] = values if current is None else [a + b for a, b in zip(current, values)]
+        return merged
+
+    def reset(self) -> None:
+        """Forget all samples, including other processes' files."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+        if self.directory is not None and self.directory.is_dir():
+            for path in self.directory.iterdir():
+                if path.suffix in {".json", ".tmp"}:
+                    path.unlink(missing_ok=True)
+
+
+store = MetricsStore(METRICS_DIR)
+atexit.register(lambda: store.flush(force=True))
+
+
+def observe_request(blueprint: str | None, endpoint: str, method: str, status: int, seconds: float) -> None:
+    store.observe(
+        "http_request_duration_seconds",
+        seconds,
+        blueprint=blueprint or "app",
+        endpoint=endpoint,
+        method=method,
+        status=str(status),
+    )
+    store.flush()
+
+
+def _observe_pool_wait(pool, seconds: float) -> None:
+    name = "read" if read_engine is not engine and pool is read_engine.pool else "write"
+    store.observe("db_pool_checkout_wait_seconds", seconds, pool=name)
+
+
+pool_wait_listeners.append(_observe_pool_wait)
+
+
+def count_on_commit(session, name: str, amount: int = 1) -> None:
+    """Add ``amount`` to counter ``name`` once the session commits."""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    pending[name] = pending.get(name, 0) + amount
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_pending(session) -> None:
+    for name, amount in session.info.pop(_PENDING_KEY, {}).items():
+        store.inc(name, amount)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name: str, labels: list, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return name
+    return name + "{" + ",".join(f'{label}="{_escape(str(value))}"' for label, value in pairs) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def render(queue_depth: dict[str, int]) -> str:
+    data = store.collect()
+    families: dict[str, list[str]] = {name: [] for name in HELP}
+    for key, value in sorted(data["counters"].items()):
+        name, labels = json.loads(key)
+        families.setdefault(name, []).append(f"{_series(name, labels)} {value:g}")
+    for key, values in sorted(data["histograms"].items()):
+        name, labels = json.loads(key)
+        bounds = (*_BUCKETS[name], float("inf"))
+        counts = [*values[:-2], values[-1]]
+        for bound, count in zip(bounds, counts):
+            families[name].append(f"{_series(name + '_bucket', labels, (('le', _format_bound(bound)),))} {count:g}")
+        families[name].append(f"{_series(name + '_sum', labels)} {values[-2]:.6f}")
+        families[name].append(f"{_series(name + '_count', labels)} {values[-1]:g}")
+    for status in ORDER_STATES:
+        families["order_queue_depth"].append(
+            f"{_series('order_queue_depth', [('status', status)])} {queue_depth.get(status, 0)}"
+        )
+    for name in ("orders_created_total", "orders_archived_total"):
+        if not families[name]:
+            families[name].append(f"{name} 0")
+
+    lines = []
+    for name, samples in families.items():
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+@bp.get("")
+def metrics():
+    with ReadSessionLocal() as session:
+        queue_depth = dict(session.execute(select(OrderItem.status, func.count()).group_by(OrderItem.status)).all())
+    return Response(render(queue_depth), mimetype="text/plain; version=0.0.4")
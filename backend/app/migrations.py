@@ -0,0 +1,391 @@
+"""Versioned schema migrations.
+
+``schema_migrations`` records every applied step. ``migrate()`` compares the
+highest recorded version with ``LATEST_VERSION`` and returns immediately when
+they match, so starting a worker against a current database costs a couple of
+queries. Steps run in order and each is safe on databases that predate
+versioning: they inspect the schema before changing it and backfills rebuild
+from source data. Append new steps to ``MIGRATIONS``; never renumber or edit
+applied ones.
+"""
+from sqlalchemy import delete, func, insert, inspect, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+from .archiver import PROGRESS_NAME
+from .db import SessionLocal, engine
+from .loyalty import backfill_member_loyalty
+from .models import SHIFT_NAMES, ArchiveProgress, Base, HistoryPartition, IdempotencyKey, SchemaMigration, Ticket
+from .order_options import OPTION_COLUMNS, backfill_order_options
+from .orders import current_local_datetime
+from .rollups import rebuild_sales_rollups
+from .tickets import backfill_tickets
+from .versions import ensure_versions
+
+
+def _migrate_staff_remove_email() -> None:
+    """Drop the legacy staff.email column while retaining data."""
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if "staff" not in inspector.get_table_names():
+            return
+        columns = {column["name"] for column in inspector.get_columns("staff")}
+        if "email" not in columns:
+            return
+
+        indexes = {index["name"] for index in inspector.get_indexes("staff")}
+        if "ix_staff_email" in indexes:
+            connection.exec_driver_sql("DROP INDEX IF EXISTS ix_staff_email")
+        if "ix_staff_username" in indexes:
+            connection.exec_driver_sql("DROP INDEX IF EXISTS ix_staff_username")
+
+        connection.exec_driver_sql("ALTER TABLE staff RENAME TO staff_old")
+        Base.metadata.tables["staff"].create(connection)
+
+        transfer_columns = [
+            "id",
+            "username",
+            "password_hash",
+            "full_name",
+            "role",
+            "is_active",
+            "hired_at",
+        ]
+        column_list = ", ".join(transfer_columns)
+        connection.exec_driver_sql(
+            f"INSERT INTO staff ({column_list}) SELECT {column_list} FROM staff_old"
+        )
+        connection.exec_driver_sql("DROP TABLE staff_old")
+
+
+def _reshape_schedule_shifts() -> None:
+    """Rebuild a schedule_shifts table from the old schema, keeping compatible rows."""
+    table = Base.metadata.tables["schedule_shifts"]
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if "schedule_shifts" not in inspector.get_table_names():
+            return
+        columns = {column["name"] for column in inspector.get_columns("schedule_shifts")}
+        constraints = {constraint["name"] for constraint in inspector.get_unique_constraints("schedule_shifts")}
+        if columns == set(table.columns.keys()) and "uq_staff_shift" in constraints:
+            return
+
+        indexes = [index["name"] for index in inspector.get_indexes("schedule_shifts")]
+        connection.exec_driver_sql("ALTER TABLE schedule_shifts RENAME TO schedule_shifts_old")
+        for name in indexes:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        table.create(connection)
+        shared = [name for name in ("id", "staff_id", "shift_date", "shift_name", "created_at") if name in columns]
+        if {"staff_id", "shift_date", "shift_name"} <= set(shared):
+            column_list = ", ".join(shared)
+            allowed = ", ".join(f"'{name}'" for name in SHIFT_NAMES)
+            connection.exec_driver_sql(
+                f"INSERT OR IGNORE INTO schedule_shifts ({column_list}) "
+                f"SELECT {column_list} FROM schedule_shifts_old WHERE shift_name IN ({allowed})"
+            )
+        connection.exec_driver_sql("DROP TABLE schedule_shifts_old")
+
+
+def _create_tables() -> None:
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+
+
+def _ensure_menu_item_quantity_column() -> None:
+    """Backfill menu_items.quantity when missing."""
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        columns = {column["name"] for column in inspector.get_columns("menu_items")}
+        if "quantity" not in columns:
+            connection.exec_driver_sql(
+                "ALTER TABLE menu_items ADD COLUMN quantity INTEGER NOT NULL DEFAULT 0"
+            )
+
+
+def _ensure_order_option_columns() -> None:
+    """Add the structured option columns to order tables created before them."""
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in ("order_items", "order_records"):
+            columns = {column["name"] for column in inspector.get_columns(table)}
+            for column in OPTION_COLUMNS:
+                if column not in columns:
+                    connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} VARCHAR(120)")
+
+
+def _backfill_order_options() -> None:
+    """Fill option columns and add-on rows from JSON for pre-existing orders."""
+    with SessionLocal() as session:
+        backfill_order_options(session)
+
+
+def _backfill_member_loyalty() -> None:
+    """Build member_loyalty from history."""
+    with SessionLocal() as session:
+        backfill_member_loyalty(session)
+        session.commit()
+
+
+def _rebuild_sales_rollups() -> None:
+    """Build the hourly sales rollups from history."""
+    with SessionLocal() as session:
+        rebuild_sales_rollups(session)
+        session.commit()
+
+
+# The indexes declared when step 9 was written. Indexes on columns added by
+# later steps are created by those steps, after the column exists.
+_STEP_9_INDEXES = (
+    "ix_members_email",
+    "ix_members_email_lower",
+    "ix_staff_username",
+    "ix_staff_username_lower",
+    "ix_menu_items_name",
+    "ix_menu_items_category",
+    "ix_order_records_member_completed",
+    "ix_order_records_completed",
+    "ix_order_records_tea",
+    "ix_order_records_milk",
+    "ix_order_addons_order_item",
+    "ix_order_addons_order_record",
+    "ix_order_addons_label",
+    "ix_order_events_created_at",
+)
+
+
+def _ensure_indexes() -> None:
+    """Create indexes declared after their table already existed."""
+    indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    with engine.begin() as connection:
+        for name in _STEP_9_INDEXES:
+            # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes.
+            connection.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+def _ensure_cache_versions() -> None:
+    """Create the shared cache counter rows."""
+    with SessionLocal() as session:
+        ensure_versions(session)
+        session.commit()
+
+
+# Columns both order tables have at step 11; later steps add more.
+_STEP_11_COLUMNS = ("member_id", "staff_id", "item_id", "qty", "total_price", "customizations", *OPTION_COLUMNS, "created_at")
+
+
+def _archive_completed_orders() -> None:
+    """Move lingering completed order_items into order_records.
+
+    Names only the columns both tables have at step 11, since the models carry
+    columns later steps add. Loyalty and rollups are then rebuilt from history,
+    as steps 7 and 8 did.
+    """
+    items = Base.metadata.tables["order_items"]
+    records = Base.metadata.tables["order_records"]
+    addons = Base.metadata.tables["order_addons"]
+    completed = select(items.c.id).where(items.c.status == "complete")
+    with engine.begin() as connection:
+        if connection.scalar(completed.limit(1)) is None:
+            return
+        # Re-archiving replaces the old snapshot.
+        stale = select(records.c.id).where(records.c.order_item_id.in_(completed))
+        connection.execute(delete(addons).where(addons.c.order_record_id.in_(stale)))
+        connection.execute(delete(records).where(records.c.order_item_id.in_(completed)))
+        source = select(
+            items.c.id,
+            *(items.c[name] for name in _STEP_11_COLUMNS),
+            literal("complete"),
+            literal(current_local_datetime(), records.c.completed_at.type),
+        ).where(items.c.status == "complete")
+        connection.execute(
+            insert(records).from_select(
+                ["order_item_id", *_STEP_11_COLUMNS, "status", "completed_at"], source, include_defaults=False
+            )
+        )
+        record_id = (
+            select(records.c.id).where(records.c.order_item_id == addons.c.order_item_id).scalar_subquery()
+        )
+        connection.execute(
+            update(addons).where(addons.c.order_item_id.in_(completed)).values(order_record_id=record_id, order_item_id=None)
+        )
+        connection.execute(delete(items).where(items.c.status == "complete"))
+    _backfill_member_loyalty()
+    _rebuild_sales_rollups()
+
+
+def _rebuild_table(connection, name: str) -> None:
+    """Recreate ``name`` from the current model, keeping its rows and ids."""
+    table = Base.metadata.tables[name]
+    inspector = inspect(connection)
+    indexes = [index["name"] for index in inspector.get_indexes(name)]
+    existing = {column["name"] for column in inspector.get_columns(name)}
+    # Columns added by later steps are left to those steps.
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+    # Rebuild without cascading into order_addons or rewriting its foreign key.
+    connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    connection.commit()
+    try:
+        with connection.begin():
+            connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_old")
+            for index in indexes:
+                connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+            table.create(connection)
+            connection.exec_driver_sql(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {name}_old")
+            connection.exec_driver_sql(f"DROP TABLE {name}_old")
+    finally:
+        connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        connection.exec_driver_sql("PRAGMA foreign_keys = ON")
+        connection.commit()
+
+
+def _order_items_autoincrement() -> None:
+    """Stop SQLite reusing order_items ids that history already refers to."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as connection:
+        ddl = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order_items'"
+        ).scalar() or ""
+        connection.commit()
+        if "AUTOINCREMENT" not in ddl.upper():
+            _rebuild_table(connection, "order_items")
+        with connection.begin():
+            floor = connection.exec_driver_sql(
+                "SELECT max(coalesce((SELECT max(id) FROM order_items), 0),"
+                " coalesce((SELECT max(order_item_id) FROM order_records), 0))"
+            ).scalar()
+            connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'order_items'")
+            connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('order_items', ?)", (floor,))
+
+
+def _create_tickets() -> None:
+    """Add the tickets table and ticket_id columns, then group live drinks by cart."""
+    with engine.begin() as connection:
+        Ticket.__table__.create(connection, checkfirst=True)
+        inspector = inspect(connection)
+        definitions = {
+            "order_items": "INTEGER REFERENCES tickets (id) ON DELETE SET NULL",
+            "order_records": "INTEGER",
+        }
+        for table, definition in definitions.items():
+            columns = {column["name"] for column in inspector.get_columns(table)}
+            if "ticket_id" not in columns:
+                connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN ticket_id {definition}")
+            for index in Base.metadata.tables[table].indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    with SessionLocal() as session:
+        backfill_tickets(session, current_local_datetime())
+        session.commit()
+
+
+def _create_idempotency_keys() -> None:
+    with engine.begin() as connection:
+        IdempotencyKey.__table__.create(connection, checkfirst=True)
+
+
+def _order_items_completed_at() -> None:
+    """Stamp completion on live rows and start the archiver watermark."""
+    with engine.begin() as connection:
+        columns = {column["name"] for column in inspect(connection).get_columns("order_items")}
+        if "completed_at" not in columns:
+            connection.exec_driver_sql("ALTER TABLE order_items ADD COLUMN completed_at DATETIME")
+        for index in Base.metadata.tables["order_items"].indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+        ArchiveProgress.__table__.create(connection, checkfirst=True)
+        exists = connection.scalar(select(ArchiveProgress.name).where(ArchiveProgress.name == PROGRESS_NAME))
+        if exists is None:
+            connection.execute(
+                ArchiveProgress.__table__.insert().values(name=PROGRESS_NAME, last_order_item_id=0, archived_total=0)
+            )
+
+
+def _history_partitions() -> None:
+    """Add the compacted-month catalog and stop SQLite reusing order_records ids."""
+    with engine.begin() as connection:
+        HistoryPartition.__table__.create(connection, checkfirst=True)
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as connection:
+        ddl = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order_records'"
+        ).scalar() or ""
+        connection.commit()
+        if "AUTOINCREMENT" not in ddl.upper():
+            _rebuild_table(connection, "order_records")
+
+
+def _order_records_completed_at() -> None:
+    """Give legacy history rows a completion time so the (completed_at, id) keyset reaches them."""
+    with engine.begin() as connection:
+        records = Base.metadata.tables["order_records"]
+        connection.execute(
+            update(records).where(records.c.completed_at.is_(None)).values(completed_at=records.c.created_at)
+        )
+
+
+def _order_items_insert_sentinel() -> None:
+    """Add the column that keeps multi-row order inserts in cart order."""
+    with engine.begin() as connection:
+        columns = {column["name"] for column in inspect(connection).get_columns("order_items")}
+        if "insert_sentinel" not in columns:
+            connection.exec_driver_sql("ALTER TABLE order_items ADD COLUMN insert_sentinel INTEGER")
+
+
+MIGRATIONS = (
+    (1, "staff_drop_email", _migrate_staff_remove_email),
+    (2, "schedule_shifts_shape", _reshape_schedule_shifts),
+    (3, "create_tables", _create_tables),
+    (4, "menu_item_quantity", _ensure_menu_item_quantity_column),
+    (5, "order_option_columns", _ensure_order_option_columns),
+    (6, "order_options_backfill", _backfill_order_options),
+    (7, "member_loyalty_backfill", _backfill_member_loyalty),
+    (8, "sales_rollups_rebuild", _rebuild_sales_rollups),
+    (9, "indexes", _ensure_indexes),
+    (10, "cache_versions", _ensure_cache_versions),
+    (11, "archive_completed_orders", _archive_completed_orders),
+    (12, "order_items_autoincrement", _order_items_autoincrement),
+    (13, "tickets", _create_tickets),
+    (14, "idempotency_keys", _create_idempotency_keys),
+    (15, "order_items_completed_at", _order_items_completed_at),
+    (16, "history_partitions", _history_partitions),
+    (17, "order_records_completed_at", _order_records_completed_at),
+    (18, "order_items_insert_sentinel", _order_items_insert_sentinel),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version() -> int:
+    """Highest applied migration, or 0 for an unversioned database."""
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(SchemaMigration.__tablename__):
+            return 0
+        return int(connection.scalar(select(func.max(SchemaMigration.version))) or 0)
+
+
+def _record(version: int, name: str) -> None:
+    with SessionLocal() as session:
+        session.add(SchemaMigration(version=version, name=name, applied_at=current_local_datetime()))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another process applied the same step concurrently; steps are idempotent.
+            session.rollback()
+
+
+def migrate() -> list[str]:
+    """Apply pending steps in order; returns the names applied."""
+    version = current_version()
+    if version >= LATEST_VERSION:
+        return []
+    with engine.begin() as connection:
+        SchemaMigration.__table__.create(connection, checkfirst=True)
+    applied = []
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        step()
+        _record(step_version, name)
+        applied.append(name)
+    return applied
+
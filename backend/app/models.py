@@ -1,5 +1,5 @@
 from decimal import Decimal
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, orm_insert_sentinel, relationship
 from sqlalchemy import (
     String,
     Integer,
@@ -12,6 +12,7 @@ from sqlalchemy import (
     Date,
     UniqueConstraint,
     Text,
+    Index,
 )
 
 
@@ -43,6 +44,11 @@ class Staff(Base):
     hired_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+# Login matches case-insensitively; these let lower(...) lookups use an index.
+Index("ix_members_email_lower", func.lower(Member.email))
+Index("ix_staff_username_lower", func.lower(Staff.username))
+
+
 class MenuItem(Base):
     """Menu item record storing price and stock data."""
     __tablename__ = "menu_items"
@@ -55,14 +61,72 @@ class MenuItem(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
 
 
+class CacheVersion(Base):
+    """Change counter bumped on writes so every worker can refresh its caches."""
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Stored ``POST /api/orders`` response for a client's ``Idempotency-Key``."""
+    __tablename__ = "idempotency_keys"
+
+    scope: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(32), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response_body: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    expires_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class SchemaMigration(Base):
+    """One row per applied step in ``migrations.MIGRATIONS``."""
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(120), nullable=False)
+    applied_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
 ORDER_STATES = ("received", "preparing", "complete")
 
 
+class Ticket(Base):
+    """One cart placed through ``POST /api/orders``, summarizing its drinks."""
+    __tablename__ = "tickets"
+    __table_args__ = (
+        Index("ix_tickets_status_created", "status", "created_at", "id"),
+        Index("ix_tickets_member_created", "member_id", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    member_id: Mapped[int | None] = mapped_column(ForeignKey("members.id", ondelete="SET NULL"))
+    staff_id: Mapped[int | None] = mapped_column(ForeignKey("staff.id", ondelete="SET NULL"))
+    status: Mapped[str] = mapped_column(Enum(*ORDER_STATES, name="ticket_status"), default="received", nullable=False)
+    item_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    open_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=Decimal("0.00"), nullable=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
+    completed_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
+
+
 class OrderItem(Base):
     """Order item record tracking customizable drinks."""
     __tablename__ = "order_items"
+    __table_args__ = (
+        # The archiver walks completed rows in id order.
+        Index("ix_order_items_status_id", "status", "id"),
+        # Archived ids live on in order_records.order_item_id, so never reuse them.
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ticket_id: Mapped[int | None] = mapped_column(ForeignKey("tickets.id", ondelete="SET NULL"), index=True)
     member_id: Mapped[int | None] = mapped_column(ForeignKey("members.id", ondelete="SET NULL"))
     staff_id: Mapped[int | None] = mapped_column(ForeignKey("staff.id", ondelete="SET NULL"))
     item_id: Mapped[int] = mapped_column(ForeignKey("menu_items.id", ondelete="RESTRICT"), nullable=False)
@@ -70,16 +134,43 @@ class OrderItem(Base):
     status: Mapped[str] = mapped_column(Enum(*ORDER_STATES, name="order_status"), default="received", nullable=False)
     total_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=Decimal("0.00"), nullable=False)
     customizations: Mapped[str | None] = mapped_column(Text)
+    tea: Mapped[str | None] = mapped_column(String(120))
+    milk: Mapped[str | None] = mapped_column(String(120))
+    sugar: Mapped[str | None] = mapped_column(String(120))
+    ice: Mapped[str | None] = mapped_column(String(120))
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    completed_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
+    # Lets a multi-row INSERT ... RETURNING hand rows back in parameter order;
+    # SQLite does not promise that order on its own.
+    _insert_sentinel: Mapped[int | None] = orm_insert_sentinel("insert_sentinel")
+
+
+class ArchiveProgress(Base):
+    """Watermark of the order archiver, advanced with every committed batch."""
+    __tablename__ = "archive_progress"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    last_order_item_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    archived_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
 
 
 class OrderRecord(Base):
     """Historical snapshot of completed order items."""
     __tablename__ = "order_records"
-    __table_args__ = (UniqueConstraint("order_item_id", name="uq_order_record_item"),)
+    __table_args__ = (
+        UniqueConstraint("order_item_id", name="uq_order_record_item"),
+        Index("ix_order_records_member_completed", "member_id", "completed_at", "id"),
+        Index("ix_order_records_completed", "completed_at", "id"),
+        Index("ix_order_records_tea", "tea"),
+        Index("ix_order_records_milk", "milk"),
+        # Compacted months keep their ids in archive files, so never reuse them.
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     order_item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    ticket_id: Mapped[int | None] = mapped_column(Integer, index=True)
     member_id: Mapped[int | None] = mapped_column(ForeignKey("members.id", ondelete="SET NULL"))
     staff_id: Mapped[int | None] = mapped_column(ForeignKey("staff.id", ondelete="SET NULL"))
     item_id: Mapped[int] = mapped_column(ForeignKey("menu_items.id", ondelete="RESTRICT"), nullable=False)
@@ -87,15 +178,89 @@ class OrderRecord(Base):
     status: Mapped[str | None] = mapped_column(String(32))
     total_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=Decimal("0.00"), nullable=False)
     customizations: Mapped[str | None] = mapped_column(Text)
+    tea: Mapped[str | None] = mapped_column(String(120))
+    milk: Mapped[str | None] = mapped_column(String(120))
+    sugar: Mapped[str | None] = mapped_column(String(120))
+    ice: Mapped[str | None] = mapped_column(String(120))
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
     completed_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
 
 
+class HistoryPartition(Base):
+    """A closed month of order history compacted into its own read-only file."""
+    __tablename__ = "history_partitions"
+
+    month: Mapped[Date] = mapped_column(Date, primary_key=True)
+    file_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    generation: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    record_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    first_completed_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_completed_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    compacted_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True))
+
+
+class OrderAddon(Base):
+    """One add-on label on a live order or, once archived, on its history row."""
+    __tablename__ = "order_addons"
+    __table_args__ = (
+        Index("ix_order_addons_order_item", "order_item_id", "position"),
+        Index("ix_order_addons_order_record", "order_record_id", "position"),
+        Index("ix_order_addons_label", "label"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_item_id: Mapped[int | None] = mapped_column(ForeignKey("order_items.id", ondelete="CASCADE"))
+    order_record_id: Mapped[int | None] = mapped_column(ForeignKey("order_records.id", ondelete="CASCADE"))
+    position: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    label: Mapped[str] = mapped_column(String(120), nullable=False)
+
+
+class OrderEvent(Base):
+    """Append-only log of order lifecycle changes streamed to staff screens."""
+    __tablename__ = "order_events"
+    # AUTOINCREMENT keeps ids monotonic after pruning so Last-Event-ID stays valid.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    order_item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class SalesItemHourly(Base):
+    """Units sold per menu item per hour, maintained as orders are archived."""
+    __tablename__ = "sales_item_hourly"
+
+    item_id: Mapped[int] = mapped_column(ForeignKey("menu_items.id", ondelete="CASCADE"), primary_key=True)
+    hour_start: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class SalesLabelHourly(Base):
+    """Units sold per customization label (tea, milk, addon) per hour."""
+    __tablename__ = "sales_label_hourly"
+
+    category: Mapped[str] = mapped_column(String(16), primary_key=True)
+    label: Mapped[str] = mapped_column(String(200), primary_key=True)
+    hour_start: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 SHIFT_START_HOUR = 10
 SHIFT_END_HOUR = 22  # exclusive end hour
 SHIFT_NAMES = tuple(f"{hour:02d}:00" for hour in range(SHIFT_START_HOUR, SHIFT_END_HOUR))
 
 
+class MemberLoyalty(Base):
+    """Running count of completed drinks per member, maintained on archive."""
+    __tablename__ = "member_loyalty"
+
+    member_id: Mapped[int] = mapped_column(ForeignKey("members.id", ondelete="CASCADE"), primary_key=True)
+    drink_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class MemberReward(Base):
     """Member reward redemptions tracking."""
     __tablename__ = "member_rewards"
@@ -0,0 +1,133 @@
+"""Structured storage for drink options.
+
+Tea, milk, sugar and ice live in dedicated columns on ``order_items`` and
+``order_records`` and add-ons are ordered ``order_addons`` rows, so read paths
+never parse the ``customizations`` JSON and options can be filtered in SQL.
+The JSON column is still written because it carries inventory reservation and
+reward metadata. Archiving moves a line's add-on rows onto its history row.
+
+``python -m app.manage options backfill`` fills the structured storage from
+the JSON of rows written before it existed; a migration step runs it once
+when upgrading an older database.
+"""
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from .customizations import deserialize_customizations
+from .models import OrderAddon, OrderItem, OrderRecord
+
+OPTION_COLUMNS = ("tea", "milk", "sugar", "ice")
+BACKFILL_BATCH_SIZE = 500
+
+
+def _clean_label(value) -> str | None:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def split_options(customizations: dict) -> tuple[dict[str, str | None], list[str]]:
+    """Return column values and ordered add-on labels for normalized customizations."""
+    values = {column: _clean_label(customizations.get(column)) for column in OPTION_COLUMNS}
+    # "None" is the client's sentinel for no milk; keep it out of the column.
+    if values["milk"] is not None and values["milk"].lower() == "none":
+        values["milk"] = None
+    addons = customizations.get("addons")
+    labels = [_clean_label(addon) for addon in addons] if isinstance(addons, list) else []
+    return values, [label for label in labels if label]
+
+
+def insert_order_addons(session, addons_by_order: dict[int, list[str]]) -> None:
+    """Write add-on rows for freshly inserted order items in one batch."""
+    rows = [
+        {"order_item_id": order_id, "position": position, "label": label}
+        for order_id, labels in addons_by_order.items()
+        for position, label in enumerate(labels)
+    ]
+    if rows:
+        session.execute(insert(OrderAddon), rows)
+
+
+def _load_addons(session, table, column, owner_ids) -> dict[int, list[str]]:
+    owner_ids = list(owner_ids)
+    if not owner_ids:
+        return {}
+    stmt = (
+        select(column, table.c.label)
+        .where(column.in_(owner_ids))
+        .order_by(column, table.c.position)
+    )
+    addons: dict[int, list[str]] = {}
+    for owner_id, label in session.execute(stmt):
+        addons.setdefault(owner_id, []).append(label)
+    return addons
+
+
+def load_order_addons(session, order_ids) -> dict[int, list[str]]:
+    """Map live order item ids to their add-on labels."""
+    return _load_addons(session, OrderAddon.__table__, OrderAddon.order_item_id, order_ids)
+
+
+def load_record_addons(session, record_ids, addons=None) -> dict[int, list[str]]:
+    """Map ``order_records.id`` values to their add-on labels.
+
+    ``addons`` is an attached month's add-on table (see ``app.history``);
+    by default the live ``order_addons`` table is read.
+    """
+    table = OrderAddon.__table__ if addons is None else addons
+    return _load_addons(session, table, table.c.order_record_id, record_ids)
+
+
+def move_addons_to_records(session, record_ids_by_order: dict[int, int]) -> None:
+    """Re-point add-on rows of many live orders at their new (empty) records."""
+    if not record_ids_by_order:
+        return
+    table = OrderAddon.__table__
+    session.execute(
+        update(table)
+        .where(table.c.order_item_id == bindparam("order_id"))
+        .values(order_item_id=None, order_record_id=bindparam("record_id")),
+        [{"order_id": order_id, "record_id": record_id} for order_id, record_id in record_ids_by_order.items()],
+    )
+
+
+def backfill_order_options(session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Populate option columns and add-on rows from stored JSON; returns rows read.
+
+    Rows are processed in id order and committed per batch so the write lock
+    is only held briefly while the app keeps serving. Re-running is safe.
+    """
+    processed = 0
+    for model, owner_column in ((OrderItem, "order_item_id"), (OrderRecord, "order_record_id")):
+        table = model.__table__
+        update_stmt = update(table).where(table.c.id == bindparam("row_id"))
+        last_id = 0
+        while True:
+            rows = session.execute(
+                select(model.id, model.customizations)
+                .where(model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            addon_rows = []
+            for row_id, raw in rows:
+                values, addons = split_options(deserialize_customizations(raw))
+                updates.append({"row_id": row_id, **values})
+                addon_rows.extend(
+                    {owner_column: row_id, "position": position, "label": label}
+                    for position, label in enumerate(addons)
+                )
+            session.execute(update_stmt, updates)
+            session.execute(
+                delete(OrderAddon).where(getattr(OrderAddon, owner_column).in_([row[0] for row in rows]))
+            )
+            if addon_rows:
+                session.execute(insert(OrderAddon), addon_rows)
+            session.commit()
+            processed += len(rows)
+    return processed
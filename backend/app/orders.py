@@ -4,7 +4,7 @@ from decimal import Decimal, InvalidOperation
 from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
 from .models import MemberReward
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 bp = Blueprint("orders", __name__, url_prefix="/api/orders")
 
@@ -15,10 +15,8 @@ def get_member_rewards():
     if account_type != "member" or not account_id:
         return jsonify({"error": "Unauthorized"}), 403
     with session_scope() as session:
-        # Count completed drinks for this member
-        count = session.execute(
-            select(func.sum(OrderRecord.qty)).where(OrderRecord.member_id == account_id)
-        ).scalar() or 0
+        # Completed drinks are kept in member_loyalty by the archiver
+        count = member_drink_count(session, account_id)
     return jsonify({"drink_count": int(count)})
 
 # Redeem reward endpoint
@@ -31,9 +29,7 @@ def redeem_member_reward():
     reward_type = data.get("type")
     # Get drink count
     with session_scope() as session:
-        count = session.execute(
-            select(func.sum(OrderRecord.qty)).where(OrderRecord.member_id == account_id)
-        ).scalar() or 0
+        count = member_drink_count(session, account_id)
         # Check eligibility
         # Check if already redeemed for this milestone
         already_redeemed = session.execute(
@@ -65,62 +61,69 @@ def redeem_member_reward():
         else:
             return jsonify({"error": "Not eligible for this reward."}), 400
 """Order management endpoints."""
+import base64
+import binascii
 import json
+import time
+from contextlib import closing
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 
 from datetime import datetime, timezone
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
-from sqlalchemy import select
-
-from .auth import _json_error, _parse_identity, session_scope
-from .customizations import deserialize_customizations, extract_inventory_reservations, normalize_customizations
-from .models import Member, MenuItem, OrderItem, OrderRecord, ORDER_STATES
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from . import events as order_events
+from . import history, metrics
+from .auth import _json_error, _parse_identity, role_required, session_scope
+from .catalog import CatalogItem, catalog
+from .customizations import extract_inventory_reservations, normalize_customizations
+from .db import ReadSessionLocal
+from .etags import make_etag, not_modified, with_etag
+from .idempotency import (
+    IDEMPOTENCY_HEADER,
+    MAX_KEY_LENGTH,
+    discard_key,
+    find_key,
+    is_expired,
+    key_scope,
+    request_fingerprint,
+    store_response,
+    sweep_expired_keys,
+    sweep_timer,
+)
+from .events import format_sse, latest_order_event_id, record_order_event, record_order_events
+from .inventory import CONTENTION_RETRY_AFTER_SECONDS, StockContention, release_stock, reserve_stock
+from .loyalty import member_drink_count
+from .models import Member, MenuItem, OrderItem, OrderRecord, ORDER_STATES, Ticket
+from .order_options import (
+    OPTION_COLUMNS,
+    insert_order_addons,
+    load_order_addons,
+    load_record_addons,
+    split_options,
+)
+from .tickets import create_ticket, refresh_tickets, remove_ticket_item
+from .versions import ORDERS_VERSION, bump_version, read_version
 ACTIVE_ORDER_STATES = ("received", "preparing")
+DEFAULT_HISTORY_PAGE_SIZE = 200
+MAX_HISTORY_PAGE_SIZE = 200
+MAX_BULK_UPDATES = 100
 
 
-def _archive_order(
-    session,
-    order: OrderItem,
-    *,
-    account_type: str | None = None,
-    account_id: int | None = None,
-) -> dict:
-    """Persist a completed order record and remove the active order item."""
-    menu_item = session.get(MenuItem, order.item_id)
-    member = session.get(Member, order.member_id) if order.member_id else None
-    staff_id = order.staff_id
-    if account_type == "staff" and account_id:
-        staff_id = account_id
-
-    completed_at = current_local_datetime()
-
-    existing_record = session.scalar(
-        select(OrderRecord).where(OrderRecord.order_item_id == order.id)
-    )
+def _mark_orders_changed(session) -> None:
+    """Bump the shared order change marker inside the caller's transaction."""
+    bump_version(session, ORDERS_VERSION)
 
-    if existing_record:
-        record = existing_record
-    else:
-        record = OrderRecord(order_item_id=order.id)
-        session.add(record)
 
-    record.member_id = order.member_id
-    record.staff_id = staff_id
-    record.item_id = order.item_id
-    record.qty = order.qty
-    record.status = "complete"
-    record.total_price = order.total_price
-    record.created_at = order.created_at
-    record.completed_at = record.completed_at or completed_at
-    record.customizations = order.customizations
-
-    session.flush()
-    session.delete(order)
-    session.flush()
-
-    return _serialize_completed_record(record, menu_item, member)
+def _load_members(session, member_ids) -> dict[int, Member]:
+    ids = {member_id for member_id in member_ids if member_id}
+    if not ids:
+        return {}
+    return {member.id: member for member in session.scalars(select(Member).where(Member.id.in_(ids)))}
 
 
 def current_local_datetime() -> datetime:
@@ -140,114 +143,154 @@ def to_local_iso(value: datetime | None) -> str | None:
     return local_dt.isoformat()
 
 
-def _serialize_order_item(order: OrderItem, menu_item: MenuItem | None = None, member: Member | None = None):
-    customizations = deserialize_customizations(order.customizations)
-    milk_label = customizations.get("milk")
-    if milk_label is None or (isinstance(milk_label, str) and milk_label.strip() == ""):
-        milk_label = "None"
-    elif isinstance(milk_label, str):
-        milk_label = milk_label.strip()
-    else:
-        milk_label = str(milk_label)
-
-    addon_labels = customizations.get("addons")
-    if not isinstance(addon_labels, list):
-        addon_labels = []
-    else:
-        addon_labels = [label for label in (str(item).strip() for item in addon_labels) if label]
-
-    tea_label = customizations.get("tea")
-    if tea_label is not None and not isinstance(tea_label, str):
-        tea_label = str(tea_label)
-
-    sugar_label = customizations.get("sugar")
-    if sugar_label is not None and not isinstance(sugar_label, str):
-        sugar_label = str(sugar_label)
-    if isinstance(sugar_label, str):
-        sugar_label = sugar_label.strip() or None
-
-    ice_label = customizations.get("ice")
-    if ice_label is not None and not isinstance(ice_label, str):
-        ice_label = str(ice_label)
-    if isinstance(ice_label, str):
-        ice_label = ice_label.strip() or None
-
-    options_payload = {
-        "tea": tea_label,
-        "milk": milk_label or "None",
-        "sugar": sugar_label,
-        "ice": ice_label,
-        "addons": addon_labels,
+@lru_cache(maxsize=1024)
+def _options_payload(tea, milk, sugar, ice, addons: tuple[str, ...]) -> dict:
+    # Stored options are already normalized, so one payload per distinct combination
+    # is shared by every row that uses it. Callers must not mutate the result.
+    return {
+        "tea": tea,
+        "milk": milk or "None",
+        "sugar": sugar,
+        "ice": ice,
+        "addons": list(addons),
     }
 
-    return {
-        "id": order.id,
-        "menu_item_id": order.item_id,
-        "name": (menu_item.name if menu_item else None),
-        "quantity": order.qty,
-        "status": order.status,
-        "total_price": float(order.total_price or 0),
-        "created_at": to_local_iso(order.created_at),
-        "member_id": order.member_id,
-        "member_name": member.full_name if member else None,
-        "options": options_payload,
+
+def _order_payload(row, archived: bool, menu_name: str | None, member_name: str | None, addons=()) -> dict:
+    """Single-pass payload shared by live orders and archived records.
+
+    ``row`` may be an ORM instance or a plain result row with the same
+    attribute names; list endpoints pass result rows to skip ORM hydration.
+    """
+    payload = {
+        "id": row.order_item_id if archived else row.id,
+        "ticket_id": row.ticket_id,
+        "menu_item_id": row.item_id,
+        "name": menu_name,
+        "quantity": row.qty,
+        "status": (row.status or "complete") if archived else row.status,
+        "total_price": float(row.total_price or 0),
+        "created_at": to_local_iso(row.created_at),
+        "member_id": row.member_id,
+        "member_name": member_name,
+        "options": _options_payload(row.tea, row.milk, row.sugar, row.ice, tuple(addons)),
     }
+    if archived or row.status == "complete":
+        payload["completed_at"] = to_local_iso(row.completed_at)
+    return payload
 
 
-def _serialize_completed_record(record: OrderRecord, menu_item: MenuItem | None = None, member: Member | None = None):
-    customizations = deserialize_customizations(record.customizations)
-    milk_label = customizations.get("milk")
-    if milk_label is None or (isinstance(milk_label, str) and milk_label.strip() == ""):
-        milk_label = "None"
-    elif isinstance(milk_label, str):
-        milk_label = milk_label.strip()
-    else:
-        milk_label = str(milk_label)
+def _serialize_order(
+    row: OrderItem | OrderRecord,
+    menu_item: MenuItem | CatalogItem | None = None,
+    member: Member | None = None,
+    addons=(),
+) -> dict:
+    return _order_payload(
+        row,
+        isinstance(row, OrderRecord),
+        menu_item.name if menu_item else None,
+        member.full_name if member else None,
+        addons,
+    )
 
-    addon_labels = customizations.get("addons")
-    if not isinstance(addon_labels, list):
-        addon_labels = []
-    else:
-        addon_labels = [label for label in (str(item).strip() for item in addon_labels) if label]
-
-    tea_label = customizations.get("tea")
-    if tea_label is not None and not isinstance(tea_label, str):
-        tea_label = str(tea_label)
-
-    sugar_label = customizations.get("sugar")
-    if sugar_label is not None and not isinstance(sugar_label, str):
-        sugar_label = str(sugar_label)
-    if isinstance(sugar_label, str):
-        sugar_label = sugar_label.strip() or None
-
-    ice_label = customizations.get("ice")
-    if ice_label is not None and not isinstance(ice_label, str):
-        ice_label = str(ice_label)
-    if isinstance(ice_label, str):
-        ice_label = ice_label.strip() or None
-
-    options_payload = {
-        "tea": tea_label,
-        "milk": milk_label or "None",
-        "sugar": sugar_label,
-        "ice": ice_label,
-        "addons": addon_labels,
-    }
 
+def _ticket_payload(row, member_name: str | None = None) -> dict:
+    """Ticket summary; ``row`` may be a ``Ticket`` or a result row with its columns."""
     return {
-        "id": record.order_item_id,
-        "menu_item_id": record.item_id,
-        "name": (menu_item.name if menu_item else None),
-        "quantity": record.qty,
-        "status": record.status or "complete",
-        "total_price": float(record.total_price or 0),
-        "created_at": to_local_iso(record.created_at),
-        "completed_at": to_local_iso(record.completed_at) if record.completed_at else None,
-        "member_id": record.member_id,
-        "member_name": member.full_name if member else None,
-        "options": options_payload,
+        "id": row.id,
+        "status": row.status,
+        "item_count": row.item_count,
+        "open_count": row.open_count,
+        "total_price": float(row.total_price or 0),
+        "member_id": row.member_id,
+        "member_name": member_name,
+        "created_at": to_local_iso(row.created_at),
+        "updated_at": to_local_iso(row.updated_at),
+        "completed_at": to_local_iso(row.completed_at),
     }
 
+
+_ORDER_ROW_COLUMNS = (
+    "ticket_id",
+    "item_id",
+    "qty",
+    "status",
+    "total_price",
+    "created_at",
+    "completed_at",
+    "member_id",
+    *OPTION_COLUMNS,
+)
+
+
+def _order_row_columns(source) -> list:
+    """Columns ``_order_payload`` reads; ``source`` is a model or a compacted month's table."""
+    table = getattr(source, "__table__", source)
+    columns = [table.c[name] for name in ("id", *_ORDER_ROW_COLUMNS)]
+    if "order_item_id" in table.c:
+        columns.append(table.c.order_item_id)
+    return columns + [MenuItem.name.label("menu_name"), Member.full_name.label("member_name")]
+
+
+def _history_stmt(records, account_type, account_id, filter_ids, cursor, since, until, limit: int):
+    # Keyset walk over (completed_at, id) served by ix_order_records_member_completed
+    # and ix_order_records_completed, so deep pages cost the same as the first.
+    stmt = (
+        select(*_order_row_columns(records))
+        .join(MenuItem, MenuItem.id == records.c.item_id)
+        .join(Member, Member.id == records.c.member_id, isouter=True)
+        .order_by(records.c.completed_at.desc(), records.c.id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(records.c.completed_at, records.c.id) < tuple_(*cursor))
+    if since is not None:
+        stmt = stmt.where(records.c.completed_at >= since)
+    if until is not None:
+        stmt = stmt.where(records.c.completed_at < until)
+    if account_type == "member":
+        stmt = stmt.where(records.c.member_id == account_id)
+    elif account_type != "staff":
+        stmt = stmt.where(records.c.member_id.is_(None))
+    if filter_ids:
+        stmt = stmt.where(records.c.order_item_id.in_(filter_ids))
+    return stmt
+
+
+def _history_completed_at(row) -> datetime:
+    return row.completed_at or datetime.min
+
+
+def _history_page(session, account_type, account_id, filter_ids, cursor, since, until, page_size: int) -> list:
+    """Up to ``page_size + 1`` history rows, newest first, each paired with its add-ons.
+
+    ``order_records`` is read first. Compacted months are opened newest first,
+    and only while they could still hold rows that belong on this page.
+    """
+    limit = page_size + 1
+    filters = (account_type, account_id, filter_ids, cursor, since, until, limit)
+    rows = session.execute(_history_stmt(OrderRecord.__table__, *filters)).all()
+    addons = load_record_addons(session, [row.id for row in rows])
+    entries = [(row, addons.get(row.id, ())) for row in rows]
+
+    upper = until
+    if cursor is not None:
+        upper = cursor[0] if upper is None else min(upper, cursor[0])
+    for partition in history.partitions(session, since, upper):
+        if filter_ids and len(entries) == len(filter_ids):
+            break
+        if len(entries) >= limit and _history_completed_at(entries[-1][0]) > partition.last_completed_at:
+            break
+        with history.attached(session, partition) as (records, record_addons):
+            rows = session.execute(_history_stmt(records, *filters)).all()
+            addons = load_record_addons(session, [row.id for row in rows], record_addons)
+        entries.extend((row, addons.get(row.id, ())) for row in rows)
+        entries.sort(key=lambda entry: (_history_completed_at(entry[0]), entry[0].id), reverse=True)
+        del entries[limit:]
+    return entries
+
+
 def _get_identity(optional: bool = True):
     try:
         verify_jwt_in_request(optional=optional)
@@ -272,13 +315,37 @@ def _coerce_decimal(value, fallback: Decimal) -> Decimal:
         return fallback
 
 
-@bp.get("")
-def list_orders():
-    account_type, account_id, _ = _get_identity(optional=True)
+def _encode_history_cursor(record) -> str:
+    # Migration step 17 and the archiver leave no history row without completed_at.
+    raw = f"{record.completed_at.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_history_cursor(raw: str) -> tuple[datetime, int]:
+    padded = raw + "=" * (-len(raw) % 4)
+    try:
+        completed_raw, _, id_raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").partition("|")
+        return datetime.fromisoformat(completed_raw), int(id_raw)
+    except (ValueError, UnicodeError, binascii.Error) as exc:
+        raise ValueError("cursor is invalid") from exc
+
 
-    raw_id_values = request.args.getlist("ids") or []
+def _parse_page_size(raw: str | None) -> int:
+    if raw is None or raw == "":
+        return DEFAULT_HISTORY_PAGE_SIZE
+    try:
+        value = int(raw)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("limit must be an integer") from exc
+    if value <= 0:
+        raise ValueError("limit must be greater than zero")
+    return min(value, MAX_HISTORY_PAGE_SIZE)
+
+
+def _parse_id_list(raw_values) -> list[int]:
+    """Collect integer ids from repeated and/or comma separated query values."""
     parsed_ids: set[int] = set()
-    for value in raw_id_values:
+    for value in raw_values or []:
         for segment in str(value).split(","):
             part = segment.strip()
             if not part:
@@ -287,11 +354,42 @@ def list_orders():
                 parsed_ids.add(int(part))
             except ValueError:
                 continue
-    filter_ids = sorted(parsed_ids)
+    return sorted(parsed_ids)
+
+
+@bp.get("")
+def list_orders():
+    account_type, account_id, _ = _get_identity(optional=True)
+
+    filter_ids = _parse_id_list(request.args.getlist("ids"))
+
+    raw_cursor = (request.args.get("cursor") or "").strip()
+    try:
+        page_size = _parse_page_size(request.args.get("limit"))
+        cursor = _decode_history_cursor(raw_cursor) if raw_cursor else None
+        since, until = history.parse_date_range(request.args.get("since"), request.args.get("until"))
+    except ValueError as exc:
+        return _json_error(str(exc), 400)
+
+    with ReadSessionLocal() as session:
+        etag = make_etag(
+            "orders",
+            read_version(session, ORDERS_VERSION),
+            catalog.snapshot().version,
+            account_type,
+            account_id,
+            ",".join(str(value) for value in filter_ids),
+            raw_cursor,
+            page_size,
+            since,
+            until,
+        )
+        cached = not_modified(etag, private=True)
+        if cached is not None:
+            return cached
 
-    with session_scope() as session:
         stmt = (
-            select(OrderItem, MenuItem, Member)
+            select(*_order_row_columns(OrderItem))
             .join(MenuItem, MenuItem.id == OrderItem.item_id)
             .join(Member, Member.id == OrderItem.member_id, isouter=True)
             .order_by(OrderItem.created_at.desc())
@@ -307,64 +405,305 @@ def list_orders():
                 stmt = stmt.where(OrderItem.id.in_(filter_ids))
         else:
             if not filter_ids:
-                return jsonify({"order_items": []})
+                return jsonify({"order_items": [], "next_cursor": None})
             stmt = stmt.where(OrderItem.id.in_(filter_ids)).where(OrderItem.member_id.is_(None))
 
-        result_by_id: dict[int, dict] = {}
-        for order, menu_item, member in session.execute(stmt).all():
-            payload = _serialize_order_item(order, menu_item, member)
-            result_by_id[payload["id"]] = payload
+        ordered_payload: list[dict] = []
+        active_ids: set[int] = set()
+        # Live orders only lead the first page; later pages walk history alone.
+        if cursor is None:
+            active_rows = session.execute(stmt).all()
+            order_addons = load_order_addons(session, [row.id for row in active_rows])
+            for row in active_rows:
+                ordered_payload.append(
+                    _order_payload(row, False, row.menu_name, row.member_name, order_addons.get(row.id, ()))
+                )
+                active_ids.add(row.id)
+
+        include_records = not (account_type == "staff" and not filter_ids)
+
+        next_cursor = None
+        if include_records:
+            entries = _history_page(session, account_type, account_id, filter_ids, cursor, since, until, page_size)
+            if len(entries) > page_size:
+                entries = entries[:page_size]
+                next_cursor = _encode_history_cursor(entries[-1][0])
+            for row, addons in entries:
+                if row.order_item_id in active_ids:
+                    continue
+                ordered_payload.append(_order_payload(row, True, row.menu_name, row.member_name, addons))
+
+        body = {"order_items": ordered_payload, "next_cursor": next_cursor}
+        return with_etag(jsonify(body), etag, private=True)
+
+
+_TICKET_COLUMNS = (
+    Ticket.id,
+    Ticket.status,
+    Ticket.item_count,
+    Ticket.open_count,
+    Ticket.total_price,
+    Ticket.member_id,
+    Ticket.created_at,
+    Ticket.updated_at,
+    Ticket.completed_at,
+    Member.full_name.label("member_name"),
+)
+
+
+def _ticket_select():
+    return select(*_TICKET_COLUMNS).join(Member, Member.id == Ticket.member_id, isouter=True)
 
-        active_ids = set(result_by_id.keys())
 
-        record_stmt = (
-            select(OrderRecord, MenuItem, Member)
-            .join(MenuItem, MenuItem.id == OrderRecord.item_id)
-            .join(Member, Member.id == OrderRecord.member_id, isouter=True)
-            .order_by(OrderRecord.completed_at.desc())
+def _can_view_ticket(row, account_type: str | None, account_id: int | None) -> bool:
+    if account_type == "staff":
+        return True
+    if account_type == "member":
+        return row.member_id == account_id
+    return row.member_id is None
+
+
+@bp.get("/tickets")
+def list_tickets():
+    """Ticket summaries in one indexed query, so polling cost follows carts, not drinks.
+
+    Staff see open tickets (or the ``ids`` they ask for), members their own
+    most recent tickets and guests only the ``ids`` they hold.
+    """
+    account_type, account_id, _ = _get_identity(optional=True)
+    filter_ids = _parse_id_list(request.args.getlist("ids"))
+    try:
+        page_size = _parse_page_size(request.args.get("limit"))
+    except ValueError as exc:
+        return _json_error(str(exc), 400)
+
+    with ReadSessionLocal() as session:
+        etag = make_etag(
+            "tickets",
+            read_version(session, ORDERS_VERSION),
+            account_type,
+            account_id,
+            ",".join(str(value) for value in filter_ids),
+            page_size,
         )
+        cached = not_modified(etag, private=True)
+        if cached is not None:
+            return cached
 
+        stmt = _ticket_select().order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(page_size)
         if account_type == "member":
-            record_stmt = record_stmt.where(OrderRecord.member_id == account_id)
-            if filter_ids:
-                record_stmt = record_stmt.where(OrderRecord.order_item_id.in_(filter_ids))
-            else:
-                record_stmt = record_stmt.limit(200)
+            # ix_tickets_member_created
+            stmt = stmt.where(Ticket.member_id == account_id)
         elif account_type == "staff":
-            if filter_ids:
-                record_stmt = record_stmt.where(OrderRecord.order_item_id.in_(filter_ids))
-            else:
-                record_stmt = record_stmt.limit(200)
+            if not filter_ids:
+                # ix_tickets_status_created
+                stmt = stmt.where(Ticket.status.in_(ACTIVE_ORDER_STATES))
         else:
-            record_stmt = record_stmt.where(OrderRecord.order_item_id.in_(filter_ids)).where(OrderRecord.member_id.is_(None))
+            if not filter_ids:
+                return jsonify({"tickets": []})
+            stmt = stmt.where(Ticket.member_id.is_(None))
+        if filter_ids:
+            stmt = stmt.where(Ticket.id.in_(filter_ids))
 
-        include_records = not (account_type == "staff" and not filter_ids)
+        tickets = [_ticket_payload(row, row.member_name) for row in session.execute(stmt)]
+        return with_etag(jsonify({"tickets": tickets}), etag, private=True)
 
-        if include_records:
-            for record, menu_item, member in session.execute(record_stmt).all():
-                if record.order_item_id in active_ids:
-                    continue
-                payload = _serialize_completed_record(record, menu_item, member)
-                result_by_id[payload["id"]] = payload
 
-        ordered_payload = sorted(result_by_id.values(), key=lambda item: item.get("created_at") or "", reverse=True)
-        return jsonify({"order_items": ordered_payload})
+@bp.get("/tickets/<int:ticket_id>")
+def get_ticket(ticket_id: int):
+    """One ticket with all of its drinks, live and archived."""
+    account_type, account_id, _ = _get_identity(optional=True)
+
+    with ReadSessionLocal() as session:
+        etag = make_etag(
+            "ticket",
+            read_version(session, ORDERS_VERSION),
+            catalog.snapshot().version,
+            ticket_id,
+            account_type,
+            account_id,
+        )
+        cached = not_modified(etag, private=True)
+        if cached is not None:
+            return cached
+
+        ticket = session.execute(_ticket_select().where(Ticket.id == ticket_id)).first()
+        if ticket is None or not _can_view_ticket(ticket, account_type, account_id):
+            return _json_error("ticket not found", 404)
+
+        live_rows = session.execute(
+            select(*_order_row_columns(OrderItem))
+            .join(MenuItem, MenuItem.id == OrderItem.item_id)
+            .join(Member, Member.id == OrderItem.member_id, isouter=True)
+            .where(OrderItem.ticket_id == ticket_id)
+        ).all()
+        order_addons = load_order_addons(session, [row.id for row in live_rows])
+        items = [
+            _order_payload(row, False, row.menu_name, row.member_name, order_addons.get(row.id, ()))
+            for row in live_rows
+        ]
+        # Recent history first; compacted months only while drinks are still missing.
+        with closing(history.history_tables(session, ticket.created_at, ticket.completed_at)) as sources:
+            for records, record_addons in sources:
+                if len(items) >= ticket.item_count:
+                    break
+                record_rows = session.execute(
+                    select(*_order_row_columns(records))
+                    .join(MenuItem, MenuItem.id == records.c.item_id)
+                    .join(Member, Member.id == records.c.member_id, isouter=True)
+                    .where(records.c.ticket_id == ticket_id)
+                ).all()
+                addons = load_record_addons(session, [row.id for row in record_rows], record_addons)
+                items.extend(
+                    _order_payload(row, True, row.menu_name, row.member_name, addons.get(row.id, ()))
+                    for row in record_rows
+                )
+        items.sort(key=lambda item: item["id"])
+        body = {"ticket": _ticket_payload(ticket, ticket.member_name), "order_items": items}
+        return with_etag(jsonify(body), etag, private=True)
+
+
+def _parse_last_event_id(raw: str | None) -> int | None:
+    if raw is None:
+        return None
+    try:
+        return max(0, int(str(raw).strip()))
+    except ValueError:
+        return None
+
+
+def _order_event_stream(
+    cursor: int, poll_seconds: float, max_seconds: float, heartbeat_seconds: float, expires_at: int | None
+):
+    started = time.monotonic()
+    last_sent = started
+    # The browser reconnects with the same credentials; if they will have
+    # expired by then, end before they do and tell the client to renew.
+    expiring = False
+    if expires_at is not None:
+        remaining = expires_at - time.time()
+        if remaining <= max_seconds + order_events.STREAM_RETRY_MILLISECONDS / 1000:
+            expiring = True
+            max_seconds = min(max_seconds, max(0.0, remaining))
+    yield f"retry: {order_events.STREAM_RETRY_MILLISECONDS}\n\n"
+    while True:
+        with ReadSessionLocal() as session:
+            batch = order_events.fetch_order_events(session, cursor)
+            chunks = [format_sse(event) for event in batch]
+        if batch:
+            cursor = batch[-1].id
+            last_sent = time.monotonic()
+            yield "".join(chunks)
+            if len(batch) == order_events.STREAM_BATCH_SIZE:
+                continue
+        now = time.monotonic()
+        if now - started >= max_seconds:
+            if expiring:
+                yield order_events.format_expired()
+            return
+        if now - last_sent >= heartbeat_seconds:
+            last_sent = now
+            yield ": keep-alive\n\n"
+        time.sleep(poll_seconds)
+
+
+@bp.post("/stream/token")
+@role_required("staff", "manager")
+def stream_token():
+    """Token for ``GET /api/orders/stream?token=``, valid until this login expires."""
+    claims = get_jwt() or {}
+    expires_at = claims.get("exp")
+    token = order_events.issue_stream_token(get_jwt_identity(), claims.get("role"), expires_at)
+    expires_in = None if expires_at is None else max(0, int(expires_at - time.time()))
+    return jsonify({"token": token, "expires_in": expires_in})
+
+
+@bp.get("/stream")
+def stream_orders():
+    """Server-Sent Events feed of order lifecycle changes for staff screens."""
+    token = request.args.get("token")
+    if token:
+        claims = order_events.read_stream_token(token)
+        if claims is None:
+            return _json_error("authorization required", 401)
+    else:
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            return _json_error("authorization required", 401)
+        claims = get_jwt() or {}
+    if claims.get("role") not in {"staff", "manager"}:
+        return _json_error("insufficient permissions", 403)
+
+    cursor = _parse_last_event_id(request.headers.get("Last-Event-ID"))
+    if cursor is None:
+        cursor = _parse_last_event_id(request.args.get("last_event_id"))
+    if cursor is None:
+        with ReadSessionLocal() as session:
+            cursor = latest_order_event_id(session)
+
+    if not order_events.acquire_stream_slot():
+        response = jsonify({"error": "too many open streams, retry shortly"})
+        response.headers["Retry-After"] = str(order_events.STREAM_BUSY_RETRY_SECONDS)
+        return response, 503
+    stream = _order_event_stream(
+        cursor,
+        order_events.STREAM_POLL_SECONDS,
+        order_events.STREAM_MAX_SECONDS,
+        order_events.STREAM_HEARTBEAT_SECONDS,
+        claims.get("exp"),
+    )
+    response = Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(order_events.release_stream_slot)
+    return response
+
+
+def _replay_response(stored, fingerprint: str) -> Response:
+    if stored.request_hash != fingerprint:
+        return _json_error(f"{IDEMPOTENCY_HEADER} was already used with a different request", 422)
+    response = Response(stored.response_body, status=stored.status_code, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _sweep_idempotency_keys() -> None:
+    with session_scope() as session:
+        sweep_expired_keys(session)
 
 
 @bp.post("")
 def create_order():
     data = request.get_json(silent=True) or {}
+    account_type, account_id, _ = _get_identity(optional=True)
+
+    idempotency_key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip() or None
+    stale_key = False
+    if idempotency_key:
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return _json_error(f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters", 400)
+        scope = key_scope(account_type, account_id)
+        fingerprint = request_fingerprint(data)
+        # Retries usually arrive after the first attempt committed: answer them
+        # from the read pool before any validation or stock work.
+        with ReadSessionLocal() as session:
+            stored = find_key(session, scope, idempotency_key)
+        if stored is not None:
+            if not is_expired(stored):
+                return _replay_response(stored, fingerprint)
+            stale_key = True
+
     raw_items = data.get("items") or []
     applied_reward = data.get("reward")
     if not isinstance(raw_items, list) or len(raw_items) == 0:
         return _json_error("items must be a non-empty list", 400)
 
-    account_type, account_id, _ = _get_identity(optional=True)
     member_id = account_id if account_type == "member" else None
     staff_id = account_id if account_type == "staff" else None
 
-    order_items: list[tuple[OrderItem, MenuItem]] = []
-
     with session_scope() as session:
         # If member, check for available reward
         reward_obj = None
@@ -376,52 +715,14 @@ def create_order():
                 .where(MemberReward.status == "pending")
             ).scalar_one_or_none()
         inventory_reservations: dict[int, int] = {}
-        tracked_items: dict[int, MenuItem] = {}
-        inventory_lookup: dict[tuple[str, str], MenuItem] = {}
-        inventory_lookup_loaded = False
-
-        def _normalize_lookup_key(name: str | None, category: str | None) -> tuple[str, str]:
-            return ((name or "").strip().lower(), (category or "").strip().lower())
-
-        def _populate_inventory_lookup():
-            nonlocal inventory_lookup_loaded
-            if inventory_lookup_loaded:
-                return
-            for candidate in session.scalars(select(MenuItem)):
-                inventory_lookup[_normalize_lookup_key(candidate.name, candidate.category)] = candidate
-            inventory_lookup_loaded = True
-
-        def _find_inventory_item_by_label(label: object, category_hint: str | None = None) -> MenuItem | None:
-            if not isinstance(label, str):
-                return None
-            value = label.strip()
-            if not value or value.lower() == "none":
-                return None
-            _populate_inventory_lookup()
-            key = _normalize_lookup_key(value, category_hint)
-            candidate = inventory_lookup.get(key)
-            if candidate:
-                return candidate
-            normalized_value = value.lower()
-            for (name_key, _category_key), item in inventory_lookup.items():
-                if name_key == normalized_value:
-                    return item
-            return None
-
-        def reserve_item(item: MenuItem, amount: int, label: str | None = None):
-            if item.id not in tracked_items:
-                tracked_items[item.id] = item
-            if item.quantity is None:
-                return None
-            pending = inventory_reservations.get(item.id, 0)
-            available = item.quantity - pending
-            if available < amount:
-                name = (label or item.name or "item")
-                return _json_error(f"insufficient quantity for {name}", 400)
-            inventory_reservations[item.id] = pending + amount
-            return None
-
-    for idx, entry in enumerate(raw_items):
+        resolver = catalog.snapshot()
+
+        def reserve_item(item: CatalogItem, amount: int):
+            inventory_reservations[item.id] = inventory_reservations.get(item.id, 0) + amount
+
+        pending_lines: list[tuple[CatalogItem, int, Decimal, str | None, dict[str, str | None], list[str]]] = []
+
+        for idx, entry in enumerate(raw_items):
             if not isinstance(entry, dict):
                 return _json_error("each item must be an object", 400)
 
@@ -442,13 +743,11 @@ def create_order():
             if quantity <= 0:
                 return _json_error("quantity must be greater than zero", 400)
 
-            menu_item = session.get(MenuItem, menu_item_id)
+            menu_item = resolver.get(menu_item_id)
             if not menu_item or not menu_item.is_active:
                 return _json_error("menu item not available", 404)
 
-            error_response = reserve_item(menu_item, quantity, menu_item.name)
-            if error_response:
-                return error_response
+            reserve_item(menu_item, quantity)
 
             customizations = normalize_customizations(entry.get("options"))
 
@@ -467,24 +766,21 @@ def create_order():
                     extra_counts[extra_id] = extra_counts.get(extra_id, 0) + 1
 
             if isinstance(customizations, dict):
-                milk_candidate = _find_inventory_item_by_label(customizations.get("milk"), "milk")
+                milk_candidate = resolver.find_by_label(customizations.get("milk"), "milk")
                 if milk_candidate and milk_candidate.id != menu_item.id and milk_candidate.id not in extra_counts:
                     extra_counts[milk_candidate.id] = 1
                 addon_labels = customizations.get("addons")
                 if isinstance(addon_labels, list):
                     for addon_label in addon_labels:
-                        addon_item = _find_inventory_item_by_label(addon_label, "addon")
+                        addon_item = resolver.find_by_label(addon_label, "addon")
                         if addon_item and addon_item.id != menu_item.id and addon_item.id not in extra_counts:
                             extra_counts[addon_item.id] = 1
 
             for extra_id, count in extra_counts.items():
-                extra_item = session.get(MenuItem, extra_id)
+                extra_item = resolver.get(extra_id)
                 if not extra_item or not extra_item.is_active:
                     return _json_error("inventory item not available", 404)
-                required_qty = quantity * count
-                error_response = reserve_item(extra_item, required_qty, extra_item.name)
-                if error_response:
-                    return error_response
+                reserve_item(extra_item, quantity * count)
 
             if extra_counts:
                 customizations["_inventory_reservations"] = [
@@ -505,38 +801,267 @@ def create_order():
                     customizations["reward_free_addon"] = True
 
             customizations_json = json.dumps(customizations) if customizations else None
+            option_values, addon_labels = split_options(customizations)
+            pending_lines.append((menu_item, quantity, total_price, customizations_json, option_values, addon_labels))
+
+        # Reserve every line in one conditional batch before queueing any rows so
+        # a shortage rolls back cleanly and reports all short items at once.
+        contended = False
+        try:
+            shortages = reserve_stock(session, inventory_reservations)
+        except StockContention:
+            shortages, contended = [], True
+        if (shortages or contended) and idempotency_key:
+            # A concurrent attempt with this key may have taken the last stock.
+            stored = find_key(session, scope, idempotency_key)
+            if stored is not None and not is_expired(stored):
+                return _replay_response(stored, fingerprint)
+        if contended:
+            # Not a shortage: the same request is expected to succeed on retry.
+            response = jsonify({"error": "stock is busy, retry shortly"})
+            response.headers["Retry-After"] = str(CONTENTION_RETRY_AFTER_SECONDS)
+            return response, 503
+        if shortages:
+            names = ", ".join(entry["name"] or "item" for entry in shortages)
+            return jsonify({"error": f"insufficient quantity for {names}", "shortages": shortages}), 400
+
+        created_at = current_local_datetime()
+        ticket = create_ticket(
+            session,
+            member_id=member_id,
+            staff_id=staff_id,
+            created_at=created_at,
+            item_count=len(pending_lines),
+            total_price=sum((line[2] for line in pending_lines), Decimal("0.00")),
+        )
+        order_rows = [
+            {
+                "ticket_id": ticket.id,
+                "item_id": menu_item.id,
+                "qty": quantity,
+                "status": "received",
+                "total_price": total_price,
+                "member_id": member_id,
+                "staff_id": staff_id,
+                "created_at": created_at,
+                "customizations": customizations_json,
+                **option_values,
+            }
+            for menu_item, quantity, total_price, customizations_json, option_values, _ in pending_lines
+        ]
+        # One multi-row INSERT ... RETURNING, with rows handed back in cart order.
+        inserted = session.scalars(
+            insert(OrderItem).returning(OrderItem, sort_by_parameter_order=True), order_rows
+        ).all()
+        addons_by_order = {
+            order_item.id: addon_labels
+            for order_item, (*_, addon_labels) in zip(inserted, pending_lines)
+        }
+        insert_order_addons(session, addons_by_order)
+        metrics.count_on_commit(session, "orders_created_total", len(inserted))
+        order_items = [(order_item, resolver.get(order_item.item_id)) for order_item in inserted]
+
+        # Mark reward as used if applied
+        if reward_obj:
+            reward_obj.status = "used"
+            session.add(reward_obj)
+        _mark_orders_changed(session)
+        session.flush()
+
+        member = session.get(Member, member_id) if member_id else None
+        response_items = [
+            _serialize_order(order_item, menu_item, member, addons_by_order[order_item.id])
+            for order_item, menu_item in order_items
+        ]
+        record_order_events(session, [("created", item["id"], item) for item in response_items])
+        body = {
+            "message": "order created",
+            "ticket": _ticket_payload(ticket, member.full_name if member else None),
+            "order_items": response_items,
+        }
+        if idempotency_key:
+            if stale_key:
+                discard_key(session, scope, idempotency_key)
+            try:
+                store_response(session, scope, idempotency_key, fingerprint, 201, body)
+            except IntegrityError:
+                # A concurrent attempt with the same key committed first (it held
+                # the write lock while this one waited); drop this duplicate.
+                session.rollback()
+                return _replay_response(find_key(session, scope, idempotency_key), fingerprint)
+        session.commit()
 
-            order_item = OrderItem(
-                item_id=menu_item.id,
-                qty=quantity,
-                total_price=total_price,
-                member_id=member_id,
-                staff_id=staff_id,
-                created_at=current_local_datetime(),
-                customizations=customizations_json,
-            )
-            session.add(order_item)
-            order_items.append((order_item, menu_item))
+    if idempotency_key and sweep_timer.due():
+        _sweep_idempotency_keys()
+    return jsonify(body), 201
+
+
+def _parse_bulk_updates(data) -> list[tuple[int, str]]:
+    """Accept ``{"updates": [{"id", "status"}]}`` or ``{"ids": [...], "status": ...}``."""
+    if not isinstance(data, dict):
+        raise ValueError("request body must be a JSON object")
+    if "updates" in data:
+        entries = data["updates"]
+        if not isinstance(entries, list):
+            raise ValueError("updates must be a list")
+    else:
+        ids = data.get("ids")
+        if not isinstance(ids, list):
+            raise ValueError("updates or ids is required")
+        entries = [{"id": order_id, "status": data.get("status")} for order_id in ids]
+    if not entries:
+        raise ValueError("no orders to update")
+    if len(entries) > MAX_BULK_UPDATES:
+        raise ValueError(f"at most {MAX_BULK_UPDATES} orders per request")
+
+    updates = []
+    seen = set()
+    valid = ", ".join(ORDER_STATES)
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("each update must be an object with id and status")
+        order_id = entry.get("id")
+        if isinstance(order_id, bool) or not isinstance(order_id, int):
+            raise ValueError("each update needs an integer id")
+        if order_id in seen:
+            raise ValueError(f"order {order_id} appears more than once")
+        seen.add(order_id)
+        status = str(entry.get("status") or "").strip().lower()
+        if status not in ORDER_STATES:
+            raise ValueError(f"status must be one of: {valid}")
+        updates.append((order_id, status))
+    return updates
+
+
+def _apply_status_updates(
+    session,
+    updates: list[tuple[OrderItem, str]],
+    *,
+    account_type: str | None,
+    account_id: int | None,
+) -> dict[int, dict]:
+    """Move loaded live orders to new states with one UPDATE per target; returns payloads by id.
+
+    Completion only flips the status and stamps ``completed_at``; the archiver
+    moves the rows into history later.
+    """
+    if not updates:
+        return {}
+    now = current_local_datetime()
+    staff_values = {"staff_id": account_id} if account_type == "staff" and account_id else {}
+    by_status: dict[str, list[OrderItem]] = {}
+    for order, status in updates:
+        by_status.setdefault(status, []).append(order)
+    for status, orders in by_status.items():
+        values = {"status": status, **staff_values}
+        if status == "complete":
+            values["completed_at"] = now
+        session.execute(update(OrderItem).where(OrderItem.id.in_([order.id for order in orders])).values(**values))
+
+    orders = [order for order, _ in updates]
+    addons_by_order = load_order_addons(session, [order.id for order in orders])
+    members = _load_members(session, [order.member_id for order in orders])
+    payloads = {
+        order.id: _serialize_order(
+            order, catalog.get(order.item_id), members.get(order.member_id), addons_by_order.get(order.id, [])
+        )
+        for order in orders
+    }
+    record_order_events(
+        session,
+        [
+            ("completed" if status == "complete" else "status_changed", order.id, payloads[order.id])
+            for order, status in updates
+        ],
+    )
+    refresh_tickets(session, [order.ticket_id for order in orders], now)
+    _mark_orders_changed(session)
+    return payloads
 
-    for item_id, decrease in inventory_reservations.items():
-        item = tracked_items.get(item_id)
-        if not item or item.quantity is None:
-            continue
-        item.quantity = max(0, item.quantity - decrease)
 
-    # Mark reward as used if applied
-    if reward_obj:
-        reward_obj.status = "used"
-        session.add(reward_obj)
-    session.commit()
+@bp.patch("")
+def bulk_update_orders():
+    """Move several orders to new states in one transaction.
 
-    response_items = []
-    for order_item, menu_item in order_items:
-        session.refresh(order_item)
-        member = session.get(Member, order_item.member_id) if order_item.member_id else None
-        response_items.append(_serialize_order_item(order_item, menu_item, member))
+    The response lists a result per requested id, in request order; unknown
+    ids and orders that are already complete are reported there without
+    failing the rest.
+    """
+    account_type, account_id, claims = _get_identity(optional=False)
+    role = (claims or {}).get("role")
+    if role not in {"staff", "manager"}:
+        return _json_error("insufficient permissions", 403)
 
-    return jsonify({"message": "order created", "order_items": response_items}), 201
+    try:
+        updates = _parse_bulk_updates(request.get_json(silent=True))
+    except ValueError as exc:
+        return _json_error(str(exc), 400)
+
+    with session_scope() as session:
+        orders = {
+            order.id: order
+            for order in session.scalars(select(OrderItem).where(OrderItem.id.in_([order_id for order_id, _ in updates])))
+        }
+        payloads = _apply_status_updates(
+            session,
+            [
+                (orders[order_id], status)
+                for order_id, status in updates
+                if order_id in orders and orders[order_id].status != "complete"
+            ],
+            account_type=account_type,
+            account_id=account_id,
+        )
+        session.commit()
+
+    results = []
+    for order_id, _ in updates:
+        if order_id in payloads:
+            results.append({"id": order_id, "ok": True, "order": payloads[order_id]})
+        elif order_id in orders:
+            results.append({"id": order_id, "ok": False, "status": 409, "error": "order is already complete"})
+        else:
+            results.append({"id": order_id, "ok": False, "status": 404, "error": "order not found"})
+    return jsonify({"results": results, "updated": len(payloads)})
+
+
+@bp.patch("/tickets/<int:ticket_id>")
+def update_ticket(ticket_id: int):
+    """Move every open drink on a ticket to ``status`` in one transaction."""
+    account_type, account_id, claims = _get_identity(optional=False)
+    role = (claims or {}).get("role")
+    if role not in {"staff", "manager"}:
+        return _json_error("insufficient permissions", 403)
+
+    data = request.get_json(silent=True) or {}
+    new_status = (data.get("status") or "").strip().lower()
+    if new_status not in ORDER_STATES:
+        valid = ", ".join(ORDER_STATES)
+        return _json_error(f"status must be one of: {valid}", 400)
+
+    with session_scope() as session:
+        ticket = session.get(Ticket, ticket_id)
+        if not ticket:
+            return _json_error("ticket not found", 404)
+        orders = session.scalars(
+            select(OrderItem)
+            .where(OrderItem.ticket_id == ticket_id, OrderItem.status != "complete")
+            .order_by(OrderItem.id)
+        ).all()
+        if not orders:
+            return _json_error("ticket is already complete", 409)
+
+        payloads = _apply_status_updates(
+            session,
+            [(order, new_status) for order in orders],
+            account_type=account_type,
+            account_id=account_id,
+        )
+        session.refresh(ticket)
+        member_name = next(iter(payloads.values()))["member_name"]
+        body = {"ticket": _ticket_payload(ticket, member_name), "order_items": [payloads[order.id] for order in orders]}
+        session.commit()
+    return jsonify(body)
 
 
 @bp.patch("/<int:order_item_id>")
@@ -556,23 +1081,17 @@ def update_order(order_item_id: int):
         order = session.get(OrderItem, order_item_id)
         if not order:
             return _json_error("order not found", 404)
-
-        if account_type == "staff" and account_id:
-            order.staff_id = account_id
-
-        if new_status == "complete":
-            order.status = new_status
-            payload = _archive_order(session, order, account_type=account_type, account_id=account_id)
-            session.commit()
-            return jsonify(payload)
-
-        order.status = new_status
+        if order.status == "complete":
+            return _json_error("order is already complete", 409)
+
+        payloads = _apply_status_updates(
+            session,
+            [(order, new_status)],
+            account_type=account_type,
+            account_id=account_id,
+        )
         session.commit()
-        session.refresh(order)
-
-        menu_item = session.get(MenuItem, order.item_id)
-        member = session.get(Member, order.member_id) if order.member_id else None
-        return jsonify(_serialize_order_item(order, menu_item, member))
+    return jsonify(payloads[order_item_id])
 
 
 @bp.delete("/<int:order_item_id>")
@@ -586,29 +1105,24 @@ def delete_order(order_item_id: int):
         order = session.get(OrderItem, order_item_id)
         if not order:
             return _json_error("order not found", 404)
+        if order.status == "complete":
+            return _json_error("order is already complete", 409)
 
         reservations = extract_inventory_reservations(order.customizations)
 
-        menu_item = session.get(MenuItem, order.item_id)
-        if menu_item and menu_item.quantity is not None:
-            base_qty = menu_item.quantity or 0
-            restock_amount = order.qty or 0
-            if restock_amount > 0:
-                menu_item.quantity = base_qty + restock_amount
-
+        order_qty = order.qty or 0
+        released: dict[int, int] = {order.item_id: order_qty}
         for extra_id, per_unit_count in reservations.items():
             if extra_id == order.item_id:
                 continue
-            extra_item = session.get(MenuItem, extra_id)
-            if not extra_item or extra_item.quantity is None:
-                continue
-            restock_amount = (order.qty or 0) * per_unit_count
-            if restock_amount <= 0:
-                continue
-            current_qty = extra_item.quantity or 0
-            extra_item.quantity = current_qty + restock_amount
+            released[extra_id] = released.get(extra_id, 0) + order_qty * per_unit_count
+        release_stock(session, released)
 
         session.delete(order)
+        session.flush()
+        remove_ticket_item(session, order.ticket_id, order.total_price or Decimal("0.00"), current_local_datetime())
+        record_order_event(session, "deleted", order_item_id, {"id": order_item_id})
+        _mark_orders_changed(session)
         session.commit()
 
     return jsonify({"message": "order deleted"})
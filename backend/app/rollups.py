@@ -0,0 +1,130 @@
+"""Incremental hourly sales rollups for analytics.
+
+``app.archiver`` calls ``record_sales`` for each batch in the same
+transaction as the history rows, so ``sales_item_hourly`` and
+``sales_label_hourly`` always agree with ``order_records``. ``python -m
+app.manage rollups rebuild`` regenerates both tables from history.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, update
+
+from .history import history_tables
+from .models import OrderRecord, SalesItemHourly, SalesLabelHourly
+
+LABEL_CATEGORIES = ("tea", "milk", "addon")
+
+
+def hour_bucket(value: datetime | None) -> datetime | None:
+    """Truncate to the hour as a naive wall-clock value, matching stored history."""
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def _is_label(value: str | None) -> bool:
+    return bool(value) and value.lower() != "none"
+
+
+def _sale_labels(tea: str | None, milk: str | None, addons) -> list[tuple[str, str]]:
+    labels = []
+    if _is_label(tea):
+        labels.append(("tea", tea))
+    if _is_label(milk):
+        labels.append(("milk", milk))
+    labels.extend(("addon", addon_label) for addon_label in addons if _is_label(addon_label))
+    return labels
+
+
+def _bump(session, model, key: dict, quantity: int) -> None:
+    stmt = update(model).values(quantity=model.quantity + quantity).execution_options(synchronize_session=False)
+    for column, value in key.items():
+        stmt = stmt.where(getattr(model, column) == value)
+    if session.execute(stmt).rowcount == 0:
+        session.execute(insert(model).values(**key, quantity=quantity))
+
+
+def record_sale(session, record: OrderRecord, addons, sign: int = 1) -> None:
+    """Add (or with ``sign=-1`` remove) one archived order line from the rollups."""
+    quantity = int(record.qty or 0)
+    hour_start = hour_bucket(record.completed_at or record.created_at)
+    if quantity <= 0 or hour_start is None:
+        return
+    delta = quantity * sign
+    _bump(session, SalesItemHourly, {"item_id": record.item_id, "hour_start": hour_start}, delta)
+    for category, label in _sale_labels(record.tea, record.milk, addons):
+        _bump(session, SalesLabelHourly, {"category": category, "label": label, "hour_start": hour_start}, delta)
+
+
+def record_sales(session, records_with_addons) -> None:
+    """Add many archived lines at once, issuing one bump per distinct rollup key."""
+    item_totals: dict[tuple[int, datetime], int] = defaultdict(int)
+    label_totals: dict[tuple[str, str, datetime], int] = defaultdict(int)
+    for record, addons in records_with_addons:
+        quantity = int(record.qty or 0)
+        hour_start = hour_bucket(record.completed_at or record.created_at)
+        if quantity <= 0 or hour_start is None:
+            continue
+        item_totals[(record.item_id, hour_start)] += quantity
+        for category, label in _sale_labels(record.tea, record.milk, addons):
+            label_totals[(category, label, hour_start)] += quantity
+    for (item_id, hour_start), quantity in item_totals.items():
+        _bump(session, SalesItemHourly, {"item_id": item_id, "hour_start": hour_start}, quantity)
+    for (category, label, hour_start), quantity in label_totals.items():
+        _bump(session, SalesLabelHourly, {"category": category, "label": label, "hour_start": hour_start}, quantity)
+
+
+def rebuild_sales_rollups(session) -> int:
+    """Regenerate both rollup tables from history, compacted months included; returns records read."""
+    item_totals: dict[tuple[int, datetime], int] = defaultdict(int)
+    label_totals: dict[tuple[str, str, datetime], int] = defaultdict(int)
+    processed = 0
+    for records, addons in history_tables(session):
+        addons_by_record = defaultdict(list)
+        addon_stmt = (
+            select(addons.c.order_record_id, addons.c.label)
+            .where(addons.c.order_record_id.isnot(None))
+            .order_by(addons.c.order_record_id, addons.c.position)
+        )
+        for record_id, label in session.execute(addon_stmt):
+            addons_by_record[record_id].append(label)
+
+        stmt = select(
+            records.c.id,
+            records.c.item_id,
+            records.c.completed_at,
+            records.c.created_at,
+            records.c.qty,
+            records.c.tea,
+            records.c.milk,
+        )
+        for record_id, item_id, completed_at, created_at, qty, tea, milk in session.execute(stmt):
+            quantity = int(qty or 0)
+            hour_start = hour_bucket(completed_at or created_at)
+            if quantity <= 0 or hour_start is None:
+                continue
+            processed += 1
+            item_totals[(item_id, hour_start)] += quantity
+            for category, label in _sale_labels(tea, milk, addons_by_record.get(record_id, ())):
+                label_totals[(category, label, hour_start)] += quantity
+
+    session.execute(delete(SalesItemHourly))
+    session.execute(delete(SalesLabelHourly))
+    if item_totals:
+        session.execute(
+            insert(SalesItemHourly),
+            [
+                {"item_id": item_id, "hour_start": hour_start, "quantity": total}
+                for (item_id, hour_start), total in item_totals.items()
+            ],
+        )
+    if label_totals:
+        session.execute(
+            insert(SalesLabelHourly),
+            [
+                {"category": category, "label": label, "hour_start": hour_start, "quantity": total}
+                for (category, label, hour_start), total in label_totals.items()
+            ],
+        )
+    return processed
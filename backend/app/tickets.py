@@ -0,0 +1,128 @@
+"""Tickets: one row per cart, summarizing its drinks.
+
+``create_order`` writes a ``tickets`` row next to the cart's ``order_items``
+and every drink carries its ``ticket_id`` (kept on ``order_records`` after
+archival). Status, open drink count and ``completed_at`` are recomputed by
+``refresh_tickets`` in the same transaction as any drink change, so a queue
+screen can poll tickets alone:
+
+* ``received``: no drink has been started or completed yet
+* ``preparing``: some drinks are in progress or done, others are not
+* ``complete``: every drink is complete
+
+Live drinks from before tickets existed are grouped by cart (member and
+creation time) by ``backfill_tickets``, run once as a migration step.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, select, update
+
+from .models import OrderItem, Ticket
+
+
+def create_ticket(
+    session,
+    *,
+    member_id: int | None,
+    staff_id: int | None,
+    created_at: datetime,
+    item_count: int,
+    total_price: Decimal,
+) -> Ticket:
+    """Insert the ticket for a new cart."""
+    return session.scalar(
+        insert(Ticket)
+        .values(
+            member_id=member_id,
+            staff_id=staff_id,
+            status="received",
+            item_count=item_count,
+            open_count=item_count,
+            total_price=total_price,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        .returning(Ticket)
+    )
+
+
+def refresh_tickets(session, ticket_ids, now: datetime) -> None:
+    """Recompute status and open counts of ``ticket_ids`` with one UPDATE.
+
+    Completed drinks count as done whether or not the archiver has moved them yet.
+    """
+    ids = sorted({ticket_id for ticket_id in ticket_ids if ticket_id})
+    if not ids:
+        return
+    open_count = (
+        select(func.count(OrderItem.id))
+        .where(OrderItem.ticket_id == Ticket.id, OrderItem.status != "complete")
+        .scalar_subquery()
+    )
+    started = exists().where(OrderItem.ticket_id == Ticket.id, OrderItem.status != "received")
+    stamp = literal(now, Ticket.updated_at.type)
+    session.execute(
+        update(Ticket)
+        .where(Ticket.id.in_(ids))
+        .values(
+            open_count=open_count,
+            status=case(
+                (open_count == 0, "complete"),
+                (and_(open_count == Ticket.item_count, ~started), "received"),
+                else_="preparing",
+            ),
+            updated_at=stamp,
+            completed_at=case((open_count == 0, func.coalesce(Ticket.completed_at, stamp)), else_=None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def remove_ticket_item(session, ticket_id: int | None, total_price: Decimal, now: datetime) -> None:
+    """Take a deleted (not archived) drink off its ticket; empty tickets go away."""
+    if not ticket_id:
+        return
+    session.execute(
+        update(Ticket)
+        .where(Ticket.id == ticket_id)
+        .values(item_count=Ticket.item_count - 1, total_price=Ticket.total_price - total_price)
+        .execution_options(synchronize_session=False)
+    )
+    refresh_tickets(session, [ticket_id], now)
+    session.execute(
+        delete(Ticket).where(Ticket.id == ticket_id, Ticket.item_count <= 0).execution_options(synchronize_session=False)
+    )
+
+
+def backfill_tickets(session, now: datetime) -> int:
+    """Group live drinks without a ticket by cart; returns tickets created."""
+    rows = session.execute(
+        select(OrderItem.id, OrderItem.member_id, OrderItem.created_at, OrderItem.total_price)
+        .where(OrderItem.ticket_id.is_(None))
+        .order_by(OrderItem.id)
+    ).all()
+    # Grouped here rather than matched back on created_at: legacy timestamps
+    # written by CURRENT_TIMESTAMP do not compare equal to re-bound datetimes.
+    carts: dict[tuple, list] = {}
+    for row in rows:
+        carts.setdefault((row.member_id, row.created_at), []).append(row)
+    ticket_ids = []
+    for (member_id, created_at), drinks in carts.items():
+        ticket_id = create_ticket(
+            session,
+            member_id=member_id,
+            staff_id=None,
+            created_at=created_at,
+            item_count=len(drinks),
+            total_price=sum((drink.total_price or Decimal("0.00") for drink in drinks), Decimal("0.00")),
+        ).id
+        session.execute(
+            update(OrderItem)
+            .where(OrderItem.id.in_([drink.id for drink in drinks]))
+            .values(ticket_id=ticket_id)
+            .execution_options(synchronize_session=False)
+        )
+        ticket_ids.append(ticket_id)
+    refresh_tickets(session, ticket_ids, now)
+    return len(ticket_ids)
@@ -0,0 +1,36 @@
+"""Database-backed change counters shared by every worker process."""
+from sqlalchemy import insert, select, update
+
+from .models import CacheVersion
+
+MENU_VERSION = "menu"
+STOCK_VERSION = "stock"
+ORDERS_VERSION = "orders"
+
+KNOWN_VERSIONS = (MENU_VERSION, STOCK_VERSION, ORDERS_VERSION)
+
+
+def read_version(session, name: str) -> int:
+    """Return the current counter value for ``name`` (zero when unset)."""
+    value = session.scalar(select(CacheVersion.version).where(CacheVersion.name == name))
+    return int(value or 0)
+
+
+def bump_version(session, name: str) -> None:
+    """Increment ``name`` inside the caller's transaction."""
+    result = session.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(CacheVersion).values(name=name, version=1))
+
+
+def ensure_versions(session) -> None:
+    """Create the counter rows so later bumps are a plain UPDATE."""
+    existing = set(session.scalars(select(CacheVersion.name)))
+    for name in KNOWN_VERSIONS:
+        if name not in existing:
+            session.add(CacheVersion(name=name, version=0))
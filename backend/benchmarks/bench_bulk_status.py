@@ -0,0 +1,87 @@
+"""Completing a whole ticket: one PATCH per drink versus one bulk PATCH.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_bulk_status --tickets 20 --drinks 6
+
+Each round places ``--tickets`` tickets of ``--drinks`` drinks against a
+throwaway database, then completes them either with ``PATCH /api/orders/<id>``
+per drink or with a single ``PATCH /api/orders`` per ticket, and prints the
+SQL statements and wall time per ticket.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+_TEMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEMP_DIR.name) / 'bench.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from sqlalchemy import select, update  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.catalog import mark_stock_changed  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.instrumentation import count_queries  # noqa: E402
+from app.models import MenuItem  # noqa: E402
+
+
+def _headers(client, **credentials) -> dict:
+    response = client.post("/api/auth/login", json={**credentials, "password": "admin"})
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def _place(client, headers, ids: dict, drinks: int) -> list[int]:
+    line = {
+        "menu_item_id": ids["Oolong Tea"],
+        "quantity": 1,
+        "price": 5.00,
+        "inventory_item_ids": [ids["Oat Milk"], ids["Pudding"]],
+        "options": {"tea": "Oolong", "milk": "Oat Milk", "addons": ["Pudding"]},
+    }
+    response = client.post("/api/orders", json={"items": [line] * drinks}, headers=headers)
+    return [item["id"] for item in response.get_json()["order_items"]]
+
+
+def run_round(app, bulk: bool, tickets: int, drinks: int) -> tuple[float, float]:
+    client = app.test_client()
+    member = _headers(client, email="member1@example.com")
+    staff = _headers(client, username="staff1")
+    with SessionLocal() as session:
+        ids = {item.name: item.id for item in session.scalars(select(MenuItem))}
+    placed = [_place(client, member, ids, drinks) for _ in range(tickets)]
+
+    started = time.perf_counter()
+    with count_queries() as stats:
+        for order_ids in placed:
+            if bulk:
+                client.patch("/api/orders", json={"ids": order_ids, "status": "complete"}, headers=staff)
+            else:
+                for order_id in order_ids:
+                    client.patch(f"/api/orders/{order_id}", json={"status": "complete"}, headers=staff)
+    elapsed = time.perf_counter() - started
+    return stats.statements / tickets, elapsed * 1000 / tickets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=20)
+    parser.add_argument("--drinks", type=int, default=6)
+    args = parser.parse_args()
+
+    app = create_app()
+    with SessionLocal() as session:
+        session.execute(update(MenuItem).values(quantity=1_000_000))
+        mark_stock_changed(session)
+        session.commit()
+    print(f"tickets={args.tickets} drinks={args.drinks}")
+    for label, bulk in (("per-drink", False), ("bulk", True)):
+        statements, ms = run_round(app, bulk, args.tickets, args.drinks)
+        print(f"{label}: {statements:.1f} statements/ticket, {ms:.2f} ms/ticket")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
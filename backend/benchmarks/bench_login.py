@@ -0,0 +1,65 @@
+"""Login throughput at several password-hashing pool sizes.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_login --logins 40 --threads 8 --pools 0,1,2,4
+
+Each round swaps in a fresh ``PasswordHasher`` with the given number of
+worker processes (0 hashes inline) and drives ``POST /api/auth/login``
+from ``--threads`` concurrent clients against a throwaway database.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_TEMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEMP_DIR.name) / 'bench.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from app import auth, create_app  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.hashing import PasswordHasher  # noqa: E402
+
+
+def run_round(app, workers: int, threads: int, logins: int) -> tuple[float, dict[int, int]]:
+    hasher = PasswordHasher(workers=workers, queue_limit=threads * 2)
+    auth.hasher = hasher
+    statuses: dict[int, int] = {}
+
+    def _login(_):
+        client = app.test_client()
+        return client.post("/api/auth/login", json={"username": "admin", "password": "admin"}).status_code
+
+    try:
+        # Warm the pool so process start-up is not counted.
+        _login(None)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for status in executor.map(_login, range(logins)):
+                statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - started
+    finally:
+        hasher.shutdown()
+    return logins / elapsed, statuses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pools", default="0,1,2,4", help="comma separated worker counts")
+    args = parser.parse_args()
+
+    app = create_app()
+    print(f"cpus={os.cpu_count()} logins={args.logins} threads={args.threads}")
+    for workers in (int(value) for value in args.pools.split(",")):
+        rate, statuses = run_round(app, workers, args.threads, args.logins)
+        print(f"pool={workers}: {rate:.1f} logins/s statuses={statuses}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Per-row cost of serializing an order history page, before and after.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_serializer --rows 200 --repeat 50
+
+A throwaway SQLite database is seeded with archived orders. "before" is the
+old path: load ``(OrderRecord, MenuItem, Member)`` entities and re-parse the
+customizations JSON per row. "after" is what ``list_orders`` does now: select
+plain columns and build each payload in one pass with memoized options. Both
+must produce identical payloads.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+_TEMP_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEMP_DIR.name) / 'bench.db'}"
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.bootstrap import bootstrap_database  # noqa: E402
+from app.customizations import deserialize_customizations, normalize_customizations  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Member, MenuItem, OrderRecord  # noqa: E402
+from app.order_options import backfill_order_options, load_record_addons  # noqa: E402
+from app.orders import _order_payload, _order_row_columns, to_local_iso  # noqa: E402
+
+TEAS = ["Green Tea", "Black Tea", "Oolong Tea"]
+MILKS = ["None", "Oat Milk", "Fresh Milk", "Evaporated Milk"]
+ADDONS = ["Tapioca Pearls", "Taro Balls", "Pudding"]
+SUGARS = ["0%", "50%", "100%"]
+ICES = ["No Ice", "Less", "Normal"]
+
+
+def _legacy_options(raw) -> dict:
+    customizations = deserialize_customizations(raw)
+    milk_label = customizations.get("milk")
+    if milk_label is None or (isinstance(milk_label, str) and milk_label.strip() == ""):
+        milk_label = "None"
+    elif isinstance(milk_label, str):
+        milk_label = milk_label.strip()
+    else:
+        milk_label = str(milk_label)
+
+    addon_labels = customizations.get("addons")
+    if not isinstance(addon_labels, list):
+        addon_labels = []
+    else:
+        addon_labels = [label for label in (str(item).strip() for item in addon_labels) if label]
+
+    tea_label = customizations.get("tea")
+    if tea_label is not None and not isinstance(tea_label, str):
+        tea_label = str(tea_label)
+
+    sugar_label = customizations.get("sugar")
+    if sugar_label is not None and not isinstance(sugar_label, str):
+        sugar_label = str(sugar_label)
+    if isinstance(sugar_label, str):
+        sugar_label = sugar_label.strip() or None
+
+    ice_label = customizations.get("ice")
+    if ice_label is not None and not isinstance(ice_label, str):
+        ice_label = str(ice_label)
+    if isinstance(ice_label, str):
+        ice_label = ice_label.strip() or None
+
+    return {
+        "tea": tea_label,
+        "milk": milk_label or "None",
+        "sugar": sugar_label,
+        "ice": ice_label,
+        "addons": addon_labels,
+    }
+
+
+def _legacy_serialize(row, menu_item, member) -> dict:
+    archived = isinstance(row, OrderRecord)
+    payload = {
+        "id": row.order_item_id if archived else row.id,
+        "menu_item_id": row.item_id,
+        "name": (menu_item.name if menu_item else None),
+        "quantity": row.qty,
+        "status": (row.status or "complete") if archived else row.status,
+        "total_price": float(row.total_price or 0),
+        "created_at": to_local_iso(row.created_at),
+        "member_id": row.member_id,
+        "member_name": member.full_name if member else None,
+        "options": _legacy_options(row.customizations),
+    }
+    if archived:
+        payload["completed_at"] = to_local_iso(row.completed_at) if row.completed_at else None
+    return payload
+
+
+def seed_records(count: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, 9, 0)
+    with SessionLocal() as session:
+        item_ids = session.scalars(select(MenuItem.id).where(MenuItem.category == "tea")).all()
+        member_ids = session.scalars(select(Member.id)).all()
+        rows = []
+        for index in range(count):
+            options = normalize_customizations(
+                {
+                    "tea": rng.choice(TEAS),
+                    "milk": rng.choice(MILKS),
+                    "sugar": rng.choice(SUGARS),
+                    "ice": rng.choice(ICES),
+                    "addons": rng.sample(ADDONS, rng.randint(0, 2)),
+                }
+            )
+            rows.append(
+                {
+                    "order_item_id": index + 1,
+                    "member_id": rng.choice(member_ids + [None]),
+                    "item_id": rng.choice(item_ids),
+                    "qty": 1 + index % 2,
+                    "status": "complete",
+                    "total_price": Decimal("3.50"),
+                    "customizations": json.dumps(options),
+                    "created_at": base + timedelta(minutes=index),
+                    "completed_at": base + timedelta(minutes=index + 5),
+                }
+            )
+        session.execute(insert(OrderRecord), rows)
+        session.commit()
+        backfill_order_options(session)
+
+
+def _page_stmt(*entities, limit: int):
+    return (
+        select(*entities)
+        .join(MenuItem, MenuItem.id == OrderRecord.item_id)
+        .join(Member, Member.id == OrderRecord.member_id, isouter=True)
+        .order_by(OrderRecord.completed_at.desc(), OrderRecord.id.desc())
+        .limit(limit)
+    )
+
+
+def serialize_before(limit: int) -> list[dict]:
+    with SessionLocal() as session:
+        rows = session.execute(_page_stmt(OrderRecord, MenuItem, Member, limit=limit)).all()
+        return [_legacy_serialize(record, menu_item, member) for record, menu_item, member in rows]
+
+
+def serialize_after(limit: int) -> list[dict]:
+    with SessionLocal() as session:
+        rows = session.execute(_page_stmt(*_order_row_columns(OrderRecord), limit=limit)).all()
+        addons = load_record_addons(session, [row.id for row in rows])
+        return [_order_payload(row, True, row.menu_name, row.member_name, addons.get(row.id, ())) for row in rows]
+
+
+def _time_per_row(fn, rows: int, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(rows)
+    return (time.perf_counter() - started) / (repeat * rows) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    bootstrap_database()
+    seed_records(args.rows)
+    if serialize_before(args.rows) != serialize_after(args.rows):
+        raise SystemExit("serialized payloads differ")
+
+    before = _time_per_row(serialize_before, args.rows, args.repeat)
+    after = _time_per_row(serialize_after, args.rows, args.repeat)
+    engine.dispose()
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"before: {before:.2f} us/row")
+    print(f"after:  {after:.2f} us/row ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
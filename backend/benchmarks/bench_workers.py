@@ -0,0 +1,199 @@
+"""Throughput of ``GET /api/items`` and ``GET /api/orders`` per gunicorn worker count.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_workers --workers 1,2,4 --clients 4 --threads 8 --seconds 10
+
+A throwaway SQLite database is bootstrapped and seeded with order history,
+then for each worker count a real gunicorn server is started with
+``gunicorn.conf.py`` (preloaded, ``WEB_CONCURRENCY`` workers) and driven by
+``--clients`` processes of ``--threads`` keep-alive HTTP clients each. The
+report is requests/sec per endpoint; on a multi-core box it should grow with
+the worker count until the cores or the clients run out.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+ENDPOINTS = ("/api/items", "/api/orders")
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _seed(db_path: str, history_rows: int, live_orders: int) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from sqlalchemy import insert, select
+
+    from app.bootstrap import bootstrap_database
+    from app.db import SessionLocal, engine
+    from app.models import MenuItem, OrderItem, OrderRecord
+
+    bootstrap_database()
+    base = datetime(2025, 1, 1, 9, 0)
+    with SessionLocal() as session:
+        item_ids = session.scalars(select(MenuItem.id).where(MenuItem.category == "tea")).all()
+        session.execute(
+            insert(OrderRecord),
+            [
+                {
+                    "order_item_id": index + 1,
+                    "item_id": item_ids[index % len(item_ids)],
+                    "qty": 1,
+                    "status": "complete",
+                    "total_price": Decimal("3.50"),
+                    "tea": "Green Tea",
+                    "created_at": base + timedelta(seconds=index),
+                    "completed_at": base + timedelta(seconds=index + 60),
+                }
+                for index in range(history_rows)
+            ],
+        )
+        session.execute(
+            insert(OrderItem),
+            [
+                {
+                    "item_id": item_ids[index % len(item_ids)],
+                    "qty": 1,
+                    "status": "received",
+                    "total_price": Decimal("3.50"),
+                    "tea": "Green Tea",
+                }
+                for index in range(live_orders)
+            ],
+        )
+        session.commit()
+    engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port: int, proc: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/api/health")
+            if connection.getresponse().status == 200:
+                connection.close()
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start")
+
+
+def _client(port: int, threads: int, seconds: float, results) -> None:
+    counts = {path: 0 for path in ENDPOINTS}
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def _loop(offset: int):
+        nonlocal errors
+        # Each connection sticks to one endpoint so their rates are independent.
+        path = ENDPOINTS[offset % len(ENDPOINTS)]
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.monotonic() < deadline:
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                ok = False
+            with lock:
+                if ok:
+                    counts[path] += 1
+                else:
+                    errors += 1
+        connection.close()
+
+    pool = [threading.Thread(target=_loop, args=(offset,)) for offset in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((counts, errors))
+
+
+def run_round(db_path: str, workers: int, worker_threads: int, clients: int, threads: int, seconds: float) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_THREADS": str(worker_threads),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until_up(port, server)
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        procs = [context.Process(target=_client, args=(port, threads, seconds, results)) for _ in range(clients)]
+        for proc in procs:
+            proc.start()
+        totals = {path: 0 for path in ENDPOINTS}
+        errors = 0
+        for _ in procs:
+            counts, failed = results.get()
+            errors += failed
+            for path, value in counts.items():
+                totals[path] += value
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"rates": {path: count / seconds for path, count in totals.items()}, "errors": errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated gunicorn worker counts")
+    parser.add_argument("--worker-threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--history-rows", type=int, default=5_000)
+    parser.add_argument("--live-orders", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "workers.db")
+        setup = multiprocessing.get_context("spawn").Process(
+            target=_seed, args=(db_path, args.history_rows, args.live_orders)
+        )
+        setup.start()
+        setup.join()
+        print(f"cpus={os.cpu_count()} clients={args.clients}x{args.threads} seconds={args.seconds}")
+        for workers in (int(value) for value in args.workers.split(",")):
+            result = run_round(db_path, workers, args.worker_threads, args.clients, args.threads, args.seconds)
+            rates = " ".join(f"{path}={rate:.0f}/s" for path, rate in result["rates"].items())
+            print(f"workers={workers}: {rates} errors={result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
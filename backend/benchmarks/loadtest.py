@@ -0,0 +1,320 @@
+"""Replay a realistic shop traffic mix and report per-endpoint latency as JSON.
+
+Run from ``backend/``::
+
+    python -m benchmarks.loadtest --seconds 30 --clients 4 --threads 16 --workers 2 --output before.json
+
+A throwaway SQLite database is bootstrapped (stock raised so orders never run
+short, optional order history added) and served by gunicorn with
+``gunicorn.conf.py`` on a loopback port. ``--clients`` processes of
+``--threads`` simulated clients each then loop over weighted actions until
+``--seconds`` elapse:
+
+* ``login``: a member signs in
+* ``menu``: ``GET /api/items``
+* ``order``: ``POST /api/orders`` with 1-4 drinks and add-ons
+* ``transition``: staff fetch the live queue and move one order along
+  ``received -> preparing -> complete``
+* ``analytics``: ``GET /api/analytics/summary``
+* ``schedule``: ``GET /api/schedule``
+
+Weights are set with ``--mix menu=30,order=20,...``. The JSON report has
+p50/p95/p99 latency, throughput and status counts per endpoint, so two runs
+(e.g. before and after a change) can be diffed directly. Set ``--seed`` for
+a repeatable action sequence.
+"""
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.bench_workers import BACKEND_DIR, _free_port, _wait_until_up
+
+DEFAULT_MIX = {"login": 2, "menu": 30, "order": 20, "transition": 20, "analytics": 5, "schedule": 8}
+MEMBER_EMAILS = ("member1@example.com", "member2@example.com", "member3@example.com")
+NEXT_STATUS = {"received": "preparing", "preparing": "complete"}
+
+
+def _seed(db_path: str, history_rows: int) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from sqlalchemy import update
+
+    from app.bootstrap import bootstrap_database
+    from app.catalog import mark_stock_changed
+    from app.db import SessionLocal, engine
+    from app.models import MenuItem
+
+    bootstrap_database()
+    with SessionLocal() as session:
+        session.execute(update(MenuItem).values(quantity=10_000_000))
+        mark_stock_changed(session)
+        session.commit()
+    engine.dispose()
+    if history_rows:
+        from benchmarks.bench_workers import _seed as seed_history
+
+        seed_history(db_path, history_rows, 0)
+
+
+def _parse_mix(text: str) -> dict[str, int]:
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (segment.strip() for segment in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"unknown action {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Client:
+    """One simulated tablet or barista on a keep-alive connection."""
+
+    def __init__(self, port: int, context: dict, rng: random.Random, record):
+        self.port = port
+        self.context = context
+        self.rng = rng
+        self.record = record
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def request(self, label: str, method: str, path: str, body=None, token: str | None = None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            data, status = b"", 0
+        self.record(label, status, time.perf_counter() - started)
+        return status, data
+
+    def login(self):
+        email = self.rng.choice(MEMBER_EMAILS)
+        self.request("POST /api/auth/login", "POST", "/api/auth/login", {"email": email, "password": "admin"})
+
+    def menu(self):
+        self.request("GET /api/items", "GET", "/api/items")
+
+    def order(self):
+        items = self.context["items"]
+        lines = []
+        for _ in range(self.rng.randint(1, 4)):
+            tea = self.rng.choice(items["tea"])
+            milk = self.rng.choice(items["milk"])
+            addon = self.rng.choice(items["addon"])
+            lines.append(
+                {
+                    "menu_item_id": tea["id"],
+                    "quantity": 1,
+                    "price": float(tea["price"]) + float(milk["price"]) + float(addon["price"]),
+                    "inventory_item_ids": [milk["id"], addon["id"]],
+                    "options": {"tea": tea["name"], "milk": milk["name"], "addons": [addon["name"]]},
+                }
+            )
+        self.request("POST /api/orders", "POST", "/api/orders", {"items": lines}, self.context["member_token"])
+
+    def transition(self):
+        token = self.context["staff_token"]
+        status, data = self.request("GET /api/orders (staff)", "GET", "/api/orders", token=token)
+        if status != 200:
+            return
+        live = [row for row in json.loads(data).get("order_items", []) if row.get("status") in NEXT_STATUS]
+        if not live:
+            return
+        target = self.rng.choice(live[:10])
+        self.request(
+            "PATCH /api/orders/<id>",
+            "PATCH",
+            f"/api/orders/{target['id']}",
+            {"status": NEXT_STATUS[target["status"]]},
+            token,
+        )
+
+    def analytics(self):
+        self.request("GET /api/analytics/summary", "GET", "/api/analytics/summary", token=self.context["staff_token"])
+
+    def schedule(self):
+        self.request("GET /api/schedule", "GET", "/api/schedule", token=self.context["staff_token"])
+
+
+def _client_process(index: int, port: int, context: dict, mix: dict, threads: int, seconds: float, seed, results) -> None:
+    samples: dict[str, list[float]] = {}
+    statuses: dict[str, dict[int, int]] = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    actions, weights = zip(*mix.items())
+
+    def _record(label, status, elapsed):
+        with lock:
+            samples.setdefault(label, []).append(elapsed)
+            by_status = statuses.setdefault(label, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def _run(thread_index: int):
+        rng = random.Random(None if seed is None else f"{seed}-{index}-{thread_index}")
+        client = Client(port, context, rng, _record)
+        while time.monotonic() < deadline:
+            getattr(client, rng.choices(actions, weights)[0])()
+        client.connection.close()
+
+    pool = [threading.Thread(target=_run, args=(thread_index,)) for thread_index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((samples, statuses))
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    # Nearest-rank percentile.
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _summarize(samples: dict[str, list[float]], statuses: dict[str, dict[int, int]], seconds: float) -> dict:
+    endpoints = {}
+    for label in sorted(samples):
+        ordered = sorted(samples[label])
+        errors = sum(count for status, count in statuses[label].items() if status == 0 or status >= 500)
+        endpoints[label] = {
+            "requests": len(ordered),
+            "errors": errors,
+            "throughput_rps": round(len(ordered) / seconds, 2),
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+            "statuses": {str(status): count for status, count in sorted(statuses[label].items())},
+        }
+    total = sum(entry["requests"] for entry in endpoints.values())
+    return {
+        "total": {
+            "requests": total,
+            "errors": sum(entry["errors"] for entry in endpoints.values()),
+            "throughput_rps": round(total / seconds, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def _prepare_context(port: int) -> dict:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def _call(method, path, body=None):
+        connection.request(method, path, body=json.dumps(body) if body else None, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return json.loads(response.read())
+
+    menu = _call("GET", "/api/items")
+    items = {category: [row for row in menu if row["category"] == category] for category in ("tea", "milk", "addon")}
+    staff_token = _call("POST", "/api/auth/login", {"username": "staff1", "password": "admin"})["access_token"]
+    member_token = _call("POST", "/api/auth/login", {"email": MEMBER_EMAILS[0], "password": "admin"})["access_token"]
+    connection.close()
+    return {"items": items, "staff_token": staff_token, "member_token": member_token}
+
+
+def run(args) -> dict:
+    mix = _parse_mix(args.mix)
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "loadtest.db")
+        setup = spawn.Process(target=_seed, args=(db_path, args.history_rows))
+        setup.start()
+        setup.join()
+
+        port = _free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "WEB_CONCURRENCY": str(args.workers),
+            "GUNICORN_THREADS": str(args.worker_threads),
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_up(port, server)
+            context = _prepare_context(port)
+            results = spawn.Queue()
+            procs = [
+                spawn.Process(
+                    target=_client_process,
+                    args=(index, port, context, mix, args.threads, args.seconds, args.seed, results),
+                )
+                for index in range(args.clients)
+            ]
+            for proc in procs:
+                proc.start()
+            samples: dict[str, list[float]] = {}
+            statuses: dict[str, dict[int, int]] = {}
+            for _ in procs:
+                part_samples, part_statuses = results.get()
+                for label, values in part_samples.items():
+                    samples.setdefault(label, []).extend(values)
+                for label, counts in part_statuses.items():
+                    merged = statuses.setdefault(label, {})
+                    for status, count in counts.items():
+                        merged[status] = merged.get(status, 0) + count
+            for proc in procs:
+                proc.join()
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = _summarize(samples, statuses, args.seconds)
+    report["config"] = {
+        "seconds": args.seconds,
+        "clients": args.clients,
+        "threads": args.threads,
+        "workers": args.workers,
+        "worker_threads": args.worker_threads,
+        "history_rows": args.history_rows,
+        "mix": mix,
+        "cpus": os.cpu_count(),
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--clients", type=int, default=2, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="simulated clients per process")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--worker-threads", type=int, default=4)
+    parser.add_argument("--history-rows", type=int, default=0)
+    parser.add_argument("--mix", default="", help="weights, e.g. menu=30,order=20,transition=20")
+    parser.add_argument("--seed", default=None, help="seed the action sequence")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
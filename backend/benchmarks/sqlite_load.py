@@ -0,0 +1,156 @@
+"""Mixed read/write SQLite load test comparing connection profiles.
+
+Run from ``backend/``::
+
+    python -m benchmarks.sqlite_load --processes 3 --threads 4 --seconds 10
+
+For each profile a fresh database is bootstrapped, then several processes,
+as gunicorn workers would be, run writer and reader threads against it.
+Writers reserve stock and append order events in short transactions. Readers
+run analytics-style scans over the history tables. The report counts
+committed writes, finished reads and "database is locked" failures.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROFILES = ("legacy", "tuned")
+
+
+def _configure(db_path: str, profile: str) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["SQLITE_PROFILE"] = profile
+
+
+def _bootstrap(db_path: str, profile: str, history_rows: int) -> None:
+    _configure(db_path, profile)
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+
+    from sqlalchemy import insert, select
+
+    from app.bootstrap import bootstrap_database
+    from app.db import SessionLocal
+    from app.models import MenuItem, OrderRecord
+
+    bootstrap_database()
+    base = datetime(2025, 1, 1, 9, 0)
+    with SessionLocal() as session:
+        item_ids = session.scalars(select(MenuItem.id)).all()
+        session.execute(
+            insert(OrderRecord),
+            [
+                {
+                    "order_item_id": index + 1,
+                    "item_id": item_ids[index % len(item_ids)],
+                    "qty": 1,
+                    "status": "complete",
+                    "total_price": Decimal("3.50"),
+                    "created_at": base + timedelta(seconds=index),
+                    "completed_at": base + timedelta(seconds=index + 60),
+                }
+                for index in range(history_rows)
+            ],
+        )
+        session.commit()
+
+
+def _worker(db_path: str, profile: str, threads: int, seconds: float, results) -> None:
+    _configure(db_path, profile)
+    from sqlalchemy import func, select, update
+    from sqlalchemy.exc import OperationalError
+
+    from app.db import SessionLocal, engine
+    from app.events import record_order_event
+    from app.models import MenuItem, OrderRecord
+
+    counts = {"writes": 0, "reads": 0, "locked": 0, "other_errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def _bump(key):
+        with lock:
+            counts[key] += 1
+
+    def _write(rng):
+        with SessionLocal() as session:
+            item_id = rng.randint(1, 9)
+            session.execute(update(MenuItem).where(MenuItem.id == item_id).values(quantity=MenuItem.quantity + 1))
+            record_order_event(session, "status_changed", rng.randint(1, 10_000), {"id": item_id})
+            session.commit()
+
+    def _read(rng):
+        with SessionLocal() as session:
+            session.execute(
+                select(OrderRecord.item_id, func.sum(OrderRecord.qty), func.max(OrderRecord.completed_at))
+                .group_by(OrderRecord.item_id)
+            ).all()
+            session.execute(select(MenuItem.id, MenuItem.quantity)).all()
+
+    def _loop(is_writer: bool):
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            try:
+                (_write if is_writer else _read)(rng)
+                _bump("writes" if is_writer else "reads")
+            except OperationalError as exc:
+                _bump("locked" if "locked" in str(exc) else "other_errors")
+
+    workers = [threading.Thread(target=_loop, args=(index % 2 == 0,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    engine.dispose()
+    results.put(counts)
+
+
+def run_profile(profile: str, processes: int, threads: int, seconds: float, history_rows: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "load.db")
+        setup = context.Process(target=_bootstrap, args=(db_path, profile, history_rows))
+        setup.start()
+        setup.join()
+        results = context.Queue()
+        procs = [
+            context.Process(target=_worker, args=(db_path, profile, threads, seconds, results))
+            for _ in range(processes)
+        ]
+        for proc in procs:
+            proc.start()
+        totals = {"writes": 0, "reads": 0, "locked": 0, "other_errors": 0}
+        for _ in procs:
+            for key, value in results.get().items():
+                totals[key] += value
+        for proc in procs:
+            proc.join()
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--history-rows", type=int, default=50_000)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    args = parser.parse_args()
+
+    for profile in args.profiles.split(","):
+        totals = run_profile(profile, args.processes, args.threads, args.seconds, args.history_rows)
+        attempts = totals["writes"] + totals["reads"] + totals["locked"] + totals["other_errors"]
+        rate = totals["locked"] / attempts if attempts else 0.0
+        print(
+            f"{profile:>7}: writes={totals['writes']} reads={totals['reads']} "
+            f"locked={totals['locked']} ({rate:.2%}) other_errors={totals['other_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
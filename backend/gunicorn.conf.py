@@ -0,0 +1,65 @@
+"""Gunicorn settings: ``gunicorn -c gunicorn.conf.py 'app:create_app()'``.
+
+The app is preloaded, so ``create_app()`` runs once in the master before any
+worker forks. Migrations and seeding are left to ``python -m app.bootstrap``,
+which the Dockerfile runs first; ``create_app()`` runs them only when the
+schema is behind. The master's pooled connections are closed before forking
+and each worker drops the inherited pool handles, so no SQLite connection is
+ever shared across processes. Worker count and threads come from the environment. Workers
+share ``/api/metrics`` totals through per-process files in ``METRICS_DIR``.
+Each worker also starts the order archiver thread unless
+``ARCHIVER_ENABLED=0``; a file lock keeps one of them active at a time.
+``create_app()`` leaves the thread to these hooks when it sees gunicorn's
+``SERVER_SOFTWARE``, and starts it itself under any other server.
+Order streams hold a thread each, so a worker serves at most
+``ORDER_STREAM_MAX_PER_WORKER`` of them (half its threads by default, none
+on sync workers) and answers 503 beyond that.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# The order stream holds a connection open; keep-alive lets tablets reuse sockets.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+
+def _engines():
+    from app.db import engine, read_engine
+
+    return engine, read_engine
+
+
+def on_starting(server):
+    # Counters restart with the server; drop files left by the previous run.
+    from app.metrics import store
+
+    store.reset()
+
+
+def when_ready(server):
+    # Close connections the master opened while preloading the app.
+    for engine in _engines():
+        engine.dispose()
+
+
+def post_fork(server, worker):
+    # Forget (without closing) any pooled handles inherited from the master.
+    for engine in _engines():
+        engine.dispose(close=False)
+    # Threads do not survive fork, so each worker starts its own archiver.
+    if os.getenv("ARCHIVER_ENABLED", "1") != "0":
+        from app.archiver import archiver
+
+        archiver.start()
+
+
+def worker_exit(server, worker):
+    from app.archiver import archiver
+
+    archiver.stop()
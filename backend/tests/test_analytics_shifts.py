@@ -1,18 +1,32 @@
 import atexit
+from collections import Counter
 import os
 import tempfile
 from datetime import date, timedelta
 from pathlib import Path
 import unittest
 
-from sqlalchemy import select
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import OperationalError
 
 _TEST_DIR = tempfile.TemporaryDirectory()
 os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'analytics_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
 
 from backend.app import create_app  # noqa: E402
-from backend.app.db import SessionLocal, engine  # noqa: E402
-from backend.app.models import Base, ScheduleShift, Staff  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import ReadSessionLocal, SessionLocal, engine, read_engine  # noqa: E402
+from backend.app.customizations import extract_customization_labels  # noqa: E402
+from backend.app.models import (  # noqa: E402
+    Base,
+    MenuItem,
+    OrderRecord,
+    SalesItemHourly,
+    SalesLabelHourly,
+    ScheduleShift,
+    Staff,
+)
+from backend.app.rollups import rebuild_sales_rollups  # noqa: E402
 
 
 def _cleanup_tmpdir():
@@ -102,5 +116,95 @@ class AnalyticsShiftTests(unittest.TestCase):
         self.assertIn('error', data)
 
 
+    def _rollup_rows(self, session):
+        items = session.execute(
+            select(SalesItemHourly.item_id, SalesItemHourly.hour_start, SalesItemHourly.quantity)
+            .order_by(SalesItemHourly.item_id, SalesItemHourly.hour_start)
+        ).all()
+        labels = session.execute(
+            select(SalesLabelHourly.category, SalesLabelHourly.label, SalesLabelHourly.hour_start, SalesLabelHourly.quantity)
+            .order_by(SalesLabelHourly.category, SalesLabelHourly.label, SalesLabelHourly.hour_start)
+        ).all()
+        return items, labels
+
+    def test_summary_from_rollups_matches_history(self):
+        headers = self._staff_auth_headers()
+        with SessionLocal() as session:
+            ids = dict(session.execute(select(MenuItem.name, MenuItem.id)).all())
+
+        lines = [
+            {'menu_item_id': ids['Green Tea'], 'quantity': 2, 'options': {'tea': 'Green Tea', 'milk': 'Oat Milk', 'addons': ['Pudding']}},
+            {'menu_item_id': ids['Black Tea'], 'quantity': 1, 'options': {'tea': 'Black Tea', 'milk': 'Fresh Milk', 'addons': ['Pudding', 'Taro Balls']}},
+            {'menu_item_id': ids['Green Tea'], 'quantity': 3, 'options': {'tea': 'Green Tea', 'milk': 'Oat Milk'}},
+            {'menu_item_id': ids['Oolong Tea'], 'quantity': 1},
+        ]
+        response = self.client.post('/api/orders', json={'items': lines})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        for item in response.get_json()['order_items'][:3]:
+            completed = self.client.patch(f"/api/orders/{item['id']}", json={'status': 'complete'}, headers=headers)
+            self.assertEqual(completed.status_code, 200, completed.get_data(as_text=True))
+        archive_pending()
+
+        summary = self.client.get('/api/analytics/summary', headers=headers)
+        self.assertEqual(summary.status_code, 200, summary.get_data(as_text=True))
+        payload = summary.get_json()
+
+        with SessionLocal() as session:
+            expected_items = dict(
+                session.execute(
+                    select(OrderRecord.item_id, func.sum(OrderRecord.qty)).group_by(OrderRecord.item_id)
+                ).all()
+            )
+            counters = {'tea': Counter(), 'milk': Counter(), 'addon': Counter()}
+            for qty, customizations in session.execute(select(OrderRecord.qty, OrderRecord.customizations)):
+                tea_label, milk_label, addon_labels = extract_customization_labels(customizations)
+                if tea_label:
+                    counters['tea'][tea_label] += qty
+                if milk_label:
+                    counters['milk'][milk_label] += qty
+                for addon_label in addon_labels:
+                    counters['addon'][addon_label] += qty
+
+        menu_sold = {
+            entry['item_id']: entry['quantity_sold'] for entry in payload['items_sold'] if entry['item_id'] is not None
+        }
+        self.assertEqual(menu_sold, expected_items)
+        self.assertEqual(payload['summary']['total_items_sold'], 6)
+        self.assertEqual(payload['summary']['pending_order_items'], 1)
+        extra_sold = {
+            (entry['category'], entry['name']): entry['quantity_sold']
+            for entry in payload['items_sold']
+            if entry['item_id'] is None
+        }
+        expected_extra = {
+            (category, label): count
+            for category in ('milk', 'addon')
+            for label, count in counters[category].items()
+        }
+        self.assertEqual(extra_sold, expected_extra)
+        self.assertEqual(payload['popular']['tea']['label'], counters['tea'].most_common(1)[0][0])
+
+        with SessionLocal() as session:
+            incremental = self._rollup_rows(session)
+            self.assertEqual(rebuild_sales_rollups(session), 3)
+            session.commit()
+            self.assertEqual(self._rollup_rows(session), incremental)
+
+    def test_reports_use_read_only_pool_alongside_open_writer(self):
+        headers = self._staff_auth_headers()
+        self.assertIsNot(read_engine, engine)
+
+        with engine.connect() as writer:
+            writer.execute(update(MenuItem).values(quantity=MenuItem.quantity + 1))
+            # The writer holds the write lock until rollback; reports must not wait on it.
+            response = self.client.get('/api/analytics/summary', headers=headers)
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+            writer.rollback()
+
+        with ReadSessionLocal() as session:
+            with self.assertRaises(OperationalError):
+                session.execute(update(MenuItem).values(quantity=0))
+
+
 if __name__ == '__main__':
     unittest.main()
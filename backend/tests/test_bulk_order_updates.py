@@ -0,0 +1,153 @@
+import atexit
+import os
+import tempfile
+from pathlib import Path
+import unittest
+
+from sqlalchemy import func, select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'bulk_orders_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.instrumentation import count_queries, query_budget  # noqa: E402
+from backend.app.loyalty import find_loyalty_mismatches  # noqa: E402
+from backend.app.models import (  # noqa: E402
+    Base,
+    MenuItem,
+    OrderAddon,
+    OrderItem,
+    OrderRecord,
+    SalesItemHourly,
+    SalesLabelHourly,
+)
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class BulkOrderUpdateTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with SessionLocal() as session:
+            self.ids = {item.name: item.id for item in session.scalars(select(MenuItem))}
+
+    def _headers(self, **credentials):
+        credentials = credentials or {'username': 'staff1'}
+        response = self.client.post('/api/auth/login', json={**credentials, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _ticket(self, drinks, headers):
+        line = {
+            'menu_item_id': self.ids['Oolong Tea'],
+            'quantity': 1,
+            'price': 5.00,
+            'inventory_item_ids': [self.ids['Oat Milk'], self.ids['Pudding']],
+            'options': {'tea': 'Oolong', 'milk': 'Oat Milk', 'addons': ['Pudding']},
+        }
+        response = self.client.post('/api/orders', json={'items': [line] * drinks}, headers=headers)
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return [item['id'] for item in response.get_json()['order_items']]
+
+    def test_completing_a_ticket_is_one_request_and_one_archive_batch(self):
+        member = self._headers(email='member1@example.com')
+        staff = self._headers()
+        ids = self._ticket(6, member)
+
+        with query_budget(10):
+            response = self.client.patch('/api/orders', json={'ids': ids, 'status': 'complete'}, headers=staff)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        body = response.get_json()
+        self.assertEqual(body['updated'], 6)
+        self.assertEqual([result['id'] for result in body['results']], ids)
+        first = body['results'][0]['order']
+        self.assertEqual(first['status'], 'complete')
+        self.assertEqual(first['member_name'], 'Member One')
+        self.assertEqual(first['options']['addons'], ['Pudding'])
+        self.assertIsNotNone(first['completed_at'])
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderRecord.id))), 0)
+
+        self.assertEqual(archive_pending(), 6)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id))), 0)
+            records = session.scalars(select(OrderRecord).order_by(OrderRecord.order_item_id)).all()
+            self.assertEqual([record.order_item_id for record in records], ids)
+            self.assertTrue(all(record.completed_at for record in records))
+            addon_owners = session.execute(select(OrderAddon.order_item_id, OrderAddon.order_record_id)).all()
+            self.assertEqual(sorted(owner for _, owner in addon_owners), sorted(record.id for record in records))
+            self.assertTrue(all(order_id is None for order_id, _ in addon_owners))
+            self.assertEqual(find_loyalty_mismatches(session), [])
+            self.assertEqual(session.scalar(select(func.sum(SalesItemHourly.quantity))), 6)
+            labels = dict(session.execute(select(SalesLabelHourly.label, func.sum(SalesLabelHourly.quantity)).group_by(SalesLabelHourly.label)).all())
+            self.assertEqual(labels, {'Oolong': 6, 'Oat Milk': 6, 'Pudding': 6})
+
+    def test_bulk_statement_count_does_not_grow_with_ticket_size(self):
+        member = self._headers(email='member1@example.com')
+        staff = self._headers()
+        counts = []
+        # The first completion creates this hour's rollup and loyalty rows; later ones only update them.
+        for drinks in (1, 2, 6):
+            ids = self._ticket(drinks, member)
+            with count_queries() as stats:
+                response = self.client.patch('/api/orders', json={'ids': ids, 'status': 'complete'}, headers=staff)
+            self.assertEqual(response.status_code, 200)
+            counts.append(stats.statements)
+        self.assertEqual(counts[1], counts[2])
+
+    def test_mixed_targets_and_unknown_ids_report_per_id(self):
+        staff = self._headers()
+        ids = self._ticket(3, staff)
+        updates = [
+            {'id': ids[0], 'status': 'preparing'},
+            {'id': 999999, 'status': 'complete'},
+            {'id': ids[1], 'status': 'complete'},
+        ]
+        response = self.client.patch('/api/orders', json={'updates': updates}, headers=staff)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        results = response.get_json()['results']
+        self.assertEqual([result['ok'] for result in results], [True, False, True])
+        self.assertEqual(results[0]['order']['status'], 'preparing')
+        self.assertEqual(results[1]['status'], 404)
+
+        with SessionLocal() as session:
+            statuses = dict(session.execute(select(OrderItem.id, OrderItem.status)).all())
+        self.assertEqual(statuses, {ids[0]: 'preparing', ids[1]: 'complete', ids[2]: 'received'})
+
+    def test_invalid_batches_change_nothing(self):
+        staff = self._headers()
+        ids = self._ticket(2, staff)
+        bad_bodies = [
+            {'updates': [{'id': ids[0], 'status': 'complete'}, {'id': ids[1], 'status': 'done'}]},
+            {'updates': [{'id': ids[0], 'status': 'complete'}, {'id': ids[0], 'status': 'preparing'}]},
+            {'ids': [], 'status': 'complete'},
+            {'status': 'complete'},
+        ]
+        for body in bad_bodies:
+            response = self.client.patch('/api/orders', json=body, headers=staff)
+            self.assertEqual(response.status_code, 400, body)
+
+        member = self._headers(email='member1@example.com')
+        response = self.client.patch('/api/orders', json={'ids': ids, 'status': 'complete'}, headers=member)
+        self.assertEqual(response.status_code, 403)
+
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id)).where(OrderItem.status == 'received')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import atexit
+import os
+import shutil
+import stat
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+import unittest
+
+from sqlalchemy import func, select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'history_partitions_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app, history  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.history import HISTORY_ARCHIVE_DIR, compact_history  # noqa: E402
+from backend.app.instrumentation import count_queries  # noqa: E402
+from backend.app.loyalty import backfill_member_loyalty, find_loyalty_mismatches  # noqa: E402
+from backend.app.models import (  # noqa: E402
+    Base,
+    HistoryPartition,
+    Member,
+    MenuItem,
+    OrderAddon,
+    OrderRecord,
+    Ticket,
+)
+from backend.app.rollups import rebuild_sales_rollups  # noqa: E402
+
+# Compacting "as of" mid-May while keeping two hot months closes January to March.
+NOW = datetime(2025, 5, 15, 12, 0)
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class HistoryPartitionTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        shutil.rmtree(HISTORY_ARCHIVE_DIR, ignore_errors=True)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with SessionLocal() as session:
+            self.tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+            self.member_id = session.scalar(select(Member.id).where(Member.email == 'member1@example.com'))
+        self.next_order_id = 1000
+
+    def _headers(self, **credentials):
+        credentials = credentials or {'email': 'member1@example.com'}
+        response = self.client.post('/api/auth/login', json={**credentials, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _seed(self, *completed, ticket_id=None):
+        with SessionLocal() as session:
+            for completed_at in completed:
+                record = OrderRecord(
+                    order_item_id=self.next_order_id,
+                    ticket_id=ticket_id,
+                    member_id=self.member_id,
+                    item_id=self.tea_id,
+                    qty=1,
+                    status='complete',
+                    total_price=Decimal('3.50'),
+                    tea='Green Tea',
+                    created_at=completed_at - timedelta(minutes=5),
+                    completed_at=completed_at,
+                )
+                session.add(record)
+                session.flush()
+                session.add(OrderAddon(order_record_id=record.id, position=0, label='Pudding'))
+                self.next_order_id += 1
+            session.commit()
+
+    def _seed_months(self):
+        for month in (1, 2, 3, 4):
+            self._seed(*(datetime(2025, month, day, 9, 0) for day in (3, 3, 20)))
+        with SessionLocal() as session:
+            backfill_member_loyalty(session)
+            rebuild_sales_rollups(session)
+            session.commit()
+
+    def _walk(self, headers, query=''):
+        seen, cursor = [], None
+        while True:
+            url = f'/api/orders?limit=2{query}' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+            body = response.get_json()
+            seen.extend((item['id'], item['completed_at'], item['options']['addons']) for item in body['order_items'])
+            cursor = body['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_closed_months_move_to_read_only_files_and_history_is_unchanged(self):
+        self._seed_months()
+        headers = self._headers()
+        before = self._walk(headers)
+
+        self.assertEqual(compact_history(now=NOW, keep_months=2), {'2025-01': 3, '2025-02': 3, '2025-03': 3})
+
+        self.assertEqual(self._walk(headers), before)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderRecord.id))), 3)
+            self.assertEqual(session.scalar(select(func.count(OrderAddon.id))), 3)
+            partitions = session.scalars(select(HistoryPartition).order_by(HistoryPartition.month)).all()
+            self.assertEqual([partition.record_count for partition in partitions], [3, 3, 3])
+            for partition in partitions:
+                mode = os.stat(history.archive_path(partition.file_name)).st_mode
+                self.assertFalse(mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+            self.assertEqual(find_loyalty_mismatches(session), [])
+            self.assertEqual(rebuild_sales_rollups(session), 12)
+        self.assertEqual(compact_history(now=NOW, keep_months=2), {})
+
+    def test_date_ranges_only_open_the_months_they_need(self):
+        self._seed_months()
+        compact_history(now=NOW, keep_months=2)
+        headers = self._headers()
+
+        with count_queries(keep_sql=True) as stats:
+            february = self._walk(headers, '&since=2025-02-01&until=2025-02-28')
+        self.assertEqual(len(february), 3)
+        self.assertTrue(all(completed_at.startswith('2025-02') for _, completed_at, _ in february))
+        attached = [sql for sql in stats.sql if sql.startswith('ATTACH')]
+        self.assertEqual(len(attached), 2)  # one per page, both the February file
+
+        with count_queries(keep_sql=True) as stats:
+            self.assertEqual(len(self._walk(headers, '&since=2025-04-01')), 3)
+        self.assertFalse([sql for sql in stats.sql if sql.startswith('ATTACH')])
+
+        bad = self.client.get('/api/orders?since=2025-03-01&until=2025-02-01', headers=headers)
+        self.assertEqual(bad.status_code, 400)
+
+        staff = self._headers(username='admin')
+        with count_queries(keep_sql=True) as stats:
+            summary = self.client.get('/api/analytics/summary?since=2025-02-01&until=2025-02-28', headers=staff)
+        self.assertEqual(summary.status_code, 200, summary.get_data(as_text=True))
+        self.assertFalse([sql for sql in stats.sql if sql.startswith('ATTACH')])
+        body = summary.get_json()
+        self.assertEqual(body['summary']['total_items_sold'], 3)
+        self.assertTrue(body['summary']['tracking_since'].startswith('2025-01-03'))
+
+    def test_late_rows_are_compacted_into_a_new_generation(self):
+        self._seed_months()
+        compact_history(now=NOW, keep_months=2)
+        with SessionLocal() as session:
+            first_file = session.get(HistoryPartition, datetime(2025, 2, 1).date()).file_name
+
+        self._seed(datetime(2025, 2, 27, 18, 0))
+        self.assertEqual(compact_history(now=NOW, keep_months=2), {'2025-02': 1})
+        with SessionLocal() as session:
+            february = session.get(HistoryPartition, datetime(2025, 2, 1).date())
+            self.assertEqual((february.generation, february.record_count), (2, 4))
+        february_rows = self._walk(self._headers(), '&since=2025-02-01&until=2025-02-28')
+        self.assertEqual(len(february_rows), 4)
+        self.assertEqual(len({order_id for order_id, _, _ in february_rows}), 4)
+
+        # The replaced file outlives the switch by one run for readers still using it.
+        self.assertTrue(history.archive_path(first_file).exists())
+        compact_history(now=NOW, keep_months=2)
+        self.assertFalse(history.archive_path(first_file).exists())
+
+    def test_failed_compaction_leaves_history_in_place(self):
+        self._seed_months()
+        headers = self._headers()
+        before = self._walk(headers)
+
+        with mock.patch.object(history, 'bump_version', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                compact_history(now=NOW, keep_months=2)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderRecord.id))), 12)
+            self.assertEqual(session.scalar(select(func.count(HistoryPartition.month))), 0)
+        self.assertEqual(self._walk(headers), before)
+
+        self.assertEqual(sum(compact_history(now=NOW, keep_months=2).values()), 9)
+        self.assertEqual(self._walk(headers), before)
+        files = sorted(path.name for path in Path(HISTORY_ARCHIVE_DIR).iterdir())
+        self.assertEqual(len(files), 3)
+
+    def test_ticket_detail_reads_drinks_from_compacted_months(self):
+        with SessionLocal() as session:
+            opened = datetime(2025, 1, 31, 23, 50)
+            ticket = Ticket(
+                member_id=self.member_id,
+                status='complete',
+                item_count=2,
+                open_count=0,
+                total_price=Decimal('7.00'),
+                created_at=opened,
+                completed_at=datetime(2025, 2, 1, 0, 5),
+            )
+            session.add(ticket)
+            session.commit()
+            ticket_id = ticket.id
+        self._seed(datetime(2025, 1, 31, 23, 55), datetime(2025, 2, 1, 0, 5), ticket_id=ticket_id)
+        expected = self.client.get(f'/api/orders/tickets/{ticket_id}', headers=self._headers()).get_json()
+
+        compact_history(now=NOW, keep_months=2)
+        detail = self.client.get(f'/api/orders/tickets/{ticket_id}', headers=self._headers())
+        self.assertEqual(detail.status_code, 200, detail.get_data(as_text=True))
+        self.assertEqual(detail.get_json()['order_items'], expected['order_items'])
+        self.assertEqual(len(expected['order_items']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import atexit
+import os
+import signal
+import tempfile
+import time
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'login_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.auth import _member_by_email, _staff_by_username  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.hashing import hasher  # noqa: E402
+from backend.app.models import Base, Staff  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class LoginLookupTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def _plan(self, stmt):
+        compiled = stmt.compile(engine, compile_kwargs={'literal_binds': True})
+        with engine.connect() as connection:
+            return ' '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}'))
+
+    def test_staff_lookup_uses_lower_username_index(self):
+        plan = self._plan(_staff_by_username('admin'))
+        self.assertIn('USING INDEX ix_staff_username_lower', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_member_lookup_uses_lower_email_index(self):
+        plan = self._plan(_member_by_email('member1@example.com'))
+        self.assertIn('USING INDEX ix_members_email_lower', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_login_is_case_insensitive(self):
+        staff = self.client.post('/api/auth/login', json={'username': 'ADMIN', 'password': 'admin'})
+        self.assertEqual(staff.status_code, 200, staff.get_data(as_text=True))
+        member = self.client.post('/api/auth/login', json={'email': 'Member1@Example.com', 'password': 'admin'})
+        self.assertEqual(member.status_code, 200, member.get_data(as_text=True))
+
+    def test_login_rehashes_outdated_hash(self):
+        with SessionLocal() as session:
+            staff = session.scalar(select(Staff).where(Staff.username == 'staff1'))
+            staff.password_hash = generate_password_hash('admin', method='pbkdf2:sha256:1000')
+            session.commit()
+
+        response = self.client.post('/api/auth/login', json={'username': 'staff1', 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        with SessionLocal() as session:
+            stored = session.scalar(select(Staff.password_hash).where(Staff.username == 'staff1'))
+        self.assertFalse(hasher.needs_rehash(stored))
+
+        again = self.client.post('/api/auth/login', json={'username': 'staff1', 'password': 'admin'})
+        self.assertEqual(again.status_code, 200, again.get_data(as_text=True))
+
+    def test_full_hash_queue_sheds_load(self):
+        held = 0
+        while hasher._slots.acquire(blocking=False):
+            held += 1
+        try:
+            response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        finally:
+            for _ in range(held):
+                hasher._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get('Retry-After'), '1')
+
+    def test_hash_pool_does_not_fork_the_threaded_worker(self):
+        self.assertTrue(hasher.check(hasher.hash('admin'), 'admin'))
+        self.assertIn(hasher._pool()._mp_context.get_start_method(), ('forkserver', 'spawn'))
+
+    def test_dead_hash_process_sheds_load_and_the_pool_restarts(self):
+        pool = hasher._pool()
+        self.assertTrue(hasher.check(hasher.hash('admin'), 'admin'))
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        deadline = time.monotonic() + 5
+        while not pool._broken and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get('Retry-After'), '1')
+
+        again = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(again.status_code, 200, again.get_data(as_text=True))
+        self.assertIsNot(hasher._pool(), pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
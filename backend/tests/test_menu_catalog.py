@@ -0,0 +1,151 @@
+import atexit
+import os
+import tempfile
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select, update
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'catalog_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.catalog import _VersionedCache, catalog, stock  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.instrumentation import count_queries  # noqa: E402
+from backend.app.models import Base, MenuItem  # noqa: E402
+from backend.app.versions import MENU_VERSION, STOCK_VERSION, bump_version, read_version  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class MenuCatalogTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self._check_interval = catalog.check_interval
+
+    def tearDown(self):
+        self._set_check_interval(self._check_interval)
+
+    def _set_check_interval(self, seconds):
+        catalog.check_interval = seconds
+        stock.check_interval = seconds
+
+    def _manager_headers(self):
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _count_statements(self, fn):
+        # count_queries sees both the writer and the read-only engine.
+        with count_queries() as stats:
+            result = fn()
+        return result, stats.statements
+
+    def test_warm_menu_reads_issue_no_sql(self):
+        self._set_check_interval(60)
+        first = self.client.get('/api/items')
+        self.assertEqual(first.status_code, 200)
+        item_id = first.get_json()[0]['id']
+
+        response, statements = self._count_statements(lambda: self.client.get('/api/items'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, 0)
+
+        response, statements = self._count_statements(lambda: self.client.get(f'/api/items/{item_id}'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, 0)
+
+    def test_local_write_is_visible_immediately(self):
+        self._set_check_interval(60)
+        headers = self._manager_headers()
+        item = self.client.get('/api/items').get_json()[0]
+
+        response = self.client.patch(f"/api/items/{item['id']}/quantity", json={'delta': 7}, headers=headers)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+
+        refreshed = self.client.get(f"/api/items/{item['id']}").get_json()
+        self.assertEqual(refreshed['quantity'], item['quantity'] + 7)
+
+    def test_other_worker_write_is_picked_up_by_version(self):
+        self._set_check_interval(0)
+        item = self.client.get('/api/items').get_json()[0]
+
+        # Simulate another worker: change the row and bump the shared counter.
+        with SessionLocal() as session:
+            session.execute(update(MenuItem).where(MenuItem.id == item['id']).values(quantity=3, price=9))
+            bump_version(session, MENU_VERSION)
+            bump_version(session, STOCK_VERSION)
+            session.commit()
+
+        refreshed = self.client.get(f"/api/items/{item['id']}").get_json()
+        self.assertEqual(refreshed['quantity'], 3)
+        self.assertEqual(refreshed['price'], 9.0)
+
+    def test_orders_refresh_cached_stock(self):
+        self._set_check_interval(60)
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+        before = self.client.get(f'/api/items/{tea_id}').get_json()['quantity']
+
+        response = self.client.post('/api/orders', json={'items': [{'menu_item_id': tea_id, 'quantity': 2}]})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+
+        after = self.client.get(f'/api/items/{tea_id}').get_json()['quantity']
+        self.assertEqual(after, before - 2)
+
+    def test_orders_leave_the_menu_catalog_loaded(self):
+        self._set_check_interval(0)
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+            menu_version = read_version(session, MENU_VERSION)
+        self.client.get('/api/items')
+        loaded = catalog.snapshot()
+
+        response = self.client.post('/api/orders', json={'items': [{'menu_item_id': tea_id, 'quantity': 2}]})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+
+        with SessionLocal() as session:
+            self.assertEqual(read_version(session, MENU_VERSION), menu_version)
+        self.assertIs(catalog.snapshot(), loaded)
+
+    def test_items_poll_returns_304_until_menu_changes(self):
+        headers = self._manager_headers()
+        first = self.client.get('/api/items')
+        etag = first.headers.get('ETag')
+        self.assertTrue(etag)
+
+        unchanged = self.client.get('/api/items', headers={'If-None-Match': etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.get_data(), b'')
+
+        item_id = first.get_json()[0]['id']
+        response = self.client.patch(f'/api/items/{item_id}/quantity', json={'delta': 1}, headers=headers)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+
+        changed = self.client.get('/api/items', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers.get('ETag'), etag)
+
+    def test_cache_without_a_loader_fails_at_construction(self):
+        class Unfinished(_VersionedCache):
+            version_name = MENU_VERSION
+
+        with self.assertRaises(TypeError):
+            Unfinished()
+
+
+if __name__ == '__main__':
+    unittest.main()
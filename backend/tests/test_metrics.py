@@ -0,0 +1,114 @@
+import atexit
+import multiprocessing
+import os
+import re
+import tempfile
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'metrics_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.metrics import count_on_commit, store  # noqa: E402
+from backend.app.models import Base, MenuItem  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+def _other_worker(amount):
+    store.inc('orders_created_total', amount)
+    store.flush(force=True)
+
+
+class MetricsEndpointTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        store.reset()
+
+    def _metrics(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.get_data(as_text=True)
+
+    def _value(self, text, series):
+        match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+        self.assertIsNotNone(match, f'{series} missing from:\n{text}')
+        return float(match.group(1))
+
+    def _headers(self):
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _create_orders(self, lines, headers):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+        payload = {'items': [{'menu_item_id': tea_id, 'quantity': 1, 'price': 3.5}] * lines}
+        response = self.client.post('/api/orders', json=payload, headers=headers)
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return [item['id'] for item in response.get_json()['order_items']]
+
+    def test_order_counters_and_queue_depth(self):
+        headers = self._headers()
+        ids = self._create_orders(3, headers)
+        self.client.patch(f'/api/orders/{ids[0]}', json={'status': 'preparing'}, headers=headers)
+        self.client.patch(f'/api/orders/{ids[1]}', json={'status': 'complete'}, headers=headers)
+
+        text = self._metrics()
+        self.assertEqual(self._value(text, 'orders_archived_total'), 0)
+        self.assertEqual(self._value(text, 'order_queue_depth{status="complete"}'), 1)
+
+        archive_pending()
+        text = self._metrics()
+        self.assertEqual(self._value(text, 'orders_created_total'), 3)
+        self.assertEqual(self._value(text, 'orders_archived_total'), 1)
+        self.assertEqual(self._value(text, 'order_queue_depth{status="received"}'), 1)
+        self.assertEqual(self._value(text, 'order_queue_depth{status="preparing"}'), 1)
+        self.assertEqual(self._value(text, 'order_queue_depth{status="complete"}'), 0)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+
+    def test_request_latency_histogram_and_pool_wait(self):
+        for _ in range(2):
+            self.client.get('/api/items')
+
+        text = self._metrics()
+        labels = 'blueprint="items",endpoint="items.list_items",method="GET",status="200"'
+        self.assertEqual(self._value(text, f'http_request_duration_seconds_count{{{labels}}}'), 2)
+        self.assertEqual(self._value(text, f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'), 2)
+        self.assertGreater(self._value(text, 'db_pool_checkout_wait_seconds_count{pool="read"}'), 0)
+
+    def test_rolled_back_counts_are_discarded(self):
+        with SessionLocal() as session:
+            count_on_commit(session, 'orders_created_total', 5)
+            session.rollback()
+        self.assertEqual(self._value(self._metrics(), 'orders_created_total'), 0)
+
+    def test_totals_include_other_worker_processes(self):
+        self._create_orders(2, self._headers())
+        worker = multiprocessing.get_context('fork').Process(target=_other_worker, args=(4,))
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(self._value(self._metrics(), 'orders_created_total'), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import atexit
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import unittest
+
+from sqlalchemy import func, select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'order_archiver_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import archiver, create_app  # noqa: E402
+from backend.app.archiver import PROGRESS_NAME, Archiver, archive_batch, archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.loyalty import find_loyalty_mismatches  # noqa: E402
+from backend.app.models import (  # noqa: E402
+    ArchiveProgress,
+    Base,
+    MemberLoyalty,
+    MenuItem,
+    OrderAddon,
+    OrderItem,
+    OrderRecord,
+    SalesItemHourly,
+    SalesLabelHourly,
+)
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class OrderArchiverTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with SessionLocal() as session:
+            self.ids = {item.name: item.id for item in session.scalars(select(MenuItem))}
+
+    def _headers(self, **credentials):
+        credentials = credentials or {'username': 'staff1'}
+        response = self.client.post('/api/auth/login', json={**credentials, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _place(self, drinks, headers):
+        line = {
+            'menu_item_id': self.ids['Oolong Tea'],
+            'quantity': 1,
+            'price': 5.00,
+            'inventory_item_ids': [self.ids['Pudding']],
+            'options': {'tea': 'Oolong', 'addons': ['Pudding']},
+        }
+        response = self.client.post('/api/orders', json={'items': [line] * drinks}, headers=headers)
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return [item['id'] for item in response.get_json()['order_items']]
+
+    def _complete(self, ids, headers):
+        response = self.client.patch('/api/orders', json={'ids': ids, 'status': 'complete'}, headers=headers)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+
+    def _archived_ids(self):
+        with SessionLocal() as session:
+            return sorted(session.scalars(select(OrderRecord.order_item_id)))
+
+    def test_completion_flips_status_and_a_batch_moves_history(self):
+        member = self._headers(email='member1@example.com')
+        staff = self._headers()
+        ids = self._place(3, member)
+        self._complete(ids, staff)
+
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id)).where(OrderItem.status == 'complete')), 3)
+            self.assertEqual(session.scalar(select(func.count(OrderRecord.id))), 0)
+
+        self.assertEqual(archive_pending(batch_size=2), 3)
+        self.assertEqual(self._archived_ids(), ids)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id))), 0)
+            self.assertTrue(all(session.scalars(select(OrderRecord.completed_at))))
+            owners = session.execute(select(OrderAddon.order_item_id, OrderAddon.order_record_id)).all()
+            self.assertEqual(len(owners), 3)
+            self.assertTrue(all(order_id is None and record_id for order_id, record_id in owners))
+            member_id = session.scalar(select(OrderRecord.member_id))
+            self.assertEqual(session.get(MemberLoyalty, member_id).drink_count, 3)
+            self.assertEqual(find_loyalty_mismatches(session), [])
+            self.assertEqual(session.scalar(select(func.sum(SalesItemHourly.quantity))), 3)
+            self.assertEqual(session.scalar(select(func.sum(SalesLabelHourly.quantity)).where(SalesLabelHourly.label == 'Pudding')), 3)
+            progress = session.get(ArchiveProgress, PROGRESS_NAME)
+            self.assertEqual((progress.last_order_item_id, progress.archived_total), (ids[-1], 3))
+
+    def test_rows_completed_below_the_watermark_are_picked_up(self):
+        staff = self._headers()
+        ids = self._place(3, staff)
+        self._complete([ids[2]], staff)
+        self.assertEqual(archive_pending(), 1)
+
+        self._complete([ids[0]], staff)
+        self.assertEqual(archive_pending(), 1)
+        self.assertEqual(self._archived_ids(), [ids[0], ids[2]])
+        self.assertEqual(archive_pending(), 0)
+
+    def test_a_failed_batch_leaves_its_rows_for_the_next_run(self):
+        staff = self._headers()
+        ids = self._place(2, staff)
+        self._complete(ids, staff)
+
+        with mock.patch.object(archiver, 'record_sales', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                archive_pending()
+        self.assertEqual(self._archived_ids(), [])
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id))), 2)
+            self.assertEqual(session.get(ArchiveProgress, PROGRESS_NAME).last_order_item_id, 0)
+
+        self.assertEqual(archive_pending(), 2)
+        self.assertEqual(self._archived_ids(), ids)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.sum(SalesItemHourly.quantity))), 2)
+
+    def test_only_one_archiver_holds_the_lock(self):
+        lock_path = str(Path(_TEST_DIR.name) / 'archiver.lock')
+        first = Archiver(lock_path=lock_path)
+        second = Archiver(lock_path=lock_path)
+        try:
+            self.assertTrue(first._holds_lock())
+            self.assertFalse(second._holds_lock())
+            first.stop()
+            self.assertTrue(second._holds_lock())
+        finally:
+            first.stop()
+            second.stop()
+
+    def test_thread_archives_in_the_background(self):
+        staff = self._headers()
+        ids = self._place(2, staff)
+        self._complete(ids, staff)
+
+        worker = Archiver(interval=0.05, lock_path=str(Path(_TEST_DIR.name) / 'thread.lock'))
+        worker.start()
+        try:
+            deadline = time.monotonic() + 5
+            while self._archived_ids() != ids and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            worker.stop()
+        self.assertEqual(self._archived_ids(), ids)
+
+    def test_create_app_archives_outside_gunicorn(self):
+        worker = Archiver(interval=0.05, lock_path=str(Path(_TEST_DIR.name) / 'app.lock'))
+        env = {'ARCHIVER_ENABLED': '1', 'SERVER_SOFTWARE': 'Werkzeug/3.0'}
+        with mock.patch.object(archiver, 'archiver', worker), mock.patch.dict(os.environ, env):
+            app = create_app()
+        client = app.test_client()
+        try:
+            member = self._headers(email='member1@example.com')
+            staff = self._headers()
+            self._complete(self._place(3, member), staff)
+
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                rewards = client.get('/api/orders/rewards', headers=member).get_json()
+                if rewards['drink_count']:
+                    break
+                time.sleep(0.05)
+        finally:
+            worker.stop()
+        self.assertEqual(rewards['drink_count'], 3)
+        summary = client.get('/api/analytics/summary', headers=staff).get_json()['summary']
+        self.assertEqual(summary['total_items_sold'], 3)
+        self.assertEqual(summary['pending_order_items'], 0)
+
+    def test_gunicorn_leaves_the_archiver_to_post_fork(self):
+        worker = Archiver(lock_path=str(Path(_TEST_DIR.name) / 'gunicorn.lock'))
+        env = {'ARCHIVER_ENABLED': '1', 'SERVER_SOFTWARE': 'gunicorn/23.0.0'}
+        with mock.patch.object(archiver, 'archiver', worker), mock.patch.dict(os.environ, env):
+            create_app()
+        self.assertIsNone(worker._thread)
+
+    def test_batch_without_completed_rows_writes_nothing(self):
+        self._place(1, self._headers())
+        with SessionLocal() as session:
+            self.assertEqual(archive_batch(session), 0)
+            self.assertFalse(session.new)
+
+
+if __name__ == '__main__':
+    unittest.main()
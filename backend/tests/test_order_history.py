@@ -0,0 +1,249 @@
+import atexit
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select, tuple_
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'history_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.loyalty import backfill_member_loyalty, find_loyalty_mismatches  # noqa: E402
+from backend.app.models import Base, Member, MemberLoyalty, MenuItem, OrderAddon, OrderRecord  # noqa: E402
+from backend.app.order_options import backfill_order_options, load_record_addons  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class OrderHistoryTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def _member_headers(self, email='member1@example.com'):
+        response = self.client.post('/api/auth/login', json={'email': email, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _staff_headers(self):
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _seed_history(self, email, count, start_order_item_id=1000):
+        with SessionLocal() as session:
+            member = session.scalar(select(Member).where(Member.email == email))
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+            base = datetime(2025, 1, 1, 9, 0, 0)
+            for offset in range(count):
+                # Pairs share a completed_at so the id tie-breaker is exercised.
+                completed_at = base + timedelta(minutes=offset // 2)
+                session.add(
+                    OrderRecord(
+                        order_item_id=start_order_item_id + offset,
+                        member_id=member.id,
+                        item_id=tea_id,
+                        qty=1,
+                        status='complete',
+                        total_price=Decimal('3.50'),
+                        created_at=completed_at - timedelta(minutes=5),
+                        completed_at=completed_at,
+                    )
+                )
+            session.commit()
+            return member.id
+
+    def _walk(self, headers, limit):
+        seen, cursor, pages = [], None, 0
+        while True:
+            url = f'/api/orders?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+            body = response.get_json()
+            seen.extend(item['id'] for item in body['order_items'])
+            pages += 1
+            cursor = body['next_cursor']
+            if not cursor:
+                return seen, pages
+
+    def test_member_history_pages_with_cursor(self):
+        self._seed_history('member1@example.com', 7)
+        self._seed_history('member2@example.com', 3, start_order_item_id=2000)
+
+        seen, pages = self._walk(self._member_headers(), 3)
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, sorted(range(1000, 1007), reverse=True))
+
+    def test_legacy_rows_without_completed_at_are_paged(self):
+        self._seed_history('member1@example.com', 6)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE order_records SET completed_at = NULL WHERE order_item_id IN (1001, 1004)")
+            connection.exec_driver_sql(
+                "DELETE FROM schema_migrations WHERE version >= "
+                "(SELECT version FROM schema_migrations WHERE name = 'order_records_completed_at')"
+            )
+
+        create_app()
+
+        seen, _ = self._walk(self._member_headers(), 2)
+        self.assertEqual(sorted(seen), list(range(1000, 1006)))
+        with SessionLocal() as session:
+            self.assertIsNone(session.scalar(select(OrderRecord.id).where(OrderRecord.completed_at.is_(None))))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/orders?cursor=not-a-cursor', headers=self._member_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_deep_page_query_walks_the_composite_index(self):
+        member_id = self._seed_history('member1@example.com', 4)
+        stmt = (
+            select(OrderRecord.id)
+            .where(OrderRecord.member_id == member_id)
+            .where(tuple_(OrderRecord.completed_at, OrderRecord.id) < tuple_(datetime(2025, 1, 1, 9, 1), 1003))
+            .order_by(OrderRecord.completed_at.desc(), OrderRecord.id.desc())
+            .limit(20)
+        )
+        compiled = stmt.compile(engine, compile_kwargs={'literal_binds': True})
+        with engine.connect() as connection:
+            plan = ' '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}'))
+        self.assertIn('ix_order_records_member_completed', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_rewards_read_counter_maintained_on_archive(self):
+        member_headers = self._member_headers()
+        staff_headers = self._staff_headers()
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+
+        response = self.client.post(
+            '/api/orders',
+            json={'items': [{'menu_item_id': tea_id, 'quantity': 2}, {'menu_item_id': tea_id, 'quantity': 1}]},
+            headers=member_headers,
+        )
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        for item in response.get_json()['order_items']:
+            completed = self.client.patch(f"/api/orders/{item['id']}", json={'status': 'complete'}, headers=staff_headers)
+            self.assertEqual(completed.status_code, 200, completed.get_data(as_text=True))
+
+        rewards = self.client.get('/api/orders/rewards', headers=member_headers)
+        self.assertEqual(rewards.get_json(), {'drink_count': 0})
+        archive_pending()
+        rewards = self.client.get('/api/orders/rewards', headers=member_headers)
+        self.assertEqual(rewards.get_json(), {'drink_count': 3})
+        with SessionLocal() as session:
+            self.assertEqual(find_loyalty_mismatches(session), [])
+
+    def test_checker_detects_and_backfill_repairs_drift(self):
+        member_id = self._seed_history('member1@example.com', 4)
+        with SessionLocal() as session:
+            mismatches = find_loyalty_mismatches(session)
+            self.assertEqual(mismatches, [{'member_id': member_id, 'expected': 4, 'stored': 0}])
+
+            backfill_member_loyalty(session)
+            session.commit()
+            self.assertEqual(session.get(MemberLoyalty, member_id).drink_count, 4)
+            self.assertEqual(find_loyalty_mismatches(session), [])
+
+        rewards = self.client.get('/api/orders/rewards', headers=self._member_headers())
+        self.assertEqual(rewards.get_json(), {'drink_count': 4})
+
+    def test_options_are_stored_in_columns_and_filterable(self):
+        staff_headers = self._staff_headers()
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+
+        options = {'tea': 'Green Tea', 'milk': 'Oat Milk', 'sugar': '50%', 'ice': 'Less', 'addons': ['Pudding', 'Taro Balls']}
+        response = self.client.post(
+            '/api/orders',
+            json={'items': [{'menu_item_id': tea_id, 'options': options}, {'menu_item_id': tea_id, 'options': {'milk': 'None'}}]},
+        )
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        created = response.get_json()['order_items']
+        self.assertEqual(created[0]['options'], options)
+        self.assertEqual(created[1]['options'], {'tea': None, 'milk': 'None', 'sugar': None, 'ice': None, 'addons': []})
+
+        completed = self.client.patch(f"/api/orders/{created[0]['id']}", json={'status': 'complete'}, headers=staff_headers)
+        self.assertEqual(completed.status_code, 200, completed.get_data(as_text=True))
+        self.assertEqual(completed.get_json()['options'], options)
+        archive_pending()
+
+        with SessionLocal() as session:
+            oat_ids = session.scalars(select(OrderRecord.order_item_id).where(OrderRecord.milk == 'Oat Milk')).all()
+            self.assertEqual(oat_ids, [created[0]['id']])
+            pudding_ids = session.scalars(
+                select(OrderRecord.order_item_id)
+                .join(OrderAddon, OrderAddon.order_record_id == OrderRecord.id)
+                .where(OrderAddon.label == 'Pudding')
+            ).all()
+            self.assertEqual(pudding_ids, [created[0]['id']])
+
+    def test_backfill_populates_options_from_legacy_json(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+            legacy = OrderRecord(
+                order_item_id=3000,
+                item_id=tea_id,
+                qty=1,
+                status='complete',
+                total_price=Decimal('3.50'),
+                created_at=datetime(2025, 1, 1, 9, 0, 0),
+                completed_at=datetime(2025, 1, 1, 9, 5, 0),
+                customizations=json.dumps({'tea': ' Green Tea ', 'milk': 'Fresh Milk', 'ice': 'No Ice', 'addons': 'Pudding, Tapioca Pearls'}),
+            )
+            session.add(legacy)
+            session.commit()
+
+            self.assertEqual(backfill_order_options(session, batch_size=1), 1)
+            session.refresh(legacy)
+            self.assertEqual((legacy.tea, legacy.milk, legacy.sugar, legacy.ice), ('Green Tea', 'Fresh Milk', None, 'No Ice'))
+            self.assertEqual(load_record_addons(session, [legacy.id]), {legacy.id: ['Pudding', 'Tapioca Pearls']})
+
+            # Re-running leaves exactly one set of add-on rows.
+            backfill_order_options(session)
+            self.assertEqual(load_record_addons(session, [legacy.id]), {legacy.id: ['Pudding', 'Tapioca Pearls']})
+
+    def test_list_rows_serialize_like_write_responses(self):
+        member_headers = self._member_headers()
+        staff_headers = self._staff_headers()
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Black Tea'))
+
+        options = {'tea': 'Black Tea', 'milk': 'Fresh Milk', 'sugar': None, 'ice': 'Normal', 'addons': ['Pudding']}
+        response = self.client.post(
+            '/api/orders', json={'items': [{'menu_item_id': tea_id, 'quantity': 2, 'options': options}]}, headers=member_headers
+        )
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        created = response.get_json()['order_items'][0]
+        self.assertEqual(self.client.get('/api/orders', headers=member_headers).get_json()['order_items'], [created])
+
+        completed = self.client.patch(f"/api/orders/{created['id']}", json={'status': 'complete'}, headers=staff_headers)
+        self.assertEqual(completed.status_code, 200, completed.get_data(as_text=True))
+        completed = completed.get_json()
+        self.assertEqual(self.client.get('/api/orders', headers=member_headers).get_json()['order_items'], [completed])
+        shared = [key for key in created if key != 'status']
+        self.assertEqual({key: completed[key] for key in shared}, {key: created[key] for key in shared})
+
+        archive_pending()
+        self.assertEqual(self.client.get('/api/orders', headers=member_headers).get_json()['order_items'], [completed])
+
+
+if __name__ == '__main__':
+    unittest.main()
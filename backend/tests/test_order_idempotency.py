@@ -0,0 +1,141 @@
+import atexit
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import unittest
+
+from sqlalchemy import func, select, update
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'order_idempotency_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.catalog import mark_stock_changed  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.idempotency import sweep_expired_keys  # noqa: E402
+from backend.app.instrumentation import count_queries  # noqa: E402
+from backend.app.models import Base, IdempotencyKey, MenuItem, OrderItem, Ticket  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class OrderIdempotencyTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with SessionLocal() as session:
+            self.tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Black Tea'))
+        self.payload = {'items': [{'menu_item_id': self.tea_id, 'quantity': 2, 'price': 4.00}]}
+
+    def _stock(self):
+        with SessionLocal() as session:
+            return session.scalar(select(MenuItem.quantity).where(MenuItem.id == self.tea_id))
+
+    def _set_stock(self, quantity):
+        with SessionLocal() as session:
+            session.execute(update(MenuItem).where(MenuItem.id == self.tea_id).values(quantity=quantity))
+            mark_stock_changed(session)
+            session.commit()
+
+    def _live_orders(self):
+        with SessionLocal() as session:
+            return session.scalar(select(func.count(OrderItem.id)))
+
+    def _post(self, key, payload=None, client=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return (client or self.client).post('/api/orders', json=payload or self.payload, headers=headers)
+
+    def test_retry_returns_stored_response_without_touching_stock(self):
+        stock = self._stock()
+        first = self._post('tablet-7-cart-1')
+        self.assertEqual(first.status_code, 201, first.get_data(as_text=True))
+        self.assertEqual(self._stock(), stock - 2)
+
+        with count_queries() as stats:
+            retry = self._post('tablet-7-cart-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertLessEqual(stats.statements, 2)
+        self.assertEqual(self._stock(), stock - 2)
+        self.assertEqual(self._live_orders(), 1)
+
+        other = self._post('tablet-7-cart-2')
+        self.assertEqual(other.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', other.headers)
+        self.assertEqual(self._live_orders(), 2)
+
+    def test_key_reused_with_a_different_cart_is_rejected(self):
+        self.assertEqual(self._post('reused').status_code, 201)
+        changed = {'items': [{'menu_item_id': self.tea_id, 'quantity': 5, 'price': 4.00}]}
+        response = self._post('reused', changed)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self._live_orders(), 1)
+
+    def test_failed_attempt_stores_nothing(self):
+        self._set_stock(1)
+        self.assertEqual(self._post('short-cart').status_code, 400)
+        self._set_stock(10)
+        response = self._post('short-cart')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+
+    def test_keys_are_scoped_to_the_caller(self):
+        login = self.client.post('/api/auth/login', json={'email': 'member1@example.com', 'password': 'admin'})
+        member = {'Authorization': f"Bearer {login.get_json()['access_token']}", 'Idempotency-Key': 'shared'}
+        self.assertEqual(self._post('shared').status_code, 201)
+        response = self.client.post('/api/orders', json=self.payload, headers=member)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(self._live_orders(), 2)
+
+    def test_concurrent_retries_with_one_key_create_one_order(self):
+        self._set_stock(100)
+
+        def attempt(_):
+            response = self._post('storm', client=self.app.test_client())
+            return response.status_code, response.get_json()
+
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(attempt, range(60)))
+
+        self.assertEqual({status for status, _ in results}, {201})
+        self.assertEqual(len({body['ticket']['id'] for _, body in results}), 1)
+        self.assertEqual(self._live_orders(), 1)
+        self.assertEqual(self._stock(), 98)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(Ticket.id))), 1)
+
+    def test_expired_keys_are_swept_and_can_be_reused(self):
+        self.assertEqual(self._post('old-key').status_code, 201)
+        with SessionLocal() as session:
+            session.execute(update(IdempotencyKey).values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+            session.commit()
+
+        response = self._post('old-key')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(self._live_orders(), 2)
+
+        with SessionLocal() as session:
+            session.execute(update(IdempotencyKey).values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1)))
+            self.assertEqual(sweep_expired_keys(session), 1)
+            session.commit()
+            self.assertEqual(session.scalar(select(func.count()).select_from(IdempotencyKey)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import atexit
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import unittest
+
+from sqlalchemy import select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'stream_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app import events as order_events  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.models import Base, MenuItem  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+def _parse_events(body):
+    parsed = []
+    for block in body.split("\n\n"):
+        fields = {}
+        for line in block.splitlines():
+            if line.startswith(":") or ":" not in line:
+                continue
+            key, _, value = line.partition(":")
+            fields[key] = value.strip()
+        if "event" in fields:
+            parsed.append(fields)
+    return parsed
+
+
+class OrderStreamTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self._max_seconds = order_events.STREAM_MAX_SECONDS
+        order_events.STREAM_MAX_SECONDS = 0
+
+    def tearDown(self):
+        order_events.STREAM_MAX_SECONDS = self._max_seconds
+
+    def _staff_token(self):
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return response.get_json()['access_token']
+
+    def _place_order(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Black Tea'))
+        response = self.client.post('/api/orders', json={'items': [{'menu_item_id': tea_id}]})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return response.get_json()['order_items'][0]['id']
+
+    def test_stream_replays_lifecycle_from_last_event_id(self):
+        token = self._staff_token()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        first_id = self._place_order()
+        second_id = self._place_order()
+        self.client.patch(f'/api/orders/{first_id}', json={'status': 'preparing'}, headers=headers)
+        self.client.patch(f'/api/orders/{first_id}', json={'status': 'complete'}, headers=headers)
+        self.client.delete(f'/api/orders/{second_id}', headers=headers)
+
+        response = self.client.get('/api/orders/stream', headers={**headers, 'Last-Event-ID': '0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/event-stream'))
+        events = _parse_events(response.get_data(as_text=True))
+        response.close()
+        self.assertEqual(
+            [event['event'] for event in events],
+            ['created', 'created', 'status_changed', 'completed', 'deleted'],
+        )
+
+        ticket = self.client.post('/api/orders/stream/token', headers=headers).get_json()['token']
+        resumed = self.client.get(f"/api/orders/stream?token={ticket}&last_event_id={events[2]['id']}")
+        self.assertEqual(resumed.status_code, 200)
+        resumed_events = _parse_events(resumed.get_data(as_text=True))
+        resumed.close()
+        self.assertEqual([event['event'] for event in resumed_events], ['completed', 'deleted'])
+
+    def test_stream_without_cursor_starts_at_latest_event(self):
+        token = self._staff_token()
+        self._place_order()
+        response = self.client.get('/api/orders/stream', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(_parse_events(response.get_data(as_text=True)), [])
+        response.close()
+
+    def test_stream_requires_staff(self):
+        response = self.client.get('/api/orders/stream')
+        self.assertEqual(response.status_code, 401)
+
+    def test_query_string_only_accepts_stream_tokens(self):
+        token = self._staff_token()
+        self.assertEqual(self.client.get(f'/api/orders/stream?jwt={token}').status_code, 401)
+        self.assertEqual(self.client.get(f'/api/orders/stream?token={token}').status_code, 401)
+        self.assertEqual(self.client.get('/api/orders/stream?token=forged').status_code, 401)
+
+        login = self.client.post('/api/auth/login', json={'email': 'member1@example.com', 'password': 'admin'})
+        member = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+        self.assertEqual(self.client.post('/api/orders/stream/token', headers=member).status_code, 403)
+
+    def test_stream_token_outlives_reconnects_until_the_login_expires(self):
+        headers = {'Authorization': f'Bearer {self._staff_token()}'}
+        issued = self.client.post('/api/orders/stream/token', headers=headers).get_json()
+        url = f"/api/orders/stream?token={issued['token']}"
+        now = time.time()
+        with self.app.app_context():
+            expires_at = order_events.read_stream_token(issued['token'])['exp']
+        self.assertAlmostEqual(now + issued['expires_in'], expires_at, delta=2)
+
+        # Well past the old 60-second window: EventSource has reconnected several times.
+        with mock.patch('time.time', return_value=now + 120):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(_parse_events(response.get_data(as_text=True)), [])
+            response.close()
+
+        with mock.patch('time.time', return_value=expires_at - 0.5):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            events = _parse_events(response.get_data(as_text=True))
+            response.close()
+        self.assertEqual([event['event'] for event in events], [order_events.STREAM_EXPIRED_EVENT])
+
+        with mock.patch('time.time', return_value=expires_at + 1):
+            self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_open_streams_are_capped_per_worker(self):
+        headers = {'Authorization': f'Bearer {self._staff_token()}'}
+        with mock.patch.object(order_events, 'STREAM_MAX_PER_WORKER', 1):
+            first = self.client.get('/api/orders/stream', headers=headers, buffered=False)
+            self.assertEqual(first.status_code, 200)
+
+            busy = self.client.get('/api/orders/stream', headers=headers)
+            self.assertEqual(busy.status_code, 503)
+            self.assertEqual(busy.headers['Retry-After'], str(order_events.STREAM_BUSY_RETRY_SECONDS))
+
+            first.close()
+            again = self.client.get('/api/orders/stream', headers=headers)
+            self.assertEqual(again.status_code, 200)
+            again.close()
+        self.assertEqual(order_events._open_streams, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
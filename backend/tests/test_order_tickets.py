@@ -0,0 +1,156 @@
+import atexit
+import os
+import tempfile
+from pathlib import Path
+import unittest
+
+from sqlalchemy import select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'order_tickets_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.instrumentation import count_queries  # noqa: E402
+from backend.app.models import Base, MenuItem, OrderRecord, Ticket  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class OrderTicketTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with SessionLocal() as session:
+            self.tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+
+    def _headers(self, **credentials):
+        credentials = credentials or {'username': 'staff1'}
+        response = self.client.post('/api/auth/login', json={**credentials, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _place(self, drinks, headers=None):
+        payload = {'items': [{'menu_item_id': self.tea_id, 'quantity': 1, 'price': 3.5}] * drinks}
+        response = self.client.post('/api/orders', json=payload, headers=headers or {})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return response.get_json()
+
+    def _tickets(self, headers, query=''):
+        response = self.client.get(f'/api/orders/tickets{query}', headers=headers)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return response.get_json()['tickets']
+
+    def test_ticket_status_follows_its_drinks(self):
+        member = self._headers(email='member1@example.com')
+        staff = self._headers()
+        created = self._place(3, member)
+        ticket = created['ticket']
+        ids = [item['id'] for item in created['order_items']]
+        self.assertEqual((ticket['status'], ticket['item_count'], ticket['open_count']), ('received', 3, 3))
+        self.assertEqual(ticket['total_price'], 10.5)
+        self.assertTrue(all(item['ticket_id'] == ticket['id'] for item in created['order_items']))
+
+        self.client.patch(f'/api/orders/{ids[0]}', json={'status': 'preparing'}, headers=staff)
+        self.client.patch(f'/api/orders/{ids[1]}', json={'status': 'complete'}, headers=staff)
+        [summary] = self._tickets(staff)
+        self.assertEqual((summary['status'], summary['open_count']), ('preparing', 2))
+        self.assertEqual(summary['member_name'], 'Member One')
+
+        response = self.client.patch(f"/api/orders/tickets/{ticket['id']}", json={'status': 'complete'}, headers=staff)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        body = response.get_json()
+        self.assertEqual((body['ticket']['status'], body['ticket']['open_count']), ('complete', 0))
+        self.assertIsNotNone(body['ticket']['completed_at'])
+        self.assertEqual([item['id'] for item in body['order_items']], [ids[0], ids[2]])
+
+        self.assertEqual(self._tickets(staff), [])
+        self.assertEqual([entry['status'] for entry in self._tickets(member)], ['complete'])
+        detail = self.client.get(f"/api/orders/tickets/{ticket['id']}", headers=member).get_json()
+        self.assertEqual([item['id'] for item in detail['order_items']], ids)
+        self.assertTrue(all(item['status'] == 'complete' for item in detail['order_items']))
+
+        again = self.client.patch(f"/api/orders/tickets/{ticket['id']}", json={'status': 'preparing'}, headers=staff)
+        self.assertEqual(again.status_code, 409)
+
+        archive_pending()
+        with SessionLocal() as session:
+            self.assertEqual(
+                set(session.scalars(select(OrderRecord.ticket_id))),
+                {ticket['id']},
+            )
+        detail = self.client.get(f"/api/orders/tickets/{ticket['id']}", headers=member).get_json()
+        self.assertEqual([item['id'] for item in detail['order_items']], ids)
+        self.assertEqual(detail['ticket']['status'], 'complete')
+
+    def test_whole_ticket_transition_to_preparing(self):
+        staff = self._headers()
+        ticket_id = self._place(2, staff)['ticket']['id']
+        response = self.client.patch(f'/api/orders/tickets/{ticket_id}', json={'status': 'preparing'}, headers=staff)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        body = response.get_json()
+        self.assertEqual(body['ticket']['status'], 'preparing')
+        self.assertEqual([item['status'] for item in body['order_items']], ['preparing', 'preparing'])
+
+        member = self._headers(email='member1@example.com')
+        forbidden = self.client.patch(f'/api/orders/tickets/{ticket_id}', json={'status': 'complete'}, headers=member)
+        self.assertEqual(forbidden.status_code, 403)
+
+    def test_polling_cost_does_not_grow_with_drinks(self):
+        staff = self._headers()
+        self._place(1, staff)
+        with count_queries() as small:
+            self._tickets(staff)
+        for _ in range(3):
+            self._place(6, staff)
+        with count_queries() as large:
+            tickets = self._tickets(staff)
+        self.assertEqual(len(tickets), 4)
+        self.assertEqual(small.statements, large.statements)
+
+        response = self.client.get('/api/orders/tickets', headers={**staff, 'If-None-Match': '"x"'})
+        etag = response.headers['ETag']
+        cached = self.client.get('/api/orders/tickets', headers={**staff, 'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_deleting_drinks_updates_and_then_removes_the_ticket(self):
+        staff = self._headers()
+        created = self._place(2, staff)
+        ticket_id = created['ticket']['id']
+        first, second = (item['id'] for item in created['order_items'])
+
+        self.assertEqual(self.client.delete(f'/api/orders/{first}', headers=staff).status_code, 200)
+        with SessionLocal() as session:
+            ticket = session.get(Ticket, ticket_id)
+            self.assertEqual((ticket.item_count, ticket.open_count, float(ticket.total_price)), (1, 1, 3.5))
+
+        self.assertEqual(self.client.delete(f'/api/orders/{second}', headers=staff).status_code, 200)
+        with SessionLocal() as session:
+            self.assertIsNone(session.get(Ticket, ticket_id))
+
+    def test_guests_and_members_only_see_their_own_tickets(self):
+        guest_ticket = self._place(1)['ticket']['id']
+        member_ticket = self._place(1, self._headers(email='member1@example.com'))['ticket']['id']
+        other = self._headers(email='member2@example.com')
+
+        self.assertEqual(self._tickets({}), [])
+        self.assertEqual([ticket['id'] for ticket in self._tickets({}, f'?ids={guest_ticket},{member_ticket}')], [guest_ticket])
+        self.assertEqual(self._tickets(other), [])
+        self.assertEqual(self.client.get(f'/api/orders/tickets/{member_ticket}', headers=other).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/orders/tickets/{guest_ticket}').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import atexit
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from unittest import mock
 import unittest
 
 from sqlalchemy import select
@@ -9,10 +11,13 @@ from sqlalchemy import select
 # Ensure tests use an isolated SQLite database
 _TEST_DIR = tempfile.TemporaryDirectory()
 os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'inventory_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
 
-from backend.app import create_app  # noqa: E402
+from backend.app import create_app, inventory  # noqa: E402
+from backend.app.catalog import catalog  # noqa: E402
 from backend.app.db import SessionLocal, engine  # noqa: E402
-from backend.app.models import Base, MenuItem, OrderItem  # noqa: E402
+from backend.app.instrumentation import count_queries  # noqa: E402
+from backend.app.models import Base, MenuItem, OrderAddon, OrderItem  # noqa: E402
 
 
 def _cleanup_tmpdir():
@@ -128,6 +133,150 @@ class OrderInventoryTests(unittest.TestCase):
         self.assertEqual(self._fetch_quantity(ids["Fresh Milk"]), 1)
         self.assertEqual(self._fetch_quantity(ids["Tapioca Pearls"]), 4)
 
+    def test_reports_every_short_item_in_one_response(self):
+        ids = self._prime_inventory({
+            "Black Tea": 1,
+            "Green Tea": 5,
+            "Fresh Milk": 0,
+        })
+
+        payload = {
+            "items": [
+                {"menu_item_id": ids["Black Tea"], "quantity": 2, "price": 5.00},
+                {
+                    "menu_item_id": ids["Green Tea"],
+                    "quantity": 1,
+                    "price": 5.00,
+                    "options": {"milk": "Fresh Milk"},
+                },
+            ]
+        }
+
+        response = self.client.post("/api/orders", json=payload)
+        self.assertEqual(response.status_code, 400)
+        body = response.get_json() or {}
+        short_ids = {entry["menu_item_id"] for entry in body.get("shortages") or []}
+        self.assertEqual(short_ids, {ids["Black Tea"], ids["Fresh Milk"]})
+
+        self.assertEqual(self._fetch_quantity(ids["Black Tea"]), 1)
+        self.assertEqual(self._fetch_quantity(ids["Green Tea"]), 5)
+        self.assertEqual(self._fetch_quantity(ids["Fresh Milk"]), 0)
+
+    def test_lost_reservation_races_are_retryable_not_shortages(self):
+        ids = self._prime_inventory({'Green Tea': 1})
+        payload = {'items': [{'menu_item_id': ids['Green Tea'], 'quantity': 1}]}
+
+        # Every attempt misses, yet each re-read finds enough stock.
+        with mock.patch.object(inventory, '_RESERVE_STMT', inventory._RESERVE_STMT.where(MenuItem.__table__.c.id < 0)):
+            response = self.client.post('/api/orders', json=payload)
+        self.assertEqual(response.status_code, 503, response.get_data(as_text=True))
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertNotIn('shortages', response.get_json())
+        self.assertEqual(self._fetch_quantity(ids['Green Tea']), 1)
+
+        self.assertEqual(self.client.post('/api/orders', json=payload).status_code, 201)
+        self.assertEqual(self._fetch_quantity(ids['Green Tea']), 0)
+
+    def test_concurrent_orders_never_oversell(self):
+        ids = self._prime_inventory({"Black Tea": 150})
+        payload = {"items": [{"menu_item_id": ids["Black Tea"], "quantity": 1, "price": 4.00}]}
+
+        def place_order(_):
+            return self.app.test_client().post("/api/orders", json=payload).status_code
+
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            statuses = list(pool.map(place_order, range(300)))
+
+        self.assertEqual(statuses.count(201), 150)
+        self.assertEqual(statuses.count(400), 150)
+        self.assertEqual(self._fetch_quantity(ids["Black Tea"]), 0)
+        with SessionLocal() as session:
+            placed = session.scalars(select(OrderItem).where(OrderItem.item_id == ids["Black Tea"])).all()
+            self.assertEqual(len(placed), 150)
+
+    def _count_order_statements(self, payload):
+        # count_queries sees both the writer and the read-only engine.
+        with count_queries() as stats:
+            response = self.client.post("/api/orders", json=payload)
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        return stats.statements
+
+    def test_order_statement_count_is_independent_of_cart_size(self):
+        ids = self._prime_inventory({
+            "Black Tea": 50,
+            "Green Tea": 50,
+            "Fresh Milk": 50,
+            "Oat Milk": 50,
+            "Tapioca Pearls": 50,
+            "Pudding": 50,
+        })
+
+        def line(tea, milk, addon):
+            return {
+                "menu_item_id": ids[tea],
+                "quantity": 1,
+                "price": 4.00,
+                "inventory_item_ids": [ids[addon]],
+                "options": {"milk": milk, "addons": [addon]},
+            }
+
+        single = {"items": [line("Black Tea", "Fresh Milk", "Tapioca Pearls")]}
+        group = {
+            "items": [
+                line(tea, milk, addon)
+                for tea, milk, addon in [
+                    ("Black Tea", "Fresh Milk", "Tapioca Pearls"),
+                    ("Green Tea", "Oat Milk", "Pudding"),
+                ] * 5
+            ]
+        }
+
+        # Load the menu catalog up front and keep it from re-checking its version mid-test.
+        with mock.patch.object(catalog, "check_interval", 60):
+            self.client.get("/api/items")
+            self.assertEqual(self._count_order_statements(single), self._count_order_statements(group))
+
+    def test_mixed_cart_keeps_each_lines_addons(self):
+        ids = self._prime_inventory({"Black Tea": 50, "Green Tea": 50, "Pudding": 50, "Taro Balls": 50})
+        cart = [("Green Tea", "Pudding"), ("Black Tea", None), ("Green Tea", "Taro Balls"), ("Black Tea", "Pudding")]
+        items = [
+            {
+                "menu_item_id": ids[tea],
+                "inventory_item_ids": [ids[addon]] if addon else [],
+                "options": {"addons": [addon] if addon else []},
+            }
+            for tea, addon in cart
+        ]
+        response = self.client.post("/api/orders", json={"items": items})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+        placed = response.get_json()["order_items"]
+        self.assertEqual([line["name"] for line in placed], [tea for tea, _ in cart])
+
+        with SessionLocal() as session:
+            stored = dict(session.execute(select(OrderAddon.order_item_id, OrderAddon.label)).all())
+        expected = {line["id"]: addon for line, (_, addon) in zip(placed, cart) if addon}
+        self.assertEqual(stored, expected)
+
+    def test_order_poll_returns_304_until_queue_changes(self):
+        ids = self._prime_inventory({"Black Tea": 5})
+        headers = self._staff_auth_headers()
+
+        first = self.client.get("/api/orders", headers=headers)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers.get("ETag")
+        self.assertTrue(etag)
+
+        unchanged = self.client.get("/api/orders", headers={**headers, "If-None-Match": etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.get_data(), b"")
+
+        response = self.client.post("/api/orders", json={"items": [{"menu_item_id": ids["Black Tea"]}]})
+        self.assertEqual(response.status_code, 201, response.get_data(as_text=True))
+
+        changed = self.client.get("/api/orders", headers={**headers, "If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.get_json()["order_items"]), 1)
+
     def test_infers_inventory_from_option_labels(self):
         ids = self._prime_inventory({
             "Black Tea": 3,
@@ -233,6 +382,16 @@ class OrderInventoryTests(unittest.TestCase):
         self.assertEqual(self._fetch_quantity(ids["Black Tea"]), 3)
         self.assertEqual(self._fetch_quantity(ids["Fresh Milk"]), 3)
 
+    def test_health_reports_sqlite_tuning(self):
+        response = self.client.get('/api/health')
+        self.assertEqual(response.status_code, 200)
+        sqlite = response.get_json()['sqlite']
+        self.assertEqual(sqlite['profile'], 'tuned')
+        self.assertEqual(sqlite['journal_mode'], 'wal')
+        self.assertEqual(sqlite['foreign_keys'], 1)
+        self.assertEqual(sqlite['busy_timeout'], 5000)
+        self.assertEqual(sqlite['synchronous'], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+import atexit
+import os
+import tempfile
+from pathlib import Path
+import unittest
+from unittest import mock
+
+from sqlalchemy import select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'instrumentation_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app, instrumentation  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.instrumentation import endpoint_stats, query_budget  # noqa: E402
+from backend.app.models import Base, MenuItem  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class RequestInstrumentationTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        endpoint_stats.reset()
+        with SessionLocal() as session:
+            self.ids = {item.name: item.id for item in session.scalars(select(MenuItem))}
+
+    def _headers(self):
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _order_payload(self, lines):
+        line = {
+            'menu_item_id': self.ids['Black Tea'],
+            'quantity': 1,
+            'price': 5.00,
+            'inventory_item_ids': [self.ids['Fresh Milk'], self.ids['Tapioca Pearls']],
+            'options': {'tea': 'Black', 'milk': 'Fresh Milk', 'addons': ['Tapioca Pearls']},
+        }
+        return {'items': [line] * lines}
+
+    def test_server_timing_header_reports_statements(self):
+        response = self.client.get('/api/items')
+        self.assertEqual(response.status_code, 200)
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+        totals = endpoint_stats.snapshot()['items.list_items']
+        self.assertEqual(totals['requests'], 1)
+        self.assertGreater(totals['statements'], 0)
+
+    def test_query_budgets_per_endpoint(self):
+        headers = self._headers()
+        self.client.get('/api/analytics/summary', headers=headers)
+
+        # Cold menu and stock caches: a version check and a load each.
+        with query_budget(4):
+            self.assertEqual(self.client.get('/api/items').status_code, 200)
+        # Statement count must not grow with the number of cart lines, and
+        # reserving stock must not reload the menu catalog.
+        with query_budget(7):
+            self.assertEqual(self.client.post('/api/orders', json=self._order_payload(1), headers=headers).status_code, 201)
+        with query_budget(7):
+            response = self.client.post('/api/orders', json=self._order_payload(4), headers=headers)
+            self.assertEqual(response.status_code, 201)
+        with query_budget(5):
+            self.assertEqual(self.client.get('/api/orders', headers=headers).status_code, 200)
+        with query_budget(5):
+            self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 200)
+
+        # Completion only flips the row; archival happens in the background.
+        order_id = response.get_json()['order_items'][0]['id']
+        with query_budget(7):
+            response = self.client.patch(f'/api/orders/{order_id}', json={'status': 'complete'}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+
+    def test_query_budget_lists_statements_when_exceeded(self):
+        with self.assertRaises(AssertionError) as raised:
+            with query_budget(0):
+                self.client.get('/api/items')
+        self.assertIn('exceed the budget of 0', str(raised.exception))
+        self.assertIn('SELECT', str(raised.exception))
+
+    def test_slow_requests_are_logged(self):
+        with mock.patch.object(instrumentation, 'SLOW_REQUEST_MS', 0.0):
+            with self.assertLogs(self.app.logger, level='WARNING') as logs:
+                self.client.get('/api/items')
+        self.assertIn('slow request GET /api/items (items.list_items)', logs.output[0])
+
+        with mock.patch.object(instrumentation, 'SLOW_REQUEST_QUERIES', 1000):
+            with self.assertNoLogs(self.app.logger, level='WARNING'):
+                self.client.get('/api/items')
+
+
+if __name__ == '__main__':
+    unittest.main()
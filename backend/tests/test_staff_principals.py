@@ -0,0 +1,98 @@
+import atexit
+import os
+import tempfile
+from pathlib import Path
+import unittest
+
+from sqlalchemy import event, select, update
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'principals_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.auth import staff_principals  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.models import Base, Staff  # noqa: E402
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class StaffPrincipalCacheTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+        self.app = create_app()
+        self.client = self.app.test_client()
+        staff_principals.invalidate()
+        self._ttl = staff_principals.ttl
+
+    def tearDown(self):
+        staff_principals.ttl = self._ttl
+        staff_principals.invalidate()
+
+    def _headers(self, username='staff1'):
+        response = self.client.post('/api/auth/login', json={'username': username, 'password': 'admin'})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _staff_queries(self, fn):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM staff' in statement:
+                statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+        return result, len(statements)
+
+    def test_warm_authorization_issues_no_staff_query(self):
+        staff_principals.ttl = 60
+        headers = self._headers()
+        self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 200)
+
+        response, queries = self._staff_queries(lambda: self.client.get('/api/analytics/summary', headers=headers))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+    def test_deactivation_through_orm_applies_immediately(self):
+        staff_principals.ttl = 60
+        headers = self._headers()
+        self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 200)
+
+        with SessionLocal() as session:
+            staff = session.scalar(select(Staff).where(Staff.username == 'staff1'))
+            staff.is_active = False
+            session.commit()
+
+        response = self.client.get('/api/analytics/summary', headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_out_of_band_role_change_applies_after_ttl(self):
+        staff_principals.ttl = 60
+        headers = self._headers()
+        self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 200)
+
+        # Another worker (or a manual SQL fix) changes the row without this process seeing it.
+        with engine.begin() as connection:
+            connection.execute(update(Staff).where(Staff.username == 'staff1').values(role='customer'))
+
+        self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 200)
+        staff_principals.ttl = 0
+        self.assertEqual(self.client.get('/api/analytics/summary', headers=headers).status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
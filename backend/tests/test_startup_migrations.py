@@ -0,0 +1,429 @@
+import atexit
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import unittest
+
+from sqlalchemy import event, func, select
+
+_TEST_DIR = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TEST_DIR.name) / 'startup_test.db'}"
+os.environ["ARCHIVER_ENABLED"] = "0"
+
+from backend.app import create_app  # noqa: E402
+from backend.app.archiver import archive_pending  # noqa: E402
+from backend.app.db import SessionLocal, engine  # noqa: E402
+from backend.app.migrations import LATEST_VERSION, current_version  # noqa: E402
+from backend.app.models import (  # noqa: E402
+    ArchiveProgress,
+    Base,
+    HistoryPartition,
+    Member,
+    MemberLoyalty,
+    MenuItem,
+    OrderAddon,
+    OrderItem,
+    OrderRecord,
+    ScheduleShift,
+    Staff,
+    Ticket,
+)
+
+
+# Tables as the shop shipped them before versioned migrations existed.
+_BASELINE_SCHEMA = (
+    """
+    CREATE TABLE members (
+        id INTEGER NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        joined_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_members_email ON members (email)",
+    """
+    CREATE TABLE staff (
+        id INTEGER NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        role VARCHAR(32) NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        hired_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_staff_username ON staff (username)",
+    """
+    CREATE TABLE menu_items (
+        id INTEGER NOT NULL,
+        name VARCHAR(200) NOT NULL,
+        category VARCHAR(32) NOT NULL,
+        price NUMERIC(10, 2) NOT NULL,
+        quantity INTEGER NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX ix_menu_items_name ON menu_items (name)",
+    "CREATE INDEX ix_menu_items_category ON menu_items (category)",
+    """
+    CREATE TABLE order_items (
+        id INTEGER NOT NULL,
+        member_id INTEGER,
+        staff_id INTEGER,
+        item_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        status VARCHAR(9) NOT NULL,
+        total_price NUMERIC(10, 2) NOT NULL,
+        customizations TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(member_id) REFERENCES members (id) ON DELETE SET NULL,
+        FOREIGN KEY(staff_id) REFERENCES staff (id) ON DELETE SET NULL,
+        FOREIGN KEY(item_id) REFERENCES menu_items (id) ON DELETE RESTRICT
+    )
+    """,
+    """
+    CREATE TABLE order_records (
+        id INTEGER NOT NULL,
+        order_item_id INTEGER NOT NULL,
+        member_id INTEGER,
+        staff_id INTEGER,
+        item_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        status VARCHAR(32),
+        total_price NUMERIC(10, 2) NOT NULL,
+        customizations TEXT,
+        created_at DATETIME NOT NULL,
+        completed_at DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_order_record_item UNIQUE (order_item_id),
+        FOREIGN KEY(member_id) REFERENCES members (id) ON DELETE SET NULL,
+        FOREIGN KEY(staff_id) REFERENCES staff (id) ON DELETE SET NULL,
+        FOREIGN KEY(item_id) REFERENCES menu_items (id) ON DELETE RESTRICT
+    )
+    """,
+    """
+    CREATE TABLE member_rewards (
+        id INTEGER NOT NULL,
+        member_id INTEGER NOT NULL,
+        reward_type VARCHAR(50) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        used_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(member_id) REFERENCES members (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE schedule_shifts (
+        id INTEGER NOT NULL,
+        staff_id INTEGER NOT NULL,
+        shift_date DATE NOT NULL,
+        shift_name VARCHAR(5) NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_staff_shift UNIQUE (staff_id, shift_date, shift_name),
+        FOREIGN KEY(staff_id) REFERENCES staff (id) ON DELETE CASCADE
+    )
+    """,
+)
+
+
+def _cleanup_tmpdir():
+    try:
+        engine.dispose()
+    finally:
+        _TEST_DIR.cleanup()
+
+
+atexit.register(_cleanup_tmpdir)
+
+
+class StartupMigrationTests(unittest.TestCase):
+    def setUp(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+            connection.exec_driver_sql("DROP TABLE IF EXISTS schedule_shifts_old")
+            connection.exec_driver_sql("DROP TABLE IF EXISTS order_items_old")
+        create_app()
+
+    def _statements(self, fn):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+        return statements
+
+    def _add_shift(self, shift_name='15:00'):
+        with SessionLocal() as session:
+            staff_id = session.scalar(select(Staff.id).where(Staff.username == 'staff1'))
+            shift = ScheduleShift(staff_id=staff_id, shift_date=date.today() + timedelta(days=30), shift_name=shift_name)
+            session.add(shift)
+            session.commit()
+            return shift.id
+
+    def _counts(self):
+        with SessionLocal() as session:
+            return (
+                session.scalar(select(func.count(Staff.id))),
+                session.scalar(select(func.count(MenuItem.id))),
+                session.scalar(select(func.count(ScheduleShift.id))),
+            )
+
+    def test_boot_on_current_schema_is_a_fast_no_op(self):
+        self.assertEqual(current_version(), LATEST_VERSION)
+        counts = self._counts()
+
+        started = time.perf_counter()
+        statements = self._statements(create_app)
+        elapsed = time.perf_counter() - started
+
+        # Only the version check: app.bootstrap already migrated and seeded.
+        self.assertLessEqual(len(statements), 2, statements)
+        self.assertFalse([sql for sql in statements if 'menu_items' in sql or 'staff' in sql])
+        self.assertFalse(
+            [sql for sql in statements if sql.lstrip().upper().startswith(('CREATE', 'ALTER', 'DROP', 'INSERT', 'UPDATE'))]
+        )
+        self.assertLess(elapsed, 0.5, f"worker boot took {elapsed * 1000:.1f}ms")
+        self.assertEqual(self._counts(), counts)
+
+    def test_restart_keeps_schedule_and_does_not_reseed(self):
+        shift_id = self._add_shift()
+        with SessionLocal() as session:
+            session.delete(session.scalar(select(MenuItem).where(MenuItem.name == 'Pudding')))
+            session.commit()
+        counts = self._counts()
+
+        create_app()
+
+        self.assertEqual(self._counts(), counts)
+        with SessionLocal() as session:
+            self.assertIsNotNone(session.get(ScheduleShift, shift_id))
+
+    def test_unversioned_database_is_upgraded_without_data_loss(self):
+        shift_id = self._add_shift()
+        counts = self._counts()
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE schema_migrations")
+        self.assertEqual(current_version(), 0)
+
+        create_app()
+
+        self.assertEqual(current_version(), LATEST_VERSION)
+        self.assertEqual(self._counts(), counts)
+        with SessionLocal() as session:
+            self.assertIsNotNone(session.get(ScheduleShift, shift_id))
+
+    def test_old_schedule_table_is_rebuilt_keeping_valid_shifts(self):
+        with SessionLocal() as session:
+            staff_id = session.scalar(select(Staff.id).where(Staff.username == 'staff1'))
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE schema_migrations")
+            connection.exec_driver_sql("DROP TABLE schedule_shifts")
+            connection.exec_driver_sql(
+                "CREATE TABLE schedule_shifts (id INTEGER PRIMARY KEY, staff_id INTEGER NOT NULL, "
+                "shift_date DATE NOT NULL, shift_name VARCHAR(7) NOT NULL)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO schedule_shifts (staff_id, shift_date, shift_name) VALUES "
+                f"({staff_id}, '2030-01-07', '10:00'), ({staff_id}, '2030-01-07', 'morning')"
+            )
+
+        create_app()
+
+        with SessionLocal() as session:
+            shifts = session.execute(select(ScheduleShift.shift_date, ScheduleShift.shift_name)).all()
+        self.assertEqual([(str(shift_date), name) for shift_date, name in shifts], [('2030-01-07', '10:00')])
+        self.assertEqual(current_version(), LATEST_VERSION)
+
+    def test_order_item_ids_are_never_reused_after_archival(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+        with engine.begin() as connection:
+            ddl = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order_items'"
+            ).scalar()
+            connection.exec_driver_sql("DROP TABLE order_items")
+            connection.exec_driver_sql(ddl.replace(" AUTOINCREMENT", ""))
+            connection.exec_driver_sql(
+                "DELETE FROM schema_migrations WHERE version >= "
+                "(SELECT version FROM schema_migrations WHERE name = 'order_items_autoincrement')"
+            )
+        with SessionLocal() as session:
+            live = OrderItem(item_id=tea_id, total_price=3)
+            session.add(live)
+            session.flush()
+            session.add(OrderAddon(order_item_id=live.id, label='Pudding'))
+            session.add(OrderRecord(order_item_id=500, item_id=tea_id, total_price=3, created_at=func.now()))
+            session.commit()
+            live_id = live.id
+
+        create_app()
+
+        self.assertEqual(current_version(), LATEST_VERSION)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalars(select(OrderAddon.label).where(OrderAddon.order_item_id == live_id)).all(), ['Pudding'])
+            fresh = OrderItem(item_id=tea_id, total_price=3)
+            session.add(fresh)
+            session.commit()
+            self.assertGreater(fresh.id, 500)
+
+    def test_live_orders_from_before_tickets_are_grouped_by_cart(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+            member_id = session.scalar(select(Member.id).where(Member.email == 'member1@example.com'))
+            first = datetime(2030, 1, 7, 9, 0, tzinfo=timezone.utc)
+            second = datetime(2030, 1, 7, 9, 5, tzinfo=timezone.utc)
+            session.add_all(
+                [
+                    OrderItem(item_id=tea_id, member_id=member_id, total_price=3, created_at=first),
+                    OrderItem(item_id=tea_id, member_id=member_id, total_price=4, status='preparing', created_at=first),
+                    OrderItem(item_id=tea_id, total_price=5, created_at=second),
+                ]
+            )
+            session.commit()
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "DELETE FROM schema_migrations WHERE version >= "
+                "(SELECT version FROM schema_migrations WHERE name = 'tickets')"
+            )
+
+        create_app()
+
+        with SessionLocal() as session:
+            tickets = session.scalars(select(Ticket).order_by(Ticket.created_at)).all()
+            self.assertEqual(
+                [(ticket.member_id, ticket.item_count, ticket.status, float(ticket.total_price)) for ticket in tickets],
+                [(member_id, 2, 'preparing', 7.0), (None, 1, 'received', 5.0)],
+            )
+            self.assertIsNone(session.scalar(select(OrderItem.id).where(OrderItem.ticket_id.is_(None))))
+
+    def test_completed_rows_left_before_the_archiver_are_archived_later(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE archive_progress")
+            connection.exec_driver_sql("DROP INDEX ix_order_items_status_id")
+            connection.exec_driver_sql("ALTER TABLE order_items DROP COLUMN completed_at")
+            connection.exec_driver_sql(
+                "INSERT INTO order_items (item_id, qty, status, total_price, created_at) "
+                "VALUES (?, 1, 'complete', 3, CURRENT_TIMESTAMP)",
+                (tea_id,),
+            )
+            connection.exec_driver_sql(
+                "DELETE FROM schema_migrations WHERE version >= "
+                "(SELECT version FROM schema_migrations WHERE name = 'order_items_completed_at')"
+            )
+
+        create_app()
+
+        self.assertEqual(current_version(), LATEST_VERSION)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(ArchiveProgress.last_order_item_id)), 0)
+        self.assertEqual(archive_pending(), 1)
+        with SessionLocal() as session:
+            self.assertIsNotNone(session.scalar(select(OrderRecord.completed_at)))
+            self.assertEqual(session.scalar(select(func.count(OrderItem.id))), 0)
+
+    def test_order_records_are_rebuilt_with_autoincrement_keeping_add_ons(self):
+        with SessionLocal() as session:
+            tea_id = session.scalar(select(MenuItem.id).where(MenuItem.name == 'Green Tea'))
+        with engine.begin() as connection:
+            ddl = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order_records'"
+            ).scalar()
+            connection.exec_driver_sql("DROP TABLE order_records")
+            connection.exec_driver_sql(ddl.replace(" AUTOINCREMENT", ""))
+            connection.exec_driver_sql("DROP TABLE history_partitions")
+            connection.exec_driver_sql(
+                "DELETE FROM schema_migrations WHERE version >= "
+                "(SELECT version FROM schema_migrations WHERE name = 'history_partitions')"
+            )
+        with SessionLocal() as session:
+            record = OrderRecord(order_item_id=700, item_id=tea_id, total_price=3, created_at=func.now())
+            session.add(record)
+            session.flush()
+            session.add(OrderAddon(order_record_id=record.id, label='Pudding'))
+            session.commit()
+            record_id = record.id
+
+        create_app()
+
+        self.assertEqual(current_version(), LATEST_VERSION)
+        with engine.connect() as connection:
+            ddl = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'order_records'"
+            ).scalar()
+        self.assertIn('AUTOINCREMENT', ddl)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalars(select(OrderAddon.label).where(OrderAddon.order_record_id == record_id)).all(), ['Pudding'])
+            self.assertEqual(session.scalar(select(func.count(HistoryPartition.month))), 0)
+
+    def test_database_from_before_migrations_is_upgraded(self):
+        with engine.begin() as connection:
+            Base.metadata.drop_all(connection)
+            for statement in _BASELINE_SCHEMA:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql(
+                "INSERT INTO menu_items (id, name, category, price, quantity, is_active) VALUES "
+                "(1, 'Green Tea', 'tea', 3.50, 50, 1), (2, 'Pudding', 'addon', 0.45, 50, 1)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO members (id, email, password_hash, full_name, is_active) "
+                "VALUES (1, 'regular@example.com', 'x', 'Regular', 1)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO staff (id, username, password_hash, full_name, role, is_active) "
+                "VALUES (1, 'opener', 'x', 'Opener', 'staff', 1)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO order_items (id, member_id, item_id, qty, status, total_price, customizations, created_at) "
+                "VALUES (3, 1, 1, 1, 'received', 3.95, '{\"tea\": \"Green Tea\", \"addons\": [\"Pudding\"]}', "
+                "'2024-03-02 10:00:00'), "
+                "(4, 1, 1, 2, 'complete', 7.90, '{\"addons\": [\"Pudding\"]}', '2024-03-02 09:00:00')"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO order_records "
+                "(id, order_item_id, member_id, item_id, qty, status, total_price, customizations, created_at, completed_at) "
+                "VALUES (1, 1, 1, 1, 2, 'complete', 7.00, '{\"tea\": \"Green Tea\"}', '2024-03-01 09:00:00', "
+                "'2024-03-01 09:10:00'), "
+                "(2, 2, 1, 1, 1, 'complete', 3.95, '{\"addons\": [\"Pudding\"]}', '2024-03-01 11:00:00', NULL)"
+            )
+
+        create_app()
+
+        self.assertEqual(current_version(), LATEST_VERSION)
+        with SessionLocal() as session:
+            self.assertEqual(session.scalar(select(func.count(MenuItem.id))), 2)
+            self.assertEqual(session.scalars(select(OrderRecord.order_item_id).order_by(OrderRecord.id)).all(), [1, 2, 4])
+            self.assertEqual(session.scalar(select(OrderRecord.tea).where(OrderRecord.id == 1)), 'Green Tea')
+            self.assertEqual(session.scalar(select(func.count(OrderAddon.id)).where(OrderAddon.order_record_id.is_not(None))), 2)
+            self.assertEqual(session.scalar(select(func.count(OrderAddon.id)).where(OrderAddon.order_item_id == 3)), 1)
+            self.assertIsNone(session.get(OrderItem, 4))
+            self.assertEqual(session.get(MemberLoyalty, 1).drink_count, 5)
+            live = session.get(OrderItem, 3)
+            self.assertIsNotNone(live.ticket_id)
+            self.assertEqual(live.tea, 'Green Tea')
+        with engine.connect() as connection:
+            indexes = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'ix_order_records_ticket_id', 'ix_order_items_ticket_id', 'ix_order_items_status_id'} <= indexes)
+
+        create_app()
+        self.assertEqual(current_version(), LATEST_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()